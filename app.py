@@ -1,22 +1,42 @@
 import os
-import io
 import base64
+import tempfile
 from datetime import datetime, timedelta, date, time
 from functools import wraps # Untuk decorator auth
 
 from flask import (Flask, render_template, request, jsonify, Response,
-                   flash, redirect, url_for, send_file, get_flashed_messages) # <-- Tambahkan get_flashed_messages
+                   flash, redirect, url_for, get_flashed_messages, # <-- Tambahkan get_flashed_messages
+                   stream_with_context)
 # Jika pakai session Flask (misal untuk flash), perlu secret_key
 # from flask import session as flask_session
 from flask_basicauth import BasicAuth
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func
+from sqlalchemy.exc import IntegrityError
 
 # Impor model dan fungsi DB dari database.py
 # Pastikan AuditLog sudah ada di database.py
-from database import init_db, get_db, Employee, Attendance, AuditLog
-
-import pandas as pd
+from database import get_db, Employee, Attendance, AuditLog
+from migrations import check_schema_version
+from daily_summary import refresh_daily_summary
+from photo_store import save_photo, read_photo
+from roster_cache import roster_cache
+from photo_processing import (make_thumbnail, store_thumbnail, get_or_create_thumbnail,
+                              fit_capture_profile, CAPTURE_PROFILE)
+
+from attendance_writer import get_attendance_writer, DuplicateAttendanceError, GroupCommitTimeout
+from reports import (load_daily_summaries, build_monthly_matrix, matrix_groups, matrix_to_xlsx, month_range,
+                     STATUS_CODES, TOTAL_COLUMN, MATRIX_MAX_MONTHS)
+from work_hours import (load_events, compute_work_hours, summarize_work_hours, detail_rows, summary_rows,
+                        DETAIL_HEADERS, SUMMARY_HEADERS)
+from geofence import geofence_cache, geofence_rejection
+from photo_similarity import (photo_index_cache, compute_phash, find_reused_photos, PHOTO_REUSE_DISTANCE,
+                              PHOTO_REUSE_MODE)
+from audit_search import search_clause
+from archive import partition_sources, find_archived_row
+from roster_import import (start_import_job, get_job, load_job, ImportJobBusy, ROSTER_IMPORT_EXTENSIONS,
+                           ACTIVE_STATUSES)
+from exports import iter_export_rows, iter_queries, iter_csv, write_xlsx_tempfile, iter_file, XLSX_MIMETYPE
 
 # --- Konfigurasi Aplikasi Flask ---
 app = Flask(__name__)
@@ -31,194 +51,344 @@ app.config['BASIC_AUTH_FORCE'] = False # Penting: False agar hanya route terdeko
 
 basic_auth = BasicAuth(app)
 
-# --- Inisialisasi Database ---
-try:
-    with app.app_context():
-        init_db()
-except Exception as e:
-    print(f"FATAL: Failed to initialize database on startup: {e}")
+# --- Batas Ukuran Upload ---
+# Batas foto absensi (dicek dari Content-Length sebelum body dibaca)
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 2 * 1024 * 1024))
+# Batas global Flask untuk semua request (413 otomatis jika terlampaui, termasuk upload chunked)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+
+# --- Cek Skema Database ---
+# Tidak ada DDL saat start (banyak worker bisa start bersamaan); skema diperbarui
+# dengan 'python migrations.py upgrade' sebelum deploy
+check_schema_version()
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """Balas 413 sebagai JSON untuk endpoint absensi (dipakai oleh fetch di script.js)."""
+    if request.path == url_for('record_attendance'):
+        return jsonify({"message": "Ukuran upload terlalu besar."}), 413
+    return "Ukuran upload terlalu besar.", 413
 
 # --- Decorator untuk mewajibkan Basic Auth ---
 def require_basic_auth(f):
     """Decorator untuk endpoint yang memerlukan Basic Auth."""
     return basic_auth.required(f)
 
+def roster_choices():
+    """Daftar (id, nama) semua pegawai untuk dropdown form admin, diambil dari roster cache."""
+    return [(emp.id, emp.name) for emp in roster_cache.get().employees]
+
 # --- Routes Aplikasi Utama ---
 @app.route('/')
 def index():
-    """Menampilkan halaman utama absensi dengan dropdown pegawai."""
-    db: Session = next(get_db())
+    """Menampilkan halaman utama absensi dengan dropdown pegawai.
+
+    Absensi terakhir tidak lagi disisipkan ke HTML; script.js mengambilnya dari
+    /api/employees/<id>/last_attendance secara asinkron.
+    """
     employees = []
-    last_attendance_data = None
     selected_employee_id = request.args.get('employee_id', type=int)
     error_message = None
 
     try:
-        employees = db.query(Employee.id, Employee.name).filter(Employee.is_active == True).order_by(Employee.name).all()
-
-        if selected_employee_id:
-            last_att = db.query(Attendance)\
-                .filter(Attendance.employee_id == selected_employee_id)\
-                .order_by(desc(Attendance.timestamp))\
-                .first()
-
-            if last_att:
-                # === PERBAIKAN LegacyAPIWarning ===
-                employee = db.get(Employee, selected_employee_id)
-                # =================================
-
-                if employee:
-                    last_attendance_data = {
-                        "id": last_att.id,
-                        "employee_id": last_att.employee_id,
-                        "employee_name": employee.name,
-                        "employee_position": employee.position,
-                        "timestamp": last_att.timestamp.isoformat(),
-                        "type": last_att.type,
-                        "latitude": last_att.latitude,
-                        "longitude": last_att.longitude,
-                        "photo_base64": base64.b64encode(last_att.photo_blob).decode('utf-8') if last_att.photo_blob else None
-                    }
-                    # Debug print (opsional)
-                    # print(f"DEBUG: Data for {employee.name}: {last_attendance_data}")
-                else:
-                    # === PERBAIKAN Logika Warning ===
-                     print(f"Warning: Employee with ID {selected_employee_id} not found although attendance record exists.")
-                     # Kirim data absensi, tapi beri info nama/posisi tidak ada
-                     last_attendance_data = {
-                        "id": last_att.id, "employee_id": last_att.employee_id,
-                        "employee_name": "[Pegawai Dihapus?]", "employee_position": "-",
-                        # ... sisa data absensi ...
-                        "timestamp": last_att.timestamp.isoformat(), "type": last_att.type,
-                        "latitude": last_att.latitude, "longitude": last_att.longitude,
-                        "photo_base64": base64.b64encode(last_att.photo_blob).decode('utf-8') if last_att.photo_blob else None
-                     }
-                     # =============================
-
+        employees = [(emp.id, emp.name) for emp in roster_cache.get().active] # Dari cache, bukan query per request
     except Exception as e:
-        print(f"Error fetching employees or last attendance: {e}")
-        flash("Gagal memuat data pegawai atau absensi terakhir.", "danger")
+        print(f"Error fetching employees: {e}")
+        flash("Gagal memuat data pegawai.", "danger")
         error_message = "Gagal memuat data. Coba lagi nanti."
-    finally:
-        db.close()
 
     return render_template(
         'index.html',
         employees=employees,
         error=error_message,
-        last_attendance_data=last_attendance_data,
         selected_employee_id=selected_employee_id
     )
 
 
-@app.route('/record_attendance', methods=['POST'])
-def record_attendance():
-    """Menerima dan menyimpan data absensi, dengan validasi sekali sehari."""
-    if not request.is_json: return jsonify({"message": "Request harus JSON."}), 400
-    data = request.json
-    if not data: return jsonify({"message": "Request body JSON kosong."}), 400
+@app.route('/api/employees/<int:employee_id>/last_attendance')
+def api_last_attendance(employee_id):
+    """Absensi terakhir seorang pegawai (satu query join, tanpa blob foto)."""
+    db: Session = next(get_db())
+    try:
+        last_att = db.query(
+                Attendance.id, Attendance.employee_id, Employee.name, Employee.position, Attendance.timestamp,
+                Attendance.type, Attendance.latitude, Attendance.longitude, Attendance.has_photo
+            ).join(Employee, Attendance.employee_id == Employee.id)\
+            .filter(Attendance.employee_id == employee_id)\
+            .order_by(desc(Attendance.timestamp), desc(Attendance.id))\
+            .first() # Memakai indeks (employee_id, timestamp)
+        if not last_att:
+            return jsonify({"message": "Belum ada data absensi untuk pegawai ini."}), 404
+        response = jsonify({
+            "id": last_att.id,
+            "employee_id": last_att.employee_id,
+            "employee_name": last_att.name,
+            "employee_position": last_att.position or '-',
+            "timestamp": last_att.timestamp.isoformat(),
+            "type": last_att.type,
+            "latitude": last_att.latitude,
+            "longitude": last_att.longitude,
+            # URL foto bisa di-cache browser, bukan isi foto base64
+            "photo_url": url_for('get_attendance_photo', attendance_id=last_att.id) if last_att.has_photo else None,
+            "thumb_url": url_for('get_attendance_photo', attendance_id=last_att.id, size='thumb') if last_att.has_photo else None
+        })
+        response.set_etag(f"last-{employee_id}-{last_att.id}")
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Error fetching last attendance for employee {employee_id}: {e}")
+        return jsonify({"message": "Gagal memuat absensi terakhir."}), 500
+    finally:
+        db.close()
+
+
+def read_attendance_payload():
+    """Membaca data absensi dari request: multipart, body image/* mentah, atau JSON base64 (lama).
+
+    Mengembalikan (employee_id, attendance_type, latitude, longitude, photo_bytes); raise ValueError jika tidak valid.
+    """
+    if request.mimetype == 'multipart/form-data':
+        fields = request.form
+        photo_file = request.files.get('photo')
+        photo_bytes = photo_file.read() if photo_file else None
+    elif request.mimetype.startswith('image/'):
+        # Body berisi foto mentah, metadata dikirim lewat query string
+        fields = request.args
+        photo_bytes = request.get_data(cache=False)
+    elif request.is_json:
+        fields = request.get_json(silent=True)
+        if not fields: raise ValueError("Request body JSON kosong.")
+        photo_base64 = fields.get('photo_base64')
+        try: photo_bytes = base64.b64decode(photo_base64) if photo_base64 else None
+        except Exception as e: raise ValueError(f"Format foto base64 tidak valid: {e}")
+    else:
+        raise ValueError("Request harus multipart/form-data, image/jpeg, atau JSON.")
+    return parse_attendance_fields(fields, photo_bytes)
+
+
+def parse_attendance_fields(fields, photo_bytes):
+    """Mengubah field absensi (dict-like) menjadi (employee_id, type, lat, lon, photo); dipakai juga asgi_app.py."""
+    def to_float(value):
+        if value is None or value == '': return None
+        try: return float(value)
+        except (TypeError, ValueError): raise ValueError("Format koordinat tidak valid.")
+
+    try: employee_id = int(fields.get('employee_id')) if fields.get('employee_id') else None
+    except (TypeError, ValueError): raise ValueError("ID pegawai tidak valid.")
+    return (employee_id, fields.get('type'), to_float(fields.get('latitude')),
+            to_float(fields.get('longitude')), photo_bytes)
+
+
+@app.route('/api/employees')
+def api_employees():
+    """Roster pegawai aktif sebagai JSON, dengan ETag agar klien bisa memakai 304 Not Modified."""
+    snapshot = roster_cache.get()
+    response = jsonify([{"id": emp.id, "name": emp.name, "position": emp.position} for emp in snapshot.active])
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache' # Simpan, tapi selalu revalidasi dengan If-None-Match
+    return response.make_conditional(request)
+
+
+def existing_attendance_time(db, employee_id, attendance_type, work_date):
+    """Jam absensi yang sudah ada untuk (pegawai, tipe, tanggal), atau None (lookup indeks unik)."""
+    return db.query(Attendance.timestamp).filter(
+        Attendance.employee_id == employee_id,
+        Attendance.type == attendance_type,
+        Attendance.work_date == work_date
+    ).scalar()
+
+
+def duplicate_attendance_message(attendance_type, existing_ts):
+    """Pesan 409 untuk absen kedua di hari yang sama."""
+    action_text = "Masuk" if attendance_type == 'check_in' else "Keluar"
+    time_str = existing_ts.strftime('%H:%M:%S') if existing_ts else '-'
+    return f"Anda sudah melakukan Absen {action_text} hari ini pada pukul {time_str}. Absen hanya bisa dilakukan sekali per tipe per hari."
+
+
+def insert_attendance(db, values):
+    """Menyimpan satu absensi dan mengembalikan ID-nya (langsung, atau lewat group commit)."""
+    writer = get_attendance_writer()
+    if writer is None:
+        new_attendance = Attendance(**values)
+        db.add(new_attendance)
+        db.flush()
+        new_id = new_attendance.id # Diambil sebelum commit agar tidak perlu refresh
+        refresh_daily_summary(db, new_attendance.employee_id, new_attendance.work_date)
+        db.commit()
+        return new_id
+    # Mode group: thread penulis meng-commit bersama absensi lain dalam beberapa milidetik
+    return writer.write(values)
+
 
-    employee_id = data.get('employee_id')
-    attendance_type = data.get('type') # 'check_in' or 'check_out'
-    latitude = data.get('latitude')
-    longitude = data.get('longitude')
-    photo_base64 = data.get('photo_base64')
+def process_attendance(employee_id, attendance_type, latitude, longitude, photo_blob):
+    """Pipeline absensi bersama Flask & asgi_app.py (sinkron; di ASGI dijalankan lewat asyncio.to_thread).
+
+    Validasi -> cek absen ganda -> simpan foto -> tandai geofence/foto dipakai ulang -> insert (langsung atau group commit).
+    Mengembalikan (body, status, headers); body sukses (201) belum berisi URL foto karena url_for
+    bergantung pada konteks request masing-masing front-end (lihat attendance_photo_urls).
+    """
+    if photo_blob and len(photo_blob) > MAX_UPLOAD_BYTES: # Upload chunked tanpa Content-Length
+        return {"message": f"Ukuran foto melebihi batas {MAX_UPLOAD_BYTES // 1024} KB."}, 413, {}
 
     # Validasi Input Dasar
-    if not all([employee_id, attendance_type, photo_base64]):
-        return jsonify({"message": "Data tidak lengkap (ID, type, foto wajib)."}), 400
+    if not all([employee_id, attendance_type, photo_blob]):
+        return {"message": "Data tidak lengkap (ID, type, foto wajib)."}, 400, {}
     if attendance_type not in ['check_in', 'check_out']:
-        return jsonify({"message": "Tipe absensi tidak valid."}), 400
+        return {"message": "Tipe absensi tidak valid."}, 400, {}
 
     db: Session = next(get_db())
     try:
-        # Cek apakah pegawai valid
-        employee = db.get(Employee, int(employee_id))
+        # Cek apakah pegawai valid (roster cache dulu, DB hanya jika tidak ada di cache)
+        employee = roster_cache.get_employee(employee_id) or db.get(Employee, employee_id)
         if not employee:
-            # Tutup sesi sebelum return
-            db.close()
-            return jsonify({"message": f"Pegawai ID {employee_id} tidak ditemukan."}), 404
+            return {"message": f"Pegawai ID {employee_id} tidak ditemukan."}, 404, {}
 
-        # === VALIDASI ABSEN SEKALI SEHARI ===
-        today = date.today() # Dapatkan tanggal hari ini
-        start_of_day = datetime.combine(today, time.min) # Awal hari (00:00:00)
-        end_of_day = datetime.combine(today, time.max)   # Akhir hari (23:59:59...)
-
-        # Query untuk mencari record dengan tipe dan pegawai yg sama di hari ini
-        existing_record = db.query(Attendance).filter(
-            Attendance.employee_id == employee_id,
-            Attendance.type == attendance_type,
-            Attendance.timestamp >= start_of_day,
-            Attendance.timestamp <= end_of_day
-        ).first()
-
-        if existing_record:
-            action_text = "Masuk" if attendance_type == 'check_in' else "Keluar"
-            time_str = existing_record.timestamp.strftime('%H:%M:%S')
-            message = f"Anda sudah melakukan Absen {action_text} hari ini pada pukul {time_str}. Absen hanya bisa dilakukan sekali per tipe per hari."
-            db.close() # Tutup sesi sebelum return
-            return jsonify({"message": message}), 409 # 409 Conflict cocok untuk ini
-        # === AKHIR VALIDASI ABSEN SEKALI SEHARI ===
+        # === Validasi Geofence (lihat geofence.py & GEOFENCE_MODE) ===
+        outside_geofence, _ = geofence_cache.check(employee_id, employee.position, latitude, longitude)
+        rejection = geofence_rejection(outside_geofence, latitude, longitude)
+        if rejection:
+            message, status = rejection
+            return {"message": message}, status, {} # 403 Forbidden jika di luar area
+        # === Akhir Validasi Geofence ===
 
-        # === Validasi Radius (jika masih digunakan) ===
-        #if latitude is not None and longitude is not None:
-            # ... (Kode validasi radius tetap sama seperti sebelumnya) ...
-            # Jika GAGAL validasi radius: db.close(); return jsonify(...), 403
-             #distance = haversine_distance(ALLOWED_LATITUDE, ALLOWED_LONGITUDE, latitude, longitude)
-             #if distance > ALLOWED_RADIUS_METERS:
-                 #db.close()
-                 #return jsonify({
-                     #"message": f"Lokasi Anda ({distance:.0f}m) di luar radius {ALLOWED_RADIUS_METERS}m."
-                 #}), 403 # 403 Forbidden
-        #else:
-            #db.close()
-            #return jsonify({"message": "Gagal mendapatkan data lokasi Anda."}), 400
-        # === Akhir Validasi Radius ===
+        # === VALIDASI ABSEN SEKALI SEHARI ===
+        # Cek murah lewat indeks unik sebelum foto diproses: absen ganda (kasus paling sering,
+        # misal tombol ditekan dua kali) tidak menulis foto/thumbnail ke photo store sama sekali
+        timestamp = datetime.now()
+        existing_ts = existing_attendance_time(db, employee_id, attendance_type, timestamp.date())
+        if existing_ts:
+            return {"message": duplicate_attendance_message(attendance_type, existing_ts)}, 409, {}
+
+        # Foto di luar profil (klien lama / tanpa downscale) dikompres ulang di server
+        try:
+            photo_blob = fit_capture_profile(photo_blob)
+        except ValueError as ve:
+            return {"message": str(ve)}, 400, {}
 
         # --- Lanjutkan jika semua validasi lolos ---
+        # Foto disimpan di photo store, baris absensi hanya menyimpan referensinya
+        photo_ref = save_photo(photo_blob)
         try:
-            photo_blob = base64.b64decode(photo_base64)
+            store_thumbnail(photo_ref['photo_hash'], photo_blob) # Thumbnail dibuat saat ingest
         except Exception as e:
-            db.close()
-            return jsonify({"message": f"Format foto base64 tidak valid: {e}"}), 400
-
-        new_attendance = Attendance(
-            employee_id=employee_id, timestamp=datetime.now(), type=attendance_type,
-            latitude=latitude, longitude=longitude, photo_blob=photo_blob
-        )
-        db.add(new_attendance)
-        db.commit()
-        db.refresh(new_attendance)
+            print(f"Warning: gagal membuat thumbnail {photo_ref['photo_hash']}: {e}") # Akan dibuat ulang saat diminta
+        # Hash perseptual untuk deteksi foto dipakai ulang (lihat photo_similarity.py & PHOTO_REUSE_MODE)
+        photo_phash = compute_phash(photo_blob)
+        similar_photo_id = photo_index_cache.flag_reuse(photo_phash, employee_id, timestamp.date())
+        values = dict(employee_id=employee_id, timestamp=timestamp, type=attendance_type,
+                      latitude=latitude, longitude=longitude, outside_geofence=outside_geofence,
+                      photo_phash=photo_phash, similar_photo_id=similar_photo_id, **photo_ref)
+        # Indeks unik (employee_id, type, work_date) tetap penentu akhir untuk dua request yang balapan;
+        # foto request yang kalah tidak direferensikan dan dibersihkan remove_orphan_photos
+        try:
+            new_id = insert_attendance(db, values)
+        except (IntegrityError, DuplicateAttendanceError):
+            db.rollback()
+            existing_ts = existing_attendance_time(db, employee_id, attendance_type, timestamp.date())
+            return {"message": duplicate_attendance_message(attendance_type, existing_ts)}, 409, {} # 409 Conflict
+        except GroupCommitTimeout as timeout:
+            # Mode group: antrean penulis lambat. Jika absensi sudah diambil penulis, ia masih bisa
+            # ter-commit setelah ini: 202 agar klien memuat ulang absensi terakhir, bukan mengulang
+            if timeout.pending:
+                return {"message": "Absensi sedang diproses dan statusnya belum pasti. "
+                                   "Muat ulang absensi terakhir sebelum mencoba lagi.",
+                        "status": "pending", "employee_id": employee_id, "type": attendance_type}, 202, {}
+            return {"message": "Server sedang sibuk, absensi belum tersimpan. Silakan coba lagi."}, 503, \
+                {'Retry-After': '5'}
+        # === AKHIR VALIDASI ABSEN SEKALI SEHARI ===
+        photo_index_cache.record(photo_phash, new_id, employee_id, timestamp.date())
 
-        # Siapkan respons JSON sukses
-        response_data = {
-            "message": "Absensi berhasil direkam", "id": new_attendance.id,
-            "employee_id": new_attendance.employee_id, "employee_name": employee.name,
+        return {
+            "message": "Absensi berhasil direkam", "id": new_id,
+            "employee_id": employee_id, "employee_name": employee.name,
             "employee_position": employee.position or '-',
-            "timestamp": new_attendance.timestamp.isoformat(), "type": new_attendance.type,
-            "latitude": new_attendance.latitude, "longitude": new_attendance.longitude,
-            "photo_base64": photo_base64
-        }
-        return jsonify(response_data), 201
+            "timestamp": timestamp.isoformat(), "type": attendance_type,
+            "latitude": latitude, "longitude": longitude, "outside_geofence": outside_geofence,
+        }, 201, {}
 
     except Exception as e:
         db.rollback()
         print(f"Error recording attendance: {e}")
-        return jsonify({"message": "Terjadi kesalahan server saat merekam absensi."}), 500
+        return {"message": "Terjadi kesalahan server saat merekam absensi."}, 500, {}
     finally:
-        # Pastikan sesi ditutup di blok finally utama juga
-        if db.is_active:
-             db.close()
+        db.close()
+
+
+def attendance_photo_urls(body, status, url_for=url_for):
+    """Menambahkan photo_url/thumb_url ke respons sukses process_attendance (url_for milik front-end)."""
+    if status == 201:
+        # URL foto, bukan isi foto, agar payload tidak dikirim balik lewat jaringan
+        body["photo_url"] = url_for('get_attendance_photo', attendance_id=body["id"])
+        body["thumb_url"] = url_for('get_attendance_photo', attendance_id=body["id"], size='thumb')
+    return body
+
+
+@app.route('/record_attendance', methods=['POST'])
+def record_attendance():
+    """Menerima dan menyimpan data absensi, dengan validasi sekali sehari."""
+    # Tolak upload terlalu besar sebelum body dibaca sama sekali
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify({"message": f"Ukuran upload melebihi batas {MAX_UPLOAD_BYTES // 1024} KB."}), 413
+    try:
+        fields = read_attendance_payload()
+    except ValueError as ve:
+        return jsonify({"message": str(ve)}), 400
+    body, status, headers = process_attendance(*fields)
+    return jsonify(attendance_photo_urls(body, status)), status, headers
+
+
+@app.route('/api/capture_profile')
+def capture_profile():
+    """Profil pengambilan foto (dimensi maks, kualitas, target ukuran) untuk klien."""
+    response = jsonify(CAPTURE_PROFILE)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+PHOTO_CACHE_MAX_AGE = int(os.environ.get('PHOTO_CACHE_MAX_AGE', 86400))
+
+def cacheable_photo_response(data, mimetype, etag=None):
+    """Respons foto dengan Cache-Control & ETag (hash isi) agar browser tidak mengunduh ulang."""
+    response = Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'private, max-age={PHOTO_CACHE_MAX_AGE}'
+    if etag:
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return response
 
 
 @app.route('/get_attendance_photo/<int:attendance_id>')
 def get_attendance_photo(attendance_id):
-    """Mengirim data gambar absensi berdasarkan ID."""
+    """Mengirim data gambar absensi berdasarkan ID (?size=thumb untuk thumbnail)."""
+    want_thumb = request.args.get('size') == 'thumb'
     db: Session = next(get_db())
     try:
-        attendance = db.get(Attendance, attendance_id) # Sudah benar pakai db.get
-        if attendance and attendance.photo_blob:
-            return Response(attendance.photo_blob, mimetype='image/jpeg')
+        photo_ref = db.query(Attendance.photo_hash, Attendance.photo_mime, Attendance.photo_tier, Attendance.timestamp)\
+            .filter(Attendance.id == attendance_id).first() \
+            or find_archived_row(db, Attendance, attendance_id, # Absensi yang sudah diarsipkan
+                                 'photo_hash', 'photo_mime', 'photo_tier', 'timestamp')
+        if not photo_ref:
+            return "Foto tidak ditemukan", 404
+        photo_hash, photo_mime, photo_tier, taken_at = photo_ref
+        if photo_hash and want_thumb:
+            thumb = get_or_create_thumbnail(photo_hash, lambda: read_photo(photo_hash, photo_tier, taken_at))
+            if thumb is not None:
+                return cacheable_photo_response(thumb, 'image/jpeg', f"{photo_hash}.thumb")
+        if photo_hash:
+            photo_data = read_photo(photo_hash, photo_tier, taken_at) # Photo store atau arsip dingin (photo_retention.py)
+        else:
+            # Data lama yang belum dipindahkan oleh migrate_photos.py
+            photo_data = db.query(Attendance.photo_blob).filter(Attendance.id == attendance_id).scalar()
+            if photo_data is None:
+                archived = find_archived_row(db, Attendance, attendance_id, 'photo_blob')
+                photo_data = archived[0] if archived else None
+            if photo_data and want_thumb:
+                try: thumb = make_thumbnail(photo_data) # Tidak di-cache karena belum punya hash di store
+                except Exception: thumb = None          # Gambar tidak bisa dibaca Pillow, kirim aslinya
+                if thumb is not None:
+                    return Response(thumb, mimetype='image/jpeg')
+        if photo_data:
+            return cacheable_photo_response(photo_data, photo_mime or 'image/jpeg', photo_hash)
         else:
             return "Foto tidak ditemukan", 404
     except Exception as e:
@@ -227,44 +397,184 @@ def get_attendance_photo(attendance_id):
     finally:
         db.close()
 
+# --- Helper Filter & Pagination Daftar Absensi ---
+MANAGE_PAGE_SIZE = 100      # Jumlah baris default per halaman /manage
+MAX_PAGE_SIZE = 500         # Batas atas parameter limit
+COUNT_ESTIMATE_CAP = 10000  # Hitung total paling banyak sampai angka ini (cukup untuk "10000+")
+
+def parse_attendance_filters(args):
+    """Membaca filter name/start/end dari query string. Mengembalikan (name, start, end, errors)."""
+    name_filter = args.get('name', '')
+    start_date, end_date, errors = None, None, []
+    if args.get('start'):
+        try: start_date = datetime.strptime(args.get('start'), '%Y-%m-%d')
+        except ValueError: errors.append("Format tanggal mulai tidak valid (YYYY-MM-DD).")
+    if args.get('end'):
+        try: end_date = datetime.strptime(args.get('end'), '%Y-%m-%d')
+        except ValueError: errors.append("Format tanggal akhir tidak valid (YYYY-MM-DD).")
+    return name_filter, start_date, end_date, errors
+
+def apply_attendance_filters(query, name_filter, start_date, end_date, source=Attendance):
+    """Menerapkan filter nama & rentang tanggal ke query yang sudah join Employee (source: live/arsip)."""
+    if name_filter: query = query.filter(Employee.name == name_filter)
+    if start_date: query = query.filter(source.timestamp >= start_date)
+    if end_date: query = query.filter(source.timestamp < end_date + timedelta(days=1))
+    return query
+
+def encode_cursor(timestamp, attendance_id):
+    """Membuat cursor keyset (timestamp, id) yang aman dipakai di URL."""
+    raw = f"{timestamp.isoformat()}|{attendance_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Kebalikan encode_cursor. Mengembalikan (timestamp, id) atau raise ValueError."""
+    try:
+        ts_str, id_str = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(ts_str), int(id_str)
+    except Exception:
+        raise ValueError("Cursor tidak valid.")
+
+def paginate_partitioned(db, model, build_query, cursor, limit, start_date=None, end_date=None):
+    """Satu halaman (urut timestamp, id menurun) dengan keyset pagination lintas DB live & arsip.
+
+    build_query(source) membuat query untuk satu PartitionSource (lihat archive.py). Arsip hanya
+    disentuh jika rentang tanggal mencapainya dan halaman belum terisi baris yang lebih baru.
+    Mengembalikan (rows, next_cursor, archived_ids).
+    """
+    cursor_key = decode_cursor(cursor) if cursor else None
+    collected = [] # (row, dari_arsip), urut menurun, paling banyak limit + 1
+    for source in partition_sources(db, model, start_date, end_date):
+        if source.ends_before is not None and len(collected) > limit \
+                and collected[limit][0].timestamp >= source.ends_before:
+            break # Semua baris arsip ini (dan yang lebih lama) berada setelah halaman ini
+        entity, query = source.entity, build_query(source)
+        if cursor_key:
+            cursor_ts, cursor_id = cursor_key
+            # Term pertama berupa rentang agar indeks (timestamp, id) bisa dipakai
+            query = query.filter(
+                entity.timestamp <= cursor_ts,
+                (entity.timestamp < cursor_ts) | (entity.id < cursor_id)
+            )
+        rows = query.order_by(desc(entity.timestamp), desc(entity.id)).limit(limit + 1).all()
+        collected.extend((row, source.schema is not None) for row in rows)
+        collected.sort(key=lambda item: (item[0].timestamp, item[0].id), reverse=True)
+        del collected[limit + 1:]
+    next_cursor = None
+    if len(collected) > limit:
+        collected = collected[:limit]
+        next_cursor = encode_cursor(collected[-1][0].timestamp, collected[-1][0].id)
+    return [row for row, _ in collected], next_cursor, {row.id for row, archived in collected if archived}
+
+def estimate_count(query, id_column=Attendance.id, cap=COUNT_ESTIMATE_CAP):
+    """Menghitung jumlah baris dengan batas atas cap agar tetap murah di tabel besar."""
+    capped = query.with_entities(id_column).limit(cap + 1).subquery()
+    count = query.session.query(func.count()).select_from(capped).scalar()
+    if count > cap:
+        return {"count": cap, "is_exact": False}
+    return {"count": count, "is_exact": True}
+
+def estimate_count_partitioned(db, model, build_query, start_date=None, end_date=None):
+    """estimate_count yang dijumlahkan atas DB live & arsip dalam rentang, berhenti di COUNT_ESTIMATE_CAP."""
+    total = 0
+    for source in partition_sources(db, model, start_date, end_date):
+        result = estimate_count(build_query(source), source.entity.id, COUNT_ESTIMATE_CAP - total)
+        total += result["count"]
+        if not result["is_exact"]:
+            return {"count": COUNT_ESTIMATE_CAP, "is_exact": False}
+    return {"count": total, "is_exact": True}
+
+def attendance_list_query(db, source=Attendance):
+    """Query dasar daftar absensi (tanpa blob foto) yang dipakai /manage dan /api/attendance."""
+    return db.query(
+            source.id, source.employee_id, Employee.name, Employee.position, source.timestamp,
+            source.type, source.latitude, source.longitude, source.has_photo, source.photo_size,
+            source.outside_geofence, source.similar_photo_id
+        ).join(Employee, source.employee_id == Employee.id)
+
+def attendance_list_builder(db, name_filter, start_date, end_date):
+    """build_query untuk paginate_partitioned: daftar absensi terfilter per sumber (live/arsip)."""
+    return lambda source: apply_attendance_filters(attendance_list_query(db, source.entity), name_filter,
+                                                   start_date, end_date, source.entity)
+
 # --- Routes Manajemen (Super Admin) ---
 
 @app.route('/manage')
 @require_basic_auth
 def manage_attendance():
-    # ... (Kode route ini tetap sama seperti sebelumnya) ...
+    """Menampilkan daftar absensi per halaman (keyset pagination) dengan filter."""
     db: Session = next(get_db())
     manage_data = []
-    employee_list = []
+    employee_names = []
+    next_cursor = None
+    total_estimate = None
     name_filter = request.args.get('name', '')
     start_date_str = request.args.get('start', '')
     end_date_str = request.args.get('end', '')
+    cursor = request.args.get('cursor', '')
+    limit = min(max(request.args.get('limit', MANAGE_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
     try:
         employee_list = db.query(Employee.name).order_by(Employee.name).distinct().all()
         employee_names = [name[0] for name in employee_list]
-        query = db.query(
-                Attendance.id, Employee.name, Employee.position, Attendance.timestamp,
-                Attendance.type, Attendance.latitude, Attendance.longitude, Attendance.photo_blob
-            ).join(Employee, Attendance.employee_id == Employee.id)
-        start_date, end_date = None, None
-        if name_filter: query = query.filter(Employee.name == name_filter)
-        if start_date_str:
-            try: start_date = datetime.strptime(start_date_str, '%Y-%m-%d'); query = query.filter(Attendance.timestamp >= start_date)
-            except ValueError: flash("Format tanggal mulai tidak valid (YYYY-MM-DD).", "danger")
-        if end_date_str:
-            try: end_date = datetime.strptime(end_date_str, '%Y-%m-%d'); query = query.filter(Attendance.timestamp < end_date + timedelta(days=1))
-            except ValueError: flash("Format tanggal akhir tidak valid (YYYY-MM-DD).", "danger")
-        filtered_attendance = query.order_by(desc(Attendance.timestamp)).all()
-        for att_id, emp_name, emp_pos, ts, att_type, lat, lon, photo_exists in filtered_attendance:
+        name_filter, start_date, end_date, errors = parse_attendance_filters(request.args)
+        for error in errors: flash(error, "danger")
+        build_query = attendance_list_builder(db, name_filter, start_date, end_date)
+        try:
+            page_rows, next_cursor, archived_ids = paginate_partitioned(db, Attendance, build_query, cursor, limit, start_date, end_date)
+        except ValueError as ve:
+            flash(str(ve), "warning"); cursor = ''
+            page_rows, next_cursor, archived_ids = paginate_partitioned(db, Attendance, build_query, None, limit, start_date, end_date)
+        total_estimate = estimate_count_partitioned(db, Attendance, build_query, start_date, end_date)
+        for row in page_rows:
             manage_data.append({
-                'id': att_id, 'name': emp_name, 'position': emp_pos or '-',
-                'timestamp': ts, 'type': att_type, 'latitude': lat, 'longitude': lon,
-                'photo_url': url_for('get_attendance_photo', attendance_id=att_id) if photo_exists else None
+                'id': row.id, 'name': row.name, 'position': row.position or '-',
+                'timestamp': row.timestamp, 'type': row.type, 'latitude': row.latitude, 'longitude': row.longitude,
+                'outside_geofence': row.outside_geofence, 'archived': row.id in archived_ids,
+                'similar_photo_id': row.similar_photo_id,
+                'similar_photo_url': url_for('get_attendance_photo', attendance_id=row.similar_photo_id) if row.similar_photo_id else None,
+                'photo_url': url_for('get_attendance_photo', attendance_id=row.id) if row.has_photo else None,
+                'thumb_url': url_for('get_attendance_photo', attendance_id=row.id, size='thumb') if row.has_photo else None
             })
     except Exception as e: print(f"Error manage: {e}"); flash("Gagal memuat data manajemen.", "danger")
     finally: db.close()
     return render_template('manage_attendance.html', attendance_data=manage_data,
-                           employee_names=employee_names, current_filters={'name': name_filter, 'start': start_date_str, 'end': end_date_str})
+                           employee_names=employee_names, current_filters={'name': name_filter, 'start': start_date_str, 'end': end_date_str},
+                           next_cursor=next_cursor, is_first_page=not cursor, page_limit=limit, total_estimate=total_estimate)
+
+
+@app.route('/api/attendance')
+@require_basic_auth
+def api_attendance():
+    """API JSON daftar absensi dengan filter yang sama seperti /manage dan cursor keyset."""
+    name_filter, start_date, end_date, errors = parse_attendance_filters(request.args)
+    if errors: return jsonify({"message": " ".join(errors)}), 400
+    limit = min(max(request.args.get('limit', MANAGE_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    db: Session = next(get_db())
+    try:
+        build_query = attendance_list_builder(db, name_filter, start_date, end_date)
+        try:
+            page_rows, next_cursor, archived_ids = paginate_partitioned(
+                db, Attendance, build_query, request.args.get('cursor'), limit, start_date, end_date)
+        except ValueError as ve:
+            return jsonify({"message": str(ve)}), 400
+        items = [{
+            "id": row.id, "employee_id": row.employee_id, "employee_name": row.name,
+            "employee_position": row.position or '-', "timestamp": row.timestamp.isoformat(),
+            "type": row.type, "latitude": row.latitude, "longitude": row.longitude,
+            "outside_geofence": row.outside_geofence, "archived": row.id in archived_ids,
+            "similar_photo_id": row.similar_photo_id,
+            "has_photo": bool(row.has_photo), "photo_size": row.photo_size,
+            "photo_url": url_for('get_attendance_photo', attendance_id=row.id) if row.has_photo else None,
+            "thumb_url": url_for('get_attendance_photo', attendance_id=row.id, size='thumb') if row.has_photo else None
+        } for row in page_rows]
+        return jsonify({
+            "items": items, "next_cursor": next_cursor, "limit": limit,
+            "total_estimate": estimate_count_partitioned(db, Attendance, build_query, start_date, end_date)
+        })
+    except Exception as e:
+        print(f"Error api attendance: {e}")
+        return jsonify({"message": "Gagal memuat data absensi."}), 500
+    finally:
+        db.close()
 
 
 @app.route('/manage/delete/<int:attendance_id>', methods=['POST'])
@@ -284,7 +594,9 @@ def delete_attendance(attendance_id):
             log = AuditLog(user=request.authorization.username, action="DELETE", record_type="Attendance", record_id=attendance_id, details=log_details)
             db.add(log)
             db.delete(att)
+            refresh_daily_summary(db, att.employee_id, att.work_date or att.timestamp.date())
             db.commit()
+            photo_index_cache.discard(attendance_id) # Proses lain melewatinya saat menandai foto mirip
             flash(f"Data absensi ID {attendance_id} berhasil dihapus.", "success")
         else: flash(f"Data absensi ID {attendance_id} tidak ditemukan.", "warning")
     except Exception as e: db.rollback(); print(f"Error deleting {attendance_id}: {e}"); flash("Gagal menghapus data.", "danger")
@@ -332,14 +644,20 @@ def add_attendance():
 
             new_attendance = Attendance(
                 employee_id=employee_id, timestamp=timestamp, type=attendance_type,
-                latitude=latitude, longitude=longitude, photo_blob=None # Foto None
+                latitude=latitude, longitude=longitude, photo_blob=None, # Foto None
+                outside_geofence=geofence_cache.check(employee_id, employee.position, latitude, longitude)[0]
             )
             db.add(new_attendance)
-            db.flush()
+            try:
+                db.flush()
+            except IntegrityError:
+                flash(f"'{employee.name}' sudah punya absensi tipe ini pada {timestamp.strftime('%Y-%m-%d')}.", "danger")
+                raise ValueError("Absensi duplikat")
 
             log_details = f"Menambahkan absensi '{attendance_type}' untuk '{employee.name}' ({employee_id}) @ {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
             log = AuditLog(user=request.authorization.username, action="CREATE", record_type="Attendance", record_id=new_attendance.id, details=log_details)
             db.add(log)
+            refresh_daily_summary(db, employee_id, new_attendance.work_date)
 
             db.commit()
             flash("Data absensi baru berhasil ditambahkan.", "success")
@@ -352,14 +670,11 @@ def add_attendance():
             # Jadi tidak perlu flash lagi di sini, kecuali jika raise tanpa flash
             db.rollback()
             db.close()
-            # Perlu query ulang employees untuk render ulang form
-            db_get = next(get_db())
+            # Daftar pegawai untuk render ulang form (dari roster cache)
             try:
-                 employees_for_form = db_get.query(Employee.id, Employee.name).order_by(Employee.name).all()
+                 employees_for_form = roster_choices()
             except Exception as query_e:
                  print(f"Error fetching employees after validation error: {query_e}")
-            finally:
-                 db_get.close()
             # Kembalikan ke form dengan status 400 Bad Request
             return render_template('add_attendance.html', employees=employees_for_form), 400
 
@@ -369,28 +684,22 @@ def add_attendance():
             # Selalu flash pesan error internal di sini
             flash(f"Gagal menambahkan data absensi baru: Terjadi error internal.", "danger")
             db.close()
-            # Render ulang form dengan pesan error, perlu query employees lagi
-            db_get: Session = next(get_db())
+            # Render ulang form dengan pesan error (daftar pegawai dari roster cache)
             try:
-                 employees_for_form = db_get.query(Employee.id, Employee.name).order_by(Employee.name).all()
+                 employees_for_form = roster_choices()
             except Exception as query_e:
                  print(f"Error fetching employees after general error: {query_e}")
-            finally:
-                 db_get.close()
             # Kembalikan ke form dengan status 500 Internal Server Error
             return render_template('add_attendance.html', employees=employees_for_form), 500
         # === AKHIR BLOK EXCEPT YANG DIPERBAIKI ===
 
     else: # Metode GET
-        db_get: Session = next(get_db())
         employees_for_form = []
         try:
-            employees_for_form = db_get.query(Employee.id, Employee.name).order_by(Employee.name).all()
+            employees_for_form = roster_choices()
         except Exception as e:
             print(f"Error fetching employees for add form: {e}")
             flash("Gagal memuat daftar pegawai.", "danger")
-        finally:
-            db_get.close()
         return render_template('add_attendance.html', employees=employees_for_form)
 
 
@@ -447,16 +756,27 @@ def edit_attendance(attendance_id):
 
 
             if changes_list:
+                old_summary_key = (attendance_to_edit.employee_id, attendance_to_edit.timestamp.date())
                 attendance_to_edit.employee_id = new_employee_id
                 attendance_to_edit.timestamp = new_timestamp
                 attendance_to_edit.type = new_attendance_type
                 attendance_to_edit.latitude = new_latitude
                 attendance_to_edit.longitude = new_longitude
+                new_employee = db.get(Employee, new_employee_id)
+                attendance_to_edit.outside_geofence = geofence_cache.check(
+                    new_employee_id, new_employee.position if new_employee else None, new_latitude, new_longitude)[0]
 
                 log_details = f"Mengubah data absensi ID {attendance_id}: {'; '.join(changes_list)}. Data lama: ({old_data_str})"
                 log = AuditLog(user=request.authorization.username, action="UPDATE", record_type="Attendance", record_id=attendance_id, details=log_details)
                 db.add(log)
-                db.commit()
+                try:
+                    # Ringkasan harian lama & baru (pegawai/tanggal bisa berubah)
+                    refresh_daily_summary(db, *old_summary_key)
+                    if (new_employee_id, new_timestamp.date()) != old_summary_key:
+                        refresh_daily_summary(db, new_employee_id, new_timestamp.date())
+                    db.commit()
+                except IntegrityError:
+                    raise ValueError(f"Pegawai sudah punya absensi tipe ini pada {new_timestamp.strftime('%Y-%m-%d')}.")
                 flash("Data absensi berhasil diperbarui.", "success")
             else:
                  flash("Tidak ada perubahan data yang disimpan.", "info")
@@ -467,8 +787,8 @@ def edit_attendance(attendance_id):
         except ValueError as ve:
             flash(str(ve), "danger")
             db.rollback(); db.close() # Rollback dan tutup sesi
-            # Query ulang employees untuk render ulang form
-            db_get = next(get_db()); employees = db_get.query(Employee.id, Employee.name).order_by(Employee.name).all(); db_get.close()
+            # Daftar pegawai untuk render ulang form (dari roster cache)
+            employees = roster_choices()
             # Perlu objek attendance_to_edit lagi (bisa didapat dari awal atau query lagi)
             db_get2 = next(get_db()); attendance_to_edit_render = db_get2.get(Attendance, attendance_id); db_get2.close()
             return render_template('edit_attendance.html', attendance=attendance_to_edit_render, employees=employees), 400
@@ -477,14 +797,14 @@ def edit_attendance(attendance_id):
             db.rollback(); db.close() # Rollback dan tutup sesi
             print(f"Error editing attendance {attendance_id}: {e}")
             flash("Gagal memperbarui data absensi karena error internal.", "danger")
-            db_get = next(get_db()); employees = db_get.query(Employee.id, Employee.name).order_by(Employee.name).all(); db_get.close()
+            employees = roster_choices()
             db_get2 = next(get_db()); attendance_to_edit_render = db_get2.get(Attendance, attendance_id); db_get2.close()
             return render_template('edit_attendance.html', attendance=attendance_to_edit_render, employees=employees), 500
 
     else: # Metode GET
         employees = []
         try:
-            employees = db.query(Employee.id, Employee.name).order_by(Employee.name).all()
+            employees = roster_choices()
         except Exception as e:
             print(f"Error fetching employees for edit form: {e}")
             flash("Gagal memuat daftar pegawai.", "danger")
@@ -493,69 +813,289 @@ def edit_attendance(attendance_id):
         return render_template('edit_attendance.html', attendance=attendance_to_edit, employees=employees)
 
 
+@app.route('/manage/employees/import', methods=['GET', 'POST'])
+@require_basic_auth
+def import_employees_page():
+    """Upload roster pegawai (Excel/CSV); diproses sebagai job latar belakang (lihat roster_import.py)."""
+    if request.method == 'POST':
+        upload = request.files.get('roster_file')
+        filename = os.path.basename(upload.filename) if upload and upload.filename else ''
+        extension = os.path.splitext(filename)[1].lower()
+        if not filename or extension not in ROSTER_IMPORT_EXTENSIONS:
+            flash(f"Pilih file roster ({', '.join(ROSTER_IMPORT_EXTENSIONS)}).", "danger")
+            return redirect(url_for('import_employees_page'))
+        fd, upload_path = tempfile.mkstemp(prefix='roster-', suffix=extension)
+        with os.fdopen(fd, 'wb') as f:
+            upload.save(f)
+        try:
+            job = start_import_job(upload_path, filename, request.authorization.username,
+                                   force=bool(request.form.get('force')))
+        except ImportJobBusy as e:
+            os.remove(upload_path)
+            flash(str(e), "warning")
+            return redirect(url_for('import_employees_page'))
+        except Exception as e:
+            os.remove(upload_path)
+            print(f"Error starting roster import: {e}")
+            flash("Gagal memulai import roster.", "danger")
+            return redirect(url_for('import_employees_page'))
+        flash(f"Import '{filename}' dimulai.", "success")
+        return redirect(url_for('import_employees_page', job=job['id']))
+
+    db: Session = next(get_db())
+    job = None
+    try:
+        job, _ = load_job(db) # Tampilkan job terakhir (berjalan atau selesai)
+    except Exception as e:
+        print(f"Error loading roster import job: {e}")
+    finally:
+        db.close()
+    return render_template('import_employees.html', job=job, active_statuses=ACTIVE_STATUSES,
+                           extensions=ROSTER_IMPORT_EXTENSIONS)
+
+
+@app.route('/manage/employees/import/<job_id>/status')
+@require_basic_auth
+def import_employees_status(job_id):
+    """Status & progres job import roster (JSON, untuk polling)."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"message": "Job tidak ditemukan."}), 404
+    return jsonify(job)
+
+
 @app.route('/export_filtered_excel')
 @require_basic_auth # <-- Pastikan decorator aktif
 def export_filtered_excel():
-    # ... (Kode export tetap sama seperti sebelumnya) ...
+    """Ekspor hasil filter sebagai XLSX (default) atau CSV (?format=csv).
+
+    Hanya CSV yang benar-benar streaming (byte pertama terkirim sebelum query selesai). XLSX harus
+    ditulis utuh ke file sementara dulu (memori tetap datar, tapi klien menunggu sampai selesai);
+    pakai CSV untuk rentang besar.
+    """
     db: Session = next(get_db())
     name_filter = request.args.get('name', '')
     start_date_str = request.args.get('start', '')
     end_date_str = request.args.get('end', '')
+    export_format = request.args.get('format', 'xlsx')
     try:
-        query = db.query(
-                Attendance.id, Employee.name, Employee.position, Attendance.timestamp,
-                Attendance.type, Attendance.latitude, Attendance.longitude
-            ).join(Employee, Attendance.employee_id == Employee.id)
-        if name_filter: query = query.filter(Employee.name == name_filter)
-        if start_date_str:
-            try: query = query.filter(Attendance.timestamp >= datetime.strptime(start_date_str, '%Y-%m-%d'))
-            except ValueError: pass
-        if end_date_str:
-            try: query = query.filter(Attendance.timestamp < datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1))
-            except ValueError: pass
-        filtered_list = query.order_by(desc(Attendance.timestamp)).all()
-        df = pd.DataFrame(filtered_list, columns=[
-            'ID Absen', 'Nama Pegawai', 'Posisi', 'Waktu', 'Tipe', 'Latitude', 'Longitude'
-        ])
-        if not df.empty:
-            df['Waktu'] = pd.to_datetime(df['Waktu']).dt.strftime('%Y-%m-%d %H:%M:%S')
-            df['Tipe'] = df['Tipe'].apply(lambda x: 'Masuk' if x == 'check_in' else ('Keluar' if x == 'check_out' else x))
-            # Ambil data foto dalam loop terpisah untuk menghindari N+1 jika memungkinkan
-            photo_urls = {}
-            att_ids = df['ID Absen'].tolist()
-            if att_ids:
-                photos_q = db.query(Attendance.id, Attendance.photo_blob).filter(Attendance.id.in_(att_ids)).all()
-                photo_urls = {att_id: url_for('get_attendance_photo', attendance_id=att_id, _external=True) for att_id, blob in photos_q if blob}
-            df['URL Foto'] = df['ID Absen'].map(photo_urls).fillna('') # Gunakan map untuk efisiensi
-
-        else: df['URL Foto'] = pd.Series(dtype='object')
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer: df.to_excel(writer, sheet_name='Rekap Absensi Filtered', index=False)
-        output.seek(0)
+        _, start_date, end_date, _ = parse_attendance_filters(request.args) # Tanggal tidak valid diabaikan
+        def export_query(source):
+            entity = source.entity
+            query = db.query(
+                    entity.id, Employee.name, Employee.position, entity.timestamp,
+                    entity.type, entity.latitude, entity.longitude, entity.has_photo
+                ).join(Employee, entity.employee_id == Employee.id)
+            query = apply_attendance_filters(query, name_filter, start_date, end_date, entity)
+            return query.order_by(desc(entity.timestamp), desc(entity.id))
+        # DB live lalu arsip yang beririsan dengan rentang (arsip di-ATTACH saat gilirannya)
+        queries = (export_query(source) for source in partition_sources(db, Attendance, start_date, end_date))
+        # URL foto dibangun dari prefix sekali saja, bukan url_for per baris
+        photo_url_prefix = url_for('get_attendance_photo', attendance_id=0, _external=True)[:-1]
+        rows = iter_export_rows(iter_queries(queries), photo_url_prefix)
         timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        if export_format == 'csv':
+            def generate():
+                # Sesi DB tetap terbuka selama respons dikirim, ditutup setelah baris terakhir
+                try: yield from iter_csv(rows)
+                finally: db.close()
+            filename = f"rekap_absensi_filtered_{timestamp_str}.csv"
+            return Response(stream_with_context(generate()), mimetype='text/csv; charset=utf-8',
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+        # XLSX ditulis baris demi baris (write-only) ke file sementara, lalu dikirim per potongan
+        output = write_xlsx_tempfile(rows, sheet_name='Rekap Absensi Filtered')
+        db.close()
         filename = f"rekap_absensi_filtered_{timestamp_str}.xlsx"
-        return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                         as_attachment=True, download_name=filename)
-    except Exception as e: print(f"Error exporting: {e}"); flash("Gagal export Excel.", "danger"); return redirect(url_for('manage_attendance', name=name_filter, start=start_date_str, end=end_date_str))
-    finally: db.close()
+        return Response(iter_file(output), mimetype=XLSX_MIMETYPE,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    except Exception as e:
+        db.close()
+        print(f"Error exporting: {e}"); flash("Gagal export Excel.", "danger")
+        return redirect(url_for('manage_attendance', name=name_filter, start=start_date_str, end=end_date_str))
+
+@app.route('/reports/monthly_matrix')
+@require_basic_auth
+def monthly_matrix():
+    """Matriks bulanan pegawai x tanggal (jam masuk-keluar atau kode status), HTML atau XLSX (?format=xlsx)."""
+    month_str = request.args.get('month') or date.today().strftime('%Y-%m')
+    months = min(max(request.args.get('months', 1, type=int), 1), MATRIX_MAX_MONTHS)
+    mode = 'status' if request.args.get('mode') == 'status' else 'times'
+    try:
+        start_date, end_date = month_range(month_str, months)
+    except ValueError:
+        flash("Format bulan tidak valid (YYYY-MM).", "danger")
+        return redirect(url_for('monthly_matrix'))
+
+    db: Session = next(get_db())
+    try:
+        summaries = load_daily_summaries(db, start_date, end_date) # Satu query untuk seluruh rentang
+    except Exception as e:
+        print(f"Error loading monthly matrix: {e}")
+        flash("Gagal memuat data matriks absensi.", "danger")
+        return redirect(url_for('manage_attendance'))
+    finally:
+        db.close()
+    matrix = build_monthly_matrix(summaries, roster_cache.get().employees, start_date, end_date, mode)
+
+    if request.args.get('format') == 'xlsx':
+        output = matrix_to_xlsx(matrix, legend=STATUS_CODES if mode == 'status' else None)
+        filename = f"matriks_absensi_{start_date.strftime('%Y%m')}_{end_date.strftime('%Y%m')}.xlsx"
+        return Response(iter_file(output), mimetype=XLSX_MIMETYPE,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+    dates = [col for col in matrix.columns if col != TOTAL_COLUMN]
+    return render_template('monthly_matrix.html', groups=matrix_groups(matrix), dates=dates,
+                           month=month_str, months=months, mode=mode, status_codes=STATUS_CODES)
+
+
+@app.route('/reports/photo_reuse')
+@require_basic_auth
+def photo_reuse_report():
+    """Pasangan absensi dengan foto mirip (hari lain atau pegawai lain) dalam rentang tanggal."""
+    today = date.today()
+    try:
+        start_date = datetime.strptime(request.args.get('start') or (today - timedelta(days=6)).isoformat(), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end') or today.isoformat(), '%Y-%m-%d').date()
+    except ValueError:
+        flash("Format tanggal tidak valid (YYYY-MM-DD).", "danger")
+        return redirect(url_for('photo_reuse_report'))
+    distance = min(max(request.args.get('distance', PHOTO_REUSE_DISTANCE, type=int), 0), PHOTO_REUSE_DISTANCE)
+
+    matches = []
+    db: Session = next(get_db())
+    try:
+        index = photo_index_cache.get() # Indeks dipakai bersama jalur insert (mode 'flag')
+        if index is None:
+            flash("Indeks foto sedang dimuat, muat ulang halaman ini sebentar lagi.", "warning")
+        else:
+            matches = find_reused_photos(db, index, datetime.combine(start_date, time()),
+                                         datetime.combine(end_date + timedelta(days=1), time()), distance)
+    except Exception as e:
+        print(f"Error loading photo reuse report: {e}")
+        flash("Gagal memuat laporan foto mirip.", "danger")
+    finally:
+        db.close()
+    employees = roster_cache.get().by_id
+    rows = [{
+        'distance': match.distance,
+        'entries': [{
+            'id': entry.attendance_id, 'work_date': entry.work_date,
+            'name': employees[entry.employee_id].name if entry.employee_id in employees else f"ID {entry.employee_id}",
+            'photo_url': url_for('get_attendance_photo', attendance_id=entry.attendance_id),
+            'thumb_url': url_for('get_attendance_photo', attendance_id=entry.attendance_id, size='thumb'),
+        } for entry in (match.first, match.second)],
+        'same_employee': match.first.employee_id == match.second.employee_id,
+    } for match in matches]
+    return render_template('photo_reuse.html', rows=rows, start=start_date.isoformat(), end=end_date.isoformat(),
+                           distance=distance, max_distance=PHOTO_REUSE_DISTANCE, mode=PHOTO_REUSE_MODE)
+
+
+@app.route('/reports/work_hours')
+@require_basic_auth
+def work_hours_report():
+    """Rekap jam kerja, keterlambatan, pulang cepat & absen keluar hilang; HTML atau XLSX (?format=xlsx)."""
+    today = date.today()
+    try:
+        start_date = datetime.strptime(request.args.get('start') or today.replace(day=1).isoformat(), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end') or today.isoformat(), '%Y-%m-%d').date()
+    except ValueError:
+        flash("Format tanggal tidak valid (YYYY-MM-DD).", "danger")
+        return redirect(url_for('work_hours_report'))
+
+    db: Session = next(get_db())
+    try:
+        events = load_events(db, start_date, end_date) # Satu query event untuk seluruh rentang
+    except Exception as e:
+        print(f"Error loading work hours: {e}")
+        flash("Gagal memuat data jam kerja.", "danger")
+        return redirect(url_for('manage_attendance'))
+    finally:
+        db.close()
+    shifts = compute_work_hours(events, roster_cache.get().employees, start_date, end_date)
+    summary = summarize_work_hours(shifts)
+
+    if request.args.get('format') == 'xlsx':
+        output = write_xlsx_tempfile(summary_rows(summary), 'Rekap Jam Kerja', headers=SUMMARY_HEADERS,
+                                     extra_sheets={'Detail Shift': (DETAIL_HEADERS, detail_rows(shifts))})
+        filename = f"jam_kerja_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx"
+        return Response(iter_file(output), mimetype=XLSX_MIMETYPE,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+    # Di halaman hanya shift yang bermasalah; detail lengkap ada di ekspor
+    violations = shifts[(shifts['late_minutes'] > 0) | (shifts['early_leave_minutes'] > 0)
+                        | shifts['missing_check_in'] | shifts['missing_check_out']]
+    return render_template('work_hours.html', summary=summary_rows(summary), summary_headers=SUMMARY_HEADERS,
+                           violations=detail_rows(violations), detail_headers=DETAIL_HEADERS,
+                           start=start_date.isoformat(), end=end_date.isoformat())
+
+
+AUDIT_ACTIONS = ['CREATE', 'UPDATE', 'DELETE', 'IMPORT']
+AUDIT_RECORD_TYPES = ['Attendance', 'Employee']
+
+def parse_audit_filters(args):
+    """Membaca filter log audit dari query string. Mengembalikan (filters, errors)."""
+    filters = {key: args.get(key, '').strip() for key in ['user', 'action', 'record_type', 'record_id', 'start', 'end', 'q']}
+    errors = []
+    if filters['record_id'] and not filters['record_id'].isdigit():
+        errors.append("ID record harus berupa angka."); filters['record_id'] = ''
+    for key, label in [('start', 'mulai'), ('end', 'akhir')]:
+        if filters[key]:
+            try: datetime.strptime(filters[key], '%Y-%m-%d')
+            except ValueError: errors.append(f"Format tanggal {label} tidak valid (YYYY-MM-DD)."); filters[key] = ''
+    return filters, errors
+
+def audit_date_range(filters):
+    """(start, end) datetime dari filter log audit (None jika kosong)."""
+    start = datetime.strptime(filters['start'], '%Y-%m-%d') if filters['start'] else None
+    end = datetime.strptime(filters['end'], '%Y-%m-%d') if filters['end'] else None
+    return start, end
+
+def apply_audit_filters(query, filters, source=AuditLog, schema=None):
+    """Menerapkan filter user/aksi/record/tanggal/teks; masing-masing didukung indeks audit_log."""
+    start, end = audit_date_range(filters)
+    if filters['user']: query = query.filter(source.user == filters['user'])
+    if filters['action']: query = query.filter(source.action == filters['action'])
+    if filters['record_type']: query = query.filter(source.record_type == filters['record_type'])
+    if filters['record_id']: query = query.filter(source.record_id == int(filters['record_id']))
+    if start: query = query.filter(source.timestamp >= start)
+    if end: query = query.filter(source.timestamp < end + timedelta(days=1))
+    text_clause = search_clause(filters['q'], source, schema)
+    if text_clause is not None: query = query.filter(text_clause)
+    return query
+
 
 @app.route('/audit_logs')
 @require_basic_auth # Proteksi halaman log
 def audit_logs():
-    """Menampilkan halaman log audit perubahan data."""
+    """Menampilkan log audit per halaman (keyset pagination) dengan filter & pencarian teks."""
     db: Session = next(get_db())
     logs = []
+    users = []
+    next_cursor = None
+    filters, errors = parse_audit_filters(request.args)
+    cursor = request.args.get('cursor', '')
+    limit = min(max(request.args.get('limit', MANAGE_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    for error in errors: flash(error, "danger")
     try:
-        # Ambil log terbaru (misal 200 terakhir), urutkan dari yg paling baru
-        # Anda bisa menambahkan pagination di sini jika log sangat banyak
-        logs = db.query(AuditLog).order_by(desc(AuditLog.timestamp)).limit(200).all()
+        # DISTINCT kolom terdepan indeks (user, timestamp), tidak memindai tabel
+        users = [row[0] for row in db.query(AuditLog.user).filter(AuditLog.user.isnot(None)).distinct().order_by(AuditLog.user)]
+        build_query = lambda source: apply_audit_filters(db.query(source.entity), filters, source.entity, source.schema)
+        start, end = audit_date_range(filters)
+        try:
+            logs, next_cursor, _ = paginate_partitioned(db, AuditLog, build_query, cursor, limit, start, end)
+        except ValueError as ve:
+            flash(str(ve), "warning"); cursor = ''
+            logs, next_cursor, _ = paginate_partitioned(db, AuditLog, build_query, None, limit, start, end)
     except Exception as e:
         print(f"Error fetching audit logs: {e}")
         flash("Gagal memuat data log audit.", "danger")
     finally:
         db.close()
-    # Pastikan Anda sudah membuat template 'audit_log_view.html'
-    return render_template('audit_log_view.html', logs=logs)
+    return render_template('audit_log_view.html', logs=logs, users=users, actions=AUDIT_ACTIONS,
+                           record_types=AUDIT_RECORD_TYPES, current_filters=filters,
+                           next_cursor=next_cursor, is_first_page=not cursor, page_limit=limit)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,318 @@
+# archive.py
+# Arsip per periode: baris attendance & audit_log dari periode yang sudah tutup (tahun/bulan)
+# dipindah ke file SQLite terpisah di ARCHIVE_DIR, dicatat di tabel archive_partitions.
+# Query daftar/ekspor/log memakai partition_sources(), yang meng-ATTACH file arsip hanya
+# jika rentang tanggal yang diminta menyentuh periode arsip tersebut.
+# Ringkasan harian (daily_summary) tetap di DB live sehingga laporan bulanan tidak berubah.
+# Pemindahan = salin -> verifikasi -> hapus, tiap tahap transaksi sendiri di satu file (transaksi
+# lintas file ATTACH tidak atomik di mode WAL); proses yang terhenti di tahap mana pun aman diulang.
+# ID attendance & audit_log memakai AUTOINCREMENT (migrasi 15) dan sequence-nya dinaikkan sampai
+# ID terbesar di arsip sebelum menghapus, sehingga ID tidak pernah dipakai ulang oleh baris baru.
+#
+#   python archive.py list
+#   python archive.py run [--period year|month] [--keep-months 3] [--vacuum]
+#   python archive.py period 2023            # arsipkan satu periode tertentu
+import os
+import argparse
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Column, MetaData, Table, bindparam, create_engine, func, inspect, update
+from sqlalchemy.orm import aliased
+
+from database import (BASE_DIR, DATABASE_URL, engine, SessionLocal, Employee, Attendance, AuditLog,
+                      ArchivePartition, is_sqlite_url)
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+# Jumlah bulan terakhir (di luar bulan berjalan) yang selalu tetap di DB live
+ARCHIVE_KEEP_MONTHS = int(os.environ.get('ARCHIVE_KEEP_MONTHS', 3))
+# SQLite default maksimal 10 database ter-ATTACH per koneksi; sisakan ruang
+ARCHIVE_ATTACH_LIMIT = int(os.environ.get('ARCHIVE_ATTACH_LIMIT', 8))
+ARCHIVE_SCHEMA_PREFIX = 'arch_'
+ARCHIVED_MODELS = (Attendance, AuditLog)
+
+# entity: model (live) atau alias model ke tabel arsip; schema: nama ATTACH (None = live);
+# ends_before: batas atas timestamp periode arsip (None = live, bisa berisi tanggal berapa pun)
+PartitionSource = namedtuple('PartitionSource', ['entity', 'schema', 'ends_before'])
+
+
+# --- Periode ---
+def period_bounds(label):
+    """'2023' -> (2023-01-01, 2023-12-31); '2023-05' -> (2023-05-01, 2023-05-31)."""
+    if len(label) == 4:
+        year = int(label)
+        return date(year, 1, 1), date(year, 12, 31)
+    start = datetime.strptime(label, '%Y-%m').date()
+    next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, next_month - timedelta(days=1)
+
+def period_label(day, period):
+    return day.strftime('%Y') if period == 'year' else day.strftime('%Y-%m')
+
+def archive_cutoff(keep_months=ARCHIVE_KEEP_MONTHS, today=None):
+    """Tanggal pertama yang tetap di DB live: awal bulan berjalan mundur keep_months bulan."""
+    today = today or date.today()
+    year, month = divmod(today.year * 12 + today.month - 1 - keep_months, 12)
+    return date(year, month + 1, 1)
+
+def closed_periods(db, period='year', keep_months=ARCHIVE_KEEP_MONTHS):
+    """Label periode yang seluruhnya sebelum cutoff dan masih punya data di DB live."""
+    cutoff = archive_cutoff(keep_months)
+    oldest = [value for value in (db.query(func.min(Attendance.timestamp)).scalar(),
+                                  db.query(func.min(AuditLog.timestamp)).scalar()) if value]
+    if not oldest:
+        return []
+    labels, day = [], min(oldest).date()
+    while True:
+        label = period_label(day, period)
+        start, end = period_bounds(label)
+        if end >= cutoff:
+            return labels
+        labels.append(label)
+        day = end + timedelta(days=1)
+
+
+# --- Akses Arsip Saat Query ---
+def archive_path(filename):
+    return os.path.join(ARCHIVE_DIR, filename)
+
+def archive_files():
+    """Path file arsip yang tercatat di manifest dan ada di disk (kosong untuk non-SQLite)."""
+    if not is_sqlite_url(DATABASE_URL):
+        return []
+    db = SessionLocal()
+    try:
+        filenames = [filename for (filename,) in db.query(ArchivePartition.filename).order_by(ArchivePartition.start_date)]
+    finally:
+        db.close()
+    return [archive_path(filename) for filename in filenames if os.path.exists(archive_path(filename))]
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+_archive_entities = {}
+
+def archive_entity(model, schema):
+    """Alias ORM model ke tabel yang sama di database arsip yang di-ATTACH sebagai schema."""
+    key = (model, schema)
+    if key not in _archive_entities:
+        table = Table(model.__tablename__, MetaData(),
+                      *[Column(col.name, col.type, primary_key=col.primary_key) for col in model.__table__.columns],
+                      schema=schema)
+        _archive_entities[key] = aliased(model, table, adapt_on_names=True)
+    return _archive_entities[key]
+
+def attach_partition(db, partition):
+    """Memastikan file arsip ter-ATTACH di koneksi sesi; arsip lain dilepas jika melebihi batas."""
+    schema = f"{ARCHIVE_SCHEMA_PREFIX}{partition.id}"
+    conn = db.connection()
+    attached = [row[1] for row in conn.exec_driver_sql("PRAGMA database_list")
+                if row[1].startswith(ARCHIVE_SCHEMA_PREFIX)]
+    if schema in attached:
+        return schema
+    while len(attached) >= ARCHIVE_ATTACH_LIMIT:
+        conn.exec_driver_sql(f"DETACH DATABASE {attached.pop(0)}")
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (archive_path(partition.filename),))
+    return schema
+
+def partition_sources(db, model, start_date=None, end_date=None):
+    """Sumber data untuk rentang tanggal: DB live dulu, lalu arsip yang beririsan (terbaru dulu).
+
+    Generator; arsip di-ATTACH saat giliran sumbernya diambil, bukan sekaligus.
+    """
+    yield PartitionSource(model, None, None)
+    if not is_sqlite_url(DATABASE_URL):
+        return
+    query = db.query(ArchivePartition)
+    if start_date:
+        query = query.filter(ArchivePartition.end_date >= _as_date(start_date))
+    if end_date:
+        query = query.filter(ArchivePartition.start_date <= _as_date(end_date))
+    for partition in query.order_by(ArchivePartition.end_date.desc()).all():
+        if not os.path.exists(archive_path(partition.filename)):
+            print(f"WARNING: file arsip {partition.filename} tidak ditemukan, periode {partition.name} dilewati")
+            continue
+        schema = attach_partition(db, partition)
+        ends_before = datetime.combine(partition.end_date + timedelta(days=1), time())
+        yield PartitionSource(archive_entity(model, schema), schema, ends_before)
+
+def batch_partitions(db):
+    """(nama, partisi) untuk batch job: DB live (partisi None) lalu setiap file arsip, urutan tetap."""
+    partitions = [('live', None)]
+    if is_sqlite_url(DATABASE_URL):
+        partitions += [(p.name, p) for p in db.query(ArchivePartition).order_by(ArchivePartition.start_date)
+                       if os.path.exists(archive_path(p.filename))]
+    return partitions
+
+def partition_entity(db, partition, model=Attendance):
+    """Model live (partisi None) atau alias ke tabel arsip; arsip di-ATTACH ulang bila sempat dilepas."""
+    return model if partition is None else archive_entity(model, attach_partition(db, partition))
+
+def update_rows_by_id(db, entity, values, params):
+    """UPDATE per baris (executemany, parameter 'row_id') di tabel live maupun arsip."""
+    if not params:
+        return
+    table = inspect(entity).selectable
+    db.execute(update(table).where(table.c.id == bindparam('row_id')).values(**values), params)
+
+def find_archived_row(db, model, row_id, *column_names):
+    """Mencari satu baris (berdasarkan id) di semua arsip; mengembalikan kolom yang diminta atau None."""
+    sources = partition_sources(db, model)
+    next(sources) # Lewati DB live
+    for source in sources:
+        row = db.query(*[getattr(source.entity, name) for name in column_names])\
+            .filter(source.entity.id == row_id).first()
+        if row:
+            return row
+    return None
+
+
+# --- Proses Arsip ---
+def archived_max_id(conn, table, schema='main'):
+    """ID terbesar di tabel (live atau arsip yang di-ATTACH), 0 jika kosong."""
+    return conn.exec_driver_sql(f"SELECT coalesce(max(id), 0) FROM {schema}.{table}").scalar()
+
+def seed_id_sequence(conn, table, min_id):
+    """Memastikan ID baru tabel live (AUTOINCREMENT) selalu > min_id lewat sqlite_sequence."""
+    current = conn.exec_driver_sql("SELECT seq FROM main.sqlite_sequence WHERE name = ?", (table,)).scalar()
+    if current is None:
+        conn.exec_driver_sql("INSERT INTO main.sqlite_sequence (name, seq) VALUES (?, ?)", (table, min_id))
+    elif current < min_id:
+        conn.exec_driver_sql("UPDATE main.sqlite_sequence SET seq = ? WHERE name = ?", (min_id, table))
+
+def create_archive_file(path):
+    """Membuat file arsip dengan tabel attendance & audit_log (+ FTS log) jika belum ada."""
+    from audit_search import SQLITE_FTS_DDL
+    archive_engine = create_engine(f"sqlite:///{path}")
+    try:
+        metadata = MetaData()
+        Employee.__table__.to_metadata(metadata) # Agar foreign key bisa di-resolve, tabelnya tidak dibuat
+        tables = [model.__table__.to_metadata(metadata) for model in ARCHIVED_MODELS]
+        metadata.create_all(archive_engine, tables=tables)
+        try:
+            with archive_engine.begin() as conn:
+                conn.exec_driver_sql(SQLITE_FTS_DDL[0]) # Arsip hanya ditulis oleh archive.py; cukup rebuild
+        except Exception as e:
+            print(f"  ... WARNING: FTS5 tidak tersedia di arsip ({e})")
+    finally:
+        archive_engine.dispose()
+
+def archive_period(label, vacuum=False):
+    """Memindahkan satu periode attendance & audit_log ke file arsipnya. Mengembalikan (absensi, log).
+
+    Salin -> verifikasi -> hapus, bukan satu transaksi: (1) salin dengan INSERT OR IGNORE, commit di
+    file arsip; (2) verifikasi semua baris ada di arsip, naikkan sequence ID, lalu hapus dari DB live
+    dan perbarui manifest dalam satu transaksi DB live. Jika terhenti di antaranya, baris ada di
+    kedua file sampai proses diulang; mengulang selalu aman (salinan lama dilewati).
+    """
+    if not is_sqlite_url(DATABASE_URL):
+        raise RuntimeError("Arsip file hanya untuk database SQLite; gunakan partisi tabel bawaan server database.")
+    from migrations import sqlite_has_autoincrement
+    for model in ARCHIVED_MODELS:
+        if not sqlite_has_autoincrement(model.__tablename__):
+            raise RuntimeError(f"Tabel {model.__tablename__} belum AUTOINCREMENT; ID bisa dipakai ulang setelah "
+                               "arsip. Jalankan 'python migrations.py upgrade' dulu.")
+    start, end = period_bounds(label)
+    range_params = (datetime.combine(start, time()), datetime.combine(end + timedelta(days=1), time()))
+    filename = f"archive_{label}.db"
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    create_archive_file(archive_path(filename))
+
+    schema = f"{ARCHIVE_SCHEMA_PREFIX}new"
+    moved = {}
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (archive_path(filename),))
+        try:
+            # Tahap 1: salin ke arsip
+            for model in ARCHIVED_MODELS:
+                table, columns = model.__tablename__, ", ".join(f'"{c.name}"' for c in model.__table__.columns)
+                conn.exec_driver_sql(
+                    f"INSERT OR IGNORE INTO {schema}.{table} ({columns}) SELECT {columns} FROM main.{table} "
+                    f"WHERE timestamp >= ? AND timestamp < ?", range_params)
+            conn.commit()
+            # Tahap 2: verifikasi semua baris sudah ada di arsip, lalu hapus dari live + catat manifest
+            for model in ARCHIVED_MODELS:
+                table = model.__tablename__
+                missing = conn.exec_driver_sql(
+                    f"SELECT count(*) FROM main.{table} t WHERE timestamp >= ? AND timestamp < ? "
+                    f"AND NOT EXISTS (SELECT 1 FROM {schema}.{table} a WHERE a.id = t.id)", range_params).scalar()
+                if missing:
+                    raise RuntimeError(f"{missing} baris {table} periode {label} gagal disalin ke arsip "
+                                       "(bentrok indeks unik?); data live tidak dihapus.")
+                # Walau tabel live kosong setelah hapus, ID baru tetap di atas semua ID arsip
+                seed_id_sequence(conn, table, archived_max_id(conn, table, schema))
+                moved[table] = conn.exec_driver_sql(
+                    f"DELETE FROM main.{table} WHERE timestamp >= ? AND timestamp < ?", range_params).rowcount
+            totals = {model.__tablename__: conn.exec_driver_sql(f"SELECT count(*) FROM {schema}.{model.__tablename__}").scalar()
+                      for model in ARCHIVED_MODELS}
+            db = SessionLocal(bind=conn) # Ikut transaksi koneksi ini; commit lewat conn
+            try:
+                partition = db.query(ArchivePartition).filter(ArchivePartition.name == label).first()
+                if partition is None:
+                    partition = ArchivePartition(name=label, filename=filename, start_date=start, end_date=end)
+                    db.add(partition)
+                partition.attendance_rows = totals[Attendance.__tablename__]
+                partition.audit_rows = totals[AuditLog.__tablename__]
+                db.flush()
+            finally:
+                db.close()
+            conn.commit()
+            try:
+                conn.exec_driver_sql(f"INSERT INTO {schema}.audit_log_fts(audit_log_fts) VALUES ('rebuild')")
+                conn.commit()
+            except Exception:
+                conn.rollback() # Arsip tanpa FTS: pencarian log memakai LIKE
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql(f"DETACH DATABASE {schema}")
+        if vacuum:
+            conn.exec_driver_sql("VACUUM") # Mengecilkan file live (butuh ruang disk sementara)
+    return moved.get(Attendance.__tablename__, 0), moved.get(AuditLog.__tablename__, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arsip data absensi & log audit per periode.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="Tampilkan manifest arsip.")
+    run_parser = subparsers.add_parser('run', help="Arsipkan semua periode yang sudah tutup.")
+    run_parser.add_argument('--period', choices=['year', 'month'], default='year')
+    run_parser.add_argument('--keep-months', type=int, default=ARCHIVE_KEEP_MONTHS,
+                            help="Jumlah bulan terakhir yang tetap di DB live.")
+    run_parser.add_argument('--vacuum', action='store_true', help="VACUUM DB live setelah arsip.")
+    period_parser = subparsers.add_parser('period', help="Arsipkan satu periode (YYYY atau YYYY-MM).")
+    period_parser.add_argument('label')
+    period_parser.add_argument('--vacuum', action='store_true')
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" ARSIP DATA ABSENSI")
+    print("==============================================")
+    if args.command == 'list':
+        db = SessionLocal()
+        try:
+            for partition in db.query(ArchivePartition).order_by(ArchivePartition.start_date):
+                print(f"{partition.name}: {partition.filename} ({partition.start_date}..{partition.end_date}), "
+                      f"{partition.attendance_rows} absensi, {partition.audit_rows} log")
+        finally:
+            db.close()
+    else:
+        if args.command == 'run':
+            db = SessionLocal()
+            try:
+                labels = closed_periods(db, args.period, args.keep_months)
+            finally:
+                db.close()
+        else:
+            labels = [args.label]
+        if not labels:
+            print("Tidak ada periode tutup yang perlu diarsipkan.")
+        for i, label in enumerate(labels):
+            try:
+                attendance_count, audit_count = archive_period(label, vacuum=args.vacuum and i == len(labels) - 1)
+            except (RuntimeError, ValueError) as e:
+                print(f"Error: {e}")
+                raise SystemExit(1)
+            print(f"Periode {label}: {attendance_count} absensi & {audit_count} log dipindah ke arsip.")
+    print("==============================================")
@@ -0,0 +1,226 @@
+# asgi_app.py
+# Mode async (ASGI) untuk route yang dipakai pegawai: halaman absen, kirim absensi, foto.
+# Body upload dibaca secara non-blocking, sehingga satu proses bisa menahan ribuan koneksi
+# HP yang lambat tanpa kehabisan thread: thread hanya dipakai setelah body lengkap diterima.
+# - Route baca saja (absensi terakhir, foto) memakai AsyncSession (engine async di database.py).
+# - Penyimpanan absensi memakai pipeline sinkron app.process_attendance (SQLAlchemy biasa,
+#   mode direct atau group commit) lewat asyncio.to_thread, agar aturannya tidak pernah
+#   berbeda dengan versi Flask; jumlah penulis bersamaan dibatasi thread pool default asyncio.
+# - Roster pegawai dibaca dari roster_cache (sinkron, di thread; jarang menyentuh DB).
+# Route admin (/manage, ekspor, audit) tetap dilayani aplikasi Flask lewat adaptor WSGI.
+#
+# Jalankan dengan: hypercorn asgi_app:application --bind 0.0.0.0:5000
+import asyncio
+import base64
+import os
+
+from quart import Quart, render_template, request, jsonify, Response, url_for
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select, desc
+
+from database import get_async_session_factory, SessionLocal, Employee, Attendance
+from photo_store import read_photo
+from roster_cache import roster_cache
+from archive import find_archived_row
+from photo_processing import get_or_create_thumbnail, CAPTURE_PROFILE
+# Aplikasi Flask (admin & API lain) beserta pipeline absensi yang sama
+from app import (app as flask_app, parse_attendance_fields, process_attendance, attendance_photo_urls,
+                 MAX_UPLOAD_BYTES, PHOTO_CACHE_MAX_AGE)
+
+async_app = Quart(__name__)
+async_app.secret_key = flask_app.secret_key
+async_app.config['MAX_CONTENT_LENGTH'] = flask_app.config['MAX_CONTENT_LENGTH']
+
+# Path yang dilayani mode async; sisanya diteruskan ke Flask
+ASYNC_PATHS = ('/', '/record_attendance', '/api/capture_profile')
+ASYNC_PREFIXES = ('/get_attendance_photo/', '/api/employees', '/static/')
+
+
+@async_app.route('/')
+async def index():
+    """Halaman utama absensi (roster dari cache in-process)."""
+    employees, error_message = [], None
+    try:
+        # Cache jarang menyentuh DB (cek versi berkala); dijalankan di thread agar loop tidak terblokir
+        snapshot = await asyncio.to_thread(roster_cache.get)
+        employees = [(emp.id, emp.name) for emp in snapshot.active]
+    except Exception as e:
+        print(f"Error fetching employees: {e}")
+        error_message = "Gagal memuat data. Coba lagi nanti."
+    return await render_template('index.html', employees=employees, error=error_message,
+                                 selected_employee_id=request.args.get('employee_id', type=int))
+
+
+@async_app.route('/api/employees/<int:employee_id>/last_attendance')
+async def api_last_attendance(employee_id):
+    """Absensi terakhir seorang pegawai (satu query join, tanpa blob foto)."""
+    session_factory = get_async_session_factory()
+    try:
+        async with session_factory() as db:
+            last_att = (await db.execute(
+                select(Attendance.id, Attendance.employee_id, Employee.name, Employee.position,
+                       Attendance.timestamp, Attendance.type, Attendance.latitude,
+                       Attendance.longitude, Attendance.has_photo)
+                .join(Employee, Attendance.employee_id == Employee.id)
+                .where(Attendance.employee_id == employee_id)
+                .order_by(desc(Attendance.timestamp), desc(Attendance.id))
+                .limit(1)
+            )).first()
+    except Exception as e:
+        print(f"Error fetching last attendance for employee {employee_id}: {e}")
+        return jsonify({"message": "Gagal memuat absensi terakhir."}), 500
+    if not last_att:
+        return jsonify({"message": "Belum ada data absensi untuk pegawai ini."}), 404
+    response = jsonify({
+        "id": last_att.id,
+        "employee_id": last_att.employee_id,
+        "employee_name": last_att.name,
+        "employee_position": last_att.position or '-',
+        "timestamp": last_att.timestamp.isoformat(),
+        "type": last_att.type,
+        "latitude": last_att.latitude,
+        "longitude": last_att.longitude,
+        "photo_url": url_for('get_attendance_photo', attendance_id=last_att.id) if last_att.has_photo else None,
+        "thumb_url": url_for('get_attendance_photo', attendance_id=last_att.id, size='thumb') if last_att.has_photo else None
+    })
+    response.set_etag(f"last-{employee_id}-{last_att.id}")
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return await response.make_conditional(request)
+
+
+@async_app.route('/api/employees')
+async def api_employees():
+    """Roster pegawai aktif sebagai JSON, dengan ETag (304 jika tidak berubah)."""
+    snapshot = await asyncio.to_thread(roster_cache.get)
+    response = jsonify([{"id": emp.id, "name": emp.name, "position": emp.position} for emp in snapshot.active])
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return await response.make_conditional(request)
+
+
+@async_app.route('/api/capture_profile')
+async def capture_profile():
+    """Profil pengambilan foto untuk klien."""
+    response = jsonify(CAPTURE_PROFILE)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+async def read_attendance_payload():
+    """Versi async read_attendance_payload di app.py: body dibaca tanpa menahan thread."""
+    if request.mimetype == 'multipart/form-data':
+        fields = await request.form
+        photo_file = (await request.files).get('photo')
+        photo_bytes = photo_file.read() if photo_file else None
+    elif request.mimetype.startswith('image/'):
+        fields = request.args
+        photo_bytes = await request.get_data(cache=False)
+    elif request.is_json:
+        fields = await request.get_json(silent=True)
+        if not fields: raise ValueError("Request body JSON kosong.")
+        photo_base64 = fields.get('photo_base64')
+        try: photo_bytes = base64.b64decode(photo_base64) if photo_base64 else None
+        except Exception as e: raise ValueError(f"Format foto base64 tidak valid: {e}")
+    else:
+        raise ValueError("Request harus multipart/form-data, image/jpeg, atau JSON.")
+    return parse_attendance_fields(fields, photo_bytes)
+
+
+@async_app.route('/record_attendance', methods=['POST'])
+async def record_attendance():
+    """Menerima absensi: body dibaca async, pipeline bersama app.py dijalankan di thread."""
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify({"message": f"Ukuran upload melebihi batas {MAX_UPLOAD_BYTES // 1024} KB."}), 413
+    try:
+        fields = await read_attendance_payload()
+    except ValueError as ve:
+        return jsonify({"message": str(ve)}), 400
+    # Validasi, geofence, foto dipakai ulang & mode tulis (termasuk group commit) sama persis dengan Flask
+    body, status, headers = await asyncio.to_thread(process_attendance, *fields)
+    return jsonify(attendance_photo_urls(body, status, url_for)), status, headers
+
+
+async def cacheable_photo_response(data, mimetype, etag=None):
+    """Respons foto dengan Cache-Control & ETag."""
+    response = Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'private, max-age={PHOTO_CACHE_MAX_AGE}'
+    if etag:
+        response.set_etag(etag)
+        return await response.make_conditional(request)
+    return response
+
+
+def find_archived_photo(attendance_id):
+    """(photo_hash, photo_mime, photo_tier, timestamp, photo_blob) absensi dari file arsip, atau None."""
+    db = SessionLocal()
+    try:
+        return find_archived_row(db, Attendance, attendance_id,
+                                 'photo_hash', 'photo_mime', 'photo_tier', 'timestamp', 'photo_blob')
+    finally:
+        db.close()
+
+
+@async_app.route('/get_attendance_photo/<int:attendance_id>')
+async def get_attendance_photo(attendance_id):
+    """Mengirim foto absensi (?size=thumb untuk thumbnail); baca file store di thread."""
+    want_thumb = request.args.get('size') == 'thumb'
+    session_factory = get_async_session_factory()
+    try:
+        async with session_factory() as db:
+            photo_ref = (await db.execute(
+                select(Attendance.photo_hash, Attendance.photo_mime, Attendance.photo_tier, Attendance.timestamp)
+                .where(Attendance.id == attendance_id)
+            )).first()
+            archived_blob = None
+            if photo_ref:
+                photo_hash, photo_mime, photo_tier, taken_at = photo_ref
+            else:
+                # Absensi yang sudah diarsipkan: cari di file arsip (sinkron, di thread)
+                archived = await asyncio.to_thread(find_archived_photo, attendance_id)
+                if not archived:
+                    return "Foto tidak ditemukan", 404
+                photo_hash, photo_mime, photo_tier, taken_at, archived_blob = archived
+            if not photo_hash:
+                # Data lama (blob di tabel): jarang, cukup kirim aslinya
+                photo_data = archived_blob or (await db.execute(
+                    select(Attendance.photo_blob).where(Attendance.id == attendance_id)
+                )).scalar()
+                if not photo_data:
+                    return "Foto tidak ditemukan", 404
+                return Response(photo_data, mimetype=photo_mime or 'image/jpeg')
+        if want_thumb:
+            thumb = await asyncio.to_thread(get_or_create_thumbnail, photo_hash,
+                                            lambda: read_photo(photo_hash, photo_tier, taken_at))
+            if thumb is not None:
+                return await cacheable_photo_response(thumb, 'image/jpeg', f"{photo_hash}.thumb")
+        photo_data = await asyncio.to_thread(read_photo, photo_hash, photo_tier, taken_at) # Tier mana pun
+        if not photo_data:
+            return "Foto tidak ditemukan", 404
+        return await cacheable_photo_response(photo_data, photo_mime or 'image/jpeg', photo_hash)
+    except Exception as e:
+        print(f"Error fetching photo for attendance ID {attendance_id}: {e}")
+        return "Gagal mengambil foto", 500
+
+
+# --- Dispatcher ASGI: route pegawai ke Quart, sisanya ke Flask (di thread pool a2wsgi) ---
+ADMIN_WSGI_WORKERS = int(os.environ.get('ADMIN_WSGI_WORKERS', 10)) # Thread untuk route admin (Flask)
+wsgi_fallback = WSGIMiddleware(flask_app, workers=ADMIN_WSGI_WORKERS)
+
+def is_async_path(path):
+    """True jika path dilayani langsung oleh aplikasi async."""
+    return path in ASYNC_PATHS or path.startswith(ASYNC_PREFIXES)
+
+async def application(scope, receive, send):
+    """Aplikasi ASGI utama."""
+    if scope['type'] == 'http' and not is_async_path(scope['path']):
+        await wsgi_fallback(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import hypercorn.asyncio
+    from hypercorn.config import Config
+    config = Config()
+    config.bind = [os.environ.get('ASGI_BIND', '0.0.0.0:5000')]
+    asyncio.run(hypercorn.asyncio.serve(application, config))
@@ -0,0 +1,161 @@
+# attendance_writer.py
+# Mode ingest "group commit" untuk record_attendance (opsional, ATTENDANCE_WRITE_MODE=group).
+# Handler request hanya memasukkan data absensi yang sudah tervalidasi ke antrean;
+# satu thread penulis menggabungkan semua yang masuk dalam beberapa milidetik ke
+# SATU transaksi (satu fsync), lalu mengisi Future tiap request dengan ID barunya.
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from sqlalchemy.dialects import sqlite, postgresql
+
+from database import SessionLocal, Attendance, engine
+from daily_summary import refresh_daily_summary
+
+ATTENDANCE_WRITE_MODE = os.environ.get('ATTENDANCE_WRITE_MODE', 'direct') # 'direct' atau 'group'
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 100))
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', 5))
+# Batas tunggu handler (detik); setelah lewat, absensi bisa saja tetap ter-commit (status belum pasti)
+GROUP_COMMIT_TIMEOUT = float(os.environ.get('GROUP_COMMIT_TIMEOUT', 10))
+
+# INSERT ... ON CONFLICT DO NOTHING RETURNING id: duplikat harian terdeteksi per baris
+# tanpa membatalkan transaksi batch (tidak perlu SAVEPOINT)
+_DIALECT_INSERT = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class DuplicateAttendanceError(Exception):
+    """Absensi ditolak indeks unik (employee_id, type, work_date)."""
+
+
+class GroupCommitTimeout(Exception):
+    """Penulis tidak menyelesaikan absensi dalam batas waktu.
+
+    pending=False: absensi dibatalkan sebelum ditulis (pasti tidak tersimpan, aman diulang);
+    pending=True : absensi sedang/sudah ditulis, statusnya belum pasti.
+    """
+
+    def __init__(self, pending):
+        super().__init__("Absensi belum selesai ditulis dalam batas waktu group commit.")
+        self.pending = pending
+
+
+class GroupCommitWriter:
+    """Thread penulis tunggal yang meng-commit absensi per batch."""
+
+    def __init__(self, session_factory=SessionLocal, max_batch=GROUP_COMMIT_MAX_BATCH,
+                 window_ms=GROUP_COMMIT_WINDOW_MS):
+        dialect = engine.dialect.name
+        if dialect not in _DIALECT_INSERT:
+            raise RuntimeError(f"Mode group commit belum mendukung database '{dialect}'.")
+        self._insert = _DIALECT_INSERT[dialect]
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._window = window_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, values):
+        """Memasukkan satu absensi (dict kolom Attendance) ke antrean. Mengembalikan Future berisi ID."""
+        if self._thread is None:
+            self._start()
+        values = dict(values)
+        values['work_date'] = values['timestamp'].date() # Insert Core tidak memicu event ORM
+        future = Future()
+        self._queue.put((values, future))
+        return future
+
+    def write(self, values, timeout=GROUP_COMMIT_TIMEOUT):
+        """submit() lalu menunggu ID baru; raise GroupCommitTimeout jika melewati timeout."""
+        future = self.submit(values)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Berhasil dibatalkan = penulis belum mengambilnya, jadi pasti tidak akan tersimpan
+            raise GroupCommitTimeout(pending=not future.cancel()) from None
+
+    def _start(self):
+        # Thread dibuat saat dipakai pertama kali (bukan saat import) agar aman untuk server yang fork
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Kumpulkan request lain yang datang dalam jendela waktu singkat
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Lewati absensi yang sudah dibatalkan handler (timeout); sisanya tidak bisa dibatalkan lagi
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """Menulis satu batch dalam satu transaksi, lalu mengisi hasil tiap Future.
+
+        Jika batch gagal (misal satu payload tidak valid), batch ditulis ulang per absensi
+        dengan transaksi masing-masing, sehingga hanya Future absensi yang bermasalah yang gagal.
+        """
+        try:
+            results = self._commit(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Error group commit absensi pegawai {batch[0][0].get('employee_id')}: {e}")
+                batch[0][1].set_exception(e)
+                return
+            print(f"Error group commit ({len(batch)} absensi): {e}; ditulis ulang per absensi")
+            for item in batch:
+                self._write_batch([item])
+            return
+        for future, new_id in results:
+            if new_id is None:
+                future.set_exception(DuplicateAttendanceError())
+            else:
+                future.set_result(new_id)
+
+    def _commit(self, batch):
+        """Insert semua absensi batch + ringkasan hariannya dalam satu transaksi. Mengembalikan [(future, id)]."""
+        db = self._session_factory()
+        results = []
+        try:
+            for values, future in batch:
+                stmt = self._insert(Attendance).values(**values)\
+                    .on_conflict_do_nothing()\
+                    .returning(Attendance.id)
+                new_id = db.execute(stmt).scalar()
+                if new_id is not None:
+                    refresh_daily_summary(db, values['employee_id'], values['work_date'])
+                results.append((future, new_id))
+            db.commit()
+            return results
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_attendance_writer():
+    """Mengembalikan GroupCommitWriter bersama, atau None jika mode group tidak aktif."""
+    global _writer
+    if ATTENDANCE_WRITE_MODE != 'group':
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+    return _writer
@@ -0,0 +1,109 @@
+# audit_search.py
+# Pencarian teks penuh di audit_log.details.
+# - SQLite: tabel virtual FTS5 audit_log_fts (external content) yang dijaga trigger
+#   insert/update/delete, sehingga semua penulis AuditLog otomatis terindeks.
+# - PostgreSQL: indeks GIN to_tsvector('simple', details).
+# - Tanpa FTS (misal SQLite tanpa modul fts5): fallback LIKE (memindai tabel).
+# Dibuat oleh migrasi 11 (migrations.py); cukup 'python audit_search.py' untuk membangun ulang indeks.
+import re
+
+from sqlalchemy import Integer, column, func, inspect, text
+
+from database import engine, AuditLog
+
+FTS_TABLE = 'audit_log_fts'
+PG_TSVECTOR = "to_tsvector('simple', coalesce(details, ''))"
+_backend = None
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(details, content='audit_log', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS audit_log_fts_ai AFTER INSERT ON audit_log BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, details) VALUES (new.id, new.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS audit_log_fts_ad AFTER DELETE ON audit_log BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, details) VALUES ('delete', old.id, old.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS audit_log_fts_au AFTER UPDATE ON audit_log BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, details) VALUES ('delete', old.id, old.details);
+        INSERT INTO {FTS_TABLE}(rowid, details) VALUES (new.id, new.details);
+    END""",
+]
+
+
+def setup_audit_search():
+    """Membuat indeks FTS + trigger (jika didukung) dan mengisinya dari data yang ada."""
+    global _backend
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audit_log_details_fts "
+                                 f"ON audit_log USING GIN ({PG_TSVECTOR})")
+        print("  ... indeks GIN ix_audit_log_details_fts siap")
+    elif engine.dialect.name == 'sqlite':
+        try:
+            with engine.begin() as conn:
+                for ddl in SQLITE_FTS_DDL:
+                    conn.exec_driver_sql(ddl)
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            print(f"  ... indeks FTS5 {FTS_TABLE} siap")
+        except Exception as e:
+            print(f"  ... WARNING: FTS5 tidak tersedia ({e}); pencarian log memakai LIKE")
+    _backend = None # Deteksi ulang pada pencarian berikutnya
+
+
+def search_backend():
+    """'fts5', 'tsvector', atau 'like' sesuai database & indeks yang tersedia (dicek sekali)."""
+    global _backend
+    if _backend is None:
+        if engine.dialect.name == 'postgresql':
+            _backend = 'tsvector'
+        elif engine.dialect.name == 'sqlite' and inspect(engine).has_table(FTS_TABLE):
+            _backend = 'fts5'
+        else:
+            _backend = 'like'
+    return _backend
+
+
+def fts_query(search_text):
+    """Mengubah input bebas menjadi query FTS5 aman: setiap kata di-quote, digabung AND.
+
+    Kata berakhiran '*' menjadi pencarian awalan (misal 'edit*').
+    """
+    terms = []
+    for word in re.findall(r'[^\s"]+', search_text):
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return " ".join(terms)
+
+
+def search_clause(search_text, source=AuditLog, schema=None):
+    """Kondisi WHERE untuk mencari teks di details (None jika teks kosong).
+
+    source/schema: alias AuditLog & nama ATTACH untuk log yang sudah diarsipkan (lihat archive.py).
+    """
+    if not search_text or not search_text.strip():
+        return None
+    backend = search_backend()
+    if backend == 'fts5':
+        query = fts_query(search_text)
+        if not query:
+            return None
+        fts_table = f"{schema}.{FTS_TABLE}" if schema else FTS_TABLE
+        return source.id.in_(
+            text(f"SELECT rowid FROM {fts_table} WHERE {FTS_TABLE} MATCH :fts_query")
+            .bindparams(fts_query=query).columns(column('rowid', Integer))
+        )
+    if backend == 'tsvector':
+        return text(f"{PG_TSVECTOR} @@ plainto_tsquery('simple', :fts_query)").bindparams(fts_query=search_text)
+    # Fallback: pencarian substring tanpa indeks (memindai tabel)
+    return func.coalesce(source.details, '').ilike(f"%{search_text.strip()}%")
+
+
+if __name__ == "__main__":
+    print("==============================================")
+    print(" INDEKS PENCARIAN LOG AUDIT")
+    print("==============================================")
+    setup_audit_search()
+    print(f"Backend pencarian: {search_backend()}")
+    print("==============================================")
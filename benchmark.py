@@ -0,0 +1,554 @@
+# benchmark.py
+# Benchmark beban & latensi endpoint absensi. Skenario per tingkat volume data riwayat:
+#   rush  : "jam masuk pagi", setiap pegawai mengirim check_in (multipart + foto JPEG seperti
+#           script.js) oleh banyak klien sekaligus, sementara admin membuka /manage
+#   baca  : /manage (halaman pertama & terfilter) dan export_filtered_excel (xlsx & csv)
+# Dua mode: 'inprocess' (Flask test client di proses ini, per thread) dan 'http' (klien HTTP
+# paralel ke server lokal yang dijalankan otomatis: dev server Flask, asgi_app.py, atau perintah
+# sendiri seperti gunicorn). Selalu memakai DB & photo store sementara (lewat DATABASE_URL dst.),
+# tidak pernah DB produksi. Hasil (throughput, p50/p95/p99 per route) disimpan sebagai JSON
+# beserta commit git, sehingga bisa dibandingkan antar commit dengan 'compare'.
+#
+#   python benchmark.py inprocess --employees 300 --clients 8 --volumes 0,50000
+#   python benchmark.py http --server asgi --clients 32 --rush-seconds 60
+#   python benchmark.py http --server-cmd "gunicorn -w 4 -b {bind} app:app"
+#   python benchmark.py compare benchmark_results/lama.json benchmark_results/baru.json
+import io
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import queue
+import random
+import shlex
+import shutil
+import socket
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+import http.client
+from base64 import b64encode
+from collections import namedtuple, defaultdict, Counter
+from datetime import date, datetime, time as dt_time, timedelta
+from urllib.parse import urlencode
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmark_results')
+SERVER_START_TIMEOUT = 30 # Detik menunggu server lokal siap
+HTTP_TIMEOUT = 120
+SEED_CHUNK = 5000
+HISTORY_PHOTOS = 20 # Foto berbeda yang dipakai bergantian oleh baris riwayat
+OFFICE_LOCATION = (-6.2000, 106.8166) # Titik asal koordinat absensi simulasi
+
+Job = namedtuple('Job', ['route', 'method', 'path', 'params', 'body', 'headers', 'at'])
+Sample = namedtuple('Sample', ['latency', 'status', 'size'])
+
+
+# --- Lingkungan Sementara ---
+def prepare_environment(workdir):
+    """Mengarahkan DB, photo store, arsip & arsip dingin ke workdir.
+
+    Harus dipanggil sebelum modul aplikasi (database.py dst.) diimpor, karena konfigurasinya
+    dibaca dari environment saat impor.
+    """
+    env = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        'PHOTO_STORE_DIR': os.path.join(workdir, 'photo_store'),
+        'PHOTO_SEGMENT_PATH': os.path.join(workdir, 'photos.db'),
+        'PHOTO_COLD_DIR': os.path.join(workdir, 'photo_cold'),
+        'ARCHIVE_DIR': os.path.join(workdir, 'archive'),
+    }
+    os.environ.update(env)
+    return env
+
+def git_revision():
+    """(commit singkat, ada perubahan belum di-commit) atau (None, None) di luar repo git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+# --- Foto Simulasi ---
+def make_photo(seed, size, quality):
+    """JPEG unik per seed: gradasi warna acak + noise (ukuran file mirip foto kamera asli)."""
+    rng = random.Random(seed)
+    base = Image.new('RGB', (8, 6))
+    base.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(48)])
+    img = Image.blend(base.resize(size, Image.BICUBIC), Image.effect_noise(size, 32).convert('RGB'), 0.3)
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+def make_photo_pool(count, seed, oversize_ratio, profile):
+    """Foto untuk satu rush: sebagian besar sesuai CAPTURE_PROFILE (seperti hasil canvas di script.js),
+    sebagian (oversize_ratio) foto besar dari klien lama yang dikompres ulang di server."""
+    rng = random.Random(seed)
+    normal_size = (profile['max_width'], profile['max_width'] * 3 // 4)
+    normal_quality = int(profile['jpeg_quality'] * 100)
+    return [make_photo(seed * 100000 + i, (1600, 1200), 90) if rng.random() < oversize_ratio
+            else make_photo(seed * 100000 + i, normal_size, normal_quality)
+            for i in range(count)]
+
+def multipart_body(fields, photo):
+    """Body multipart/form-data seperti FormData di script.js. Mengembalikan (body, content_type)."""
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="photo"; filename="absen.jpg"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n'.encode() + photo + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+# --- Data Awal ---
+def seed_employees(count):
+    """Membuat pegawai simulasi (sekali per DB). Mengembalikan [(id, nama)]."""
+    from sqlalchemy import insert
+    from database import SessionLocal, Employee
+    positions = ['Pramubakti', 'Satpam', 'Pengemudi', 'Teknisi', 'Petugas Kebersihan']
+    db = SessionLocal()
+    try:
+        existing = db.query(Employee.id).count()
+        if existing < count:
+            db.execute(insert(Employee), [{'name': f"Pegawai Benchmark {i:04d}", 'position': positions[i % len(positions)]}
+                                          for i in range(existing, count)])
+            db.commit()
+        return db.query(Employee.id, Employee.name).order_by(Employee.id).limit(count).all()
+    finally:
+        db.close()
+
+def seed_history(employees, target_rows, photo_refs):
+    """Menambah absensi riwayat (hari kerja sebelum hari ini, masuk & keluar) sampai target_rows baris."""
+    from sqlalchemy import insert, func
+    from database import SessionLocal, Attendance
+    db = SessionLocal()
+    try:
+        today = date.today()
+        current = db.query(func.count(Attendance.id)).filter(Attendance.work_date < today).scalar()
+        oldest = db.query(func.min(Attendance.work_date)).filter(Attendance.work_date < today).scalar()
+        day = (oldest or today) - timedelta(days=1)
+        rng = random.Random(target_rows)
+        rows = []
+        while current + len(rows) < target_rows:
+            if day.weekday() < 5:
+                for employee_id, _ in employees:
+                    check_in = datetime.combine(day, dt_time(7)) + timedelta(seconds=rng.randint(0, 90 * 60))
+                    check_out = datetime.combine(day, dt_time(16)) + timedelta(seconds=rng.randint(0, 90 * 60))
+                    for attendance_type, timestamp in (('check_in', check_in), ('check_out', check_out)):
+                        rows.append({'employee_id': employee_id, 'type': attendance_type, 'timestamp': timestamp,
+                                     'work_date': day, 'latitude': OFFICE_LOCATION[0] + rng.uniform(-0.001, 0.001),
+                                     'longitude': OFFICE_LOCATION[1] + rng.uniform(-0.001, 0.001),
+                                     'has_photo': True, **rng.choice(photo_refs)})
+                    if len(rows) >= SEED_CHUNK:
+                        db.execute(insert(Attendance), rows)
+                        db.commit()
+                        current += len(rows)
+                        rows = []
+                    if current + len(rows) >= target_rows:
+                        break
+            day -= timedelta(days=1)
+        if rows:
+            db.execute(insert(Attendance), rows)
+            db.commit()
+            current += len(rows)
+        return current
+    finally:
+        db.close()
+
+def store_history_photos(profile):
+    """Menyimpan beberapa foto ke photo store untuk dirujuk baris riwayat."""
+    from photo_store import save_photo
+    return [save_photo(photo) for photo in make_photo_pool(HISTORY_PHOTOS, 0, 0, profile)]
+
+def reset_today():
+    """Menghapus absensi & ringkasan hari ini agar rush berikutnya bisa check_in lagi."""
+    from database import SessionLocal, Attendance, DailySummary
+    db = SessionLocal()
+    try:
+        db.query(Attendance).filter(Attendance.work_date == date.today()).delete(synchronize_session=False)
+        db.query(DailySummary).filter(DailySummary.work_date == date.today()).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+# --- Klien ---
+class InProcessClient:
+    """Klien Flask test client (satu per thread klien)."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, params=None, body=None, headers=None):
+        response = self._client.open(path, method=method, query_string=params, data=body, headers=headers)
+        size = len(response.get_data()) # Ikut mengonsumsi respons streaming (ekspor)
+        response.close()
+        return response.status_code, size
+
+class HttpClient:
+    """Klien HTTP dengan satu koneksi (keep-alive jika server mendukung) per thread klien."""
+
+    def __init__(self, host, port):
+        self._connection = http.client.HTTPConnection(host, port, timeout=HTTP_TIMEOUT)
+
+    def request(self, method, path, params=None, body=None, headers=None):
+        url = f"{path}?{urlencode(params)}" if params else path
+        try:
+            self._connection.request(method, url, body=body, headers=headers or {})
+            response = self._connection.getresponse()
+            return response.status, len(response.read())
+        except (OSError, http.client.HTTPException) as e:
+            print(f"- Request {method} {path} gagal: {e}")
+            self._connection.close() # Request berikutnya membuka koneksi baru
+            return 0, 0
+
+
+def run_phase(make_client, jobs, clients, background_jobs=None, background_clients=0):
+    """Menjalankan jobs oleh `clients` thread; background_jobs diulang terus oleh thread lain selama fase.
+
+    Job dengan `at` (detik sejak fase mulai) dikirim pada waktunya dan latensinya dihitung dari
+    waktu jadwal, jadi antrean di sisi klien saat server lambat ikut terukur.
+    Mengembalikan (samples per route, durasi fase dalam detik).
+    """
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    stop = threading.Event()
+    started = time.perf_counter()
+
+    def send(client, job):
+        if job.at is not None:
+            begin = started + job.at
+            time.sleep(max(0.0, begin - time.perf_counter()))
+        else:
+            begin = time.perf_counter()
+        status, size = client.request(job.method, job.path, job.params, job.body, job.headers)
+        with lock:
+            samples[job.route].append(Sample(time.perf_counter() - begin, status, size))
+
+    def worker():
+        client = make_client()
+        while True:
+            try:
+                job = pending.get_nowait()
+            except queue.Empty:
+                return
+            send(client, job)
+
+    def background_worker(offset):
+        client = make_client()
+        for i in range(offset, sys.maxsize):
+            if stop.is_set():
+                return
+            send(client, background_jobs[i % len(background_jobs)])
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    extra = [threading.Thread(target=background_worker, args=(i,)) for i in range(background_clients if background_jobs else 0)]
+    for thread in threads + extra:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    for thread in extra:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+# --- Skenario ---
+def auth_headers():
+    credentials = f"{os.environ.get('APP_USERNAME', 'admin')}:{os.environ.get('APP_PASSWORD', 'admin123')}"
+    return {'Authorization': f"Basic {b64encode(credentials.encode()).decode()}"}
+
+def rush_jobs(employees, photos, rush_seconds, seed):
+    """check_in untuk setiap pegawai, urutan acak; kedatangan memuncak di 60% jendela rush_seconds."""
+    rng = random.Random(seed)
+    order = list(zip(employees, photos))
+    rng.shuffle(order)
+    offsets = sorted(rng.triangular(0, rush_seconds, rush_seconds * 0.6) for _ in order) if rush_seconds else [None] * len(order)
+    jobs = []
+    for ((employee_id, _), photo), at in zip(order, offsets):
+        body, content_type = multipart_body({
+            'employee_id': employee_id, 'type': 'check_in',
+            'latitude': f"{OFFICE_LOCATION[0] + rng.uniform(-0.0005, 0.0005):.6f}",
+            'longitude': f"{OFFICE_LOCATION[1] + rng.uniform(-0.0005, 0.0005):.6f}",
+        }, photo)
+        jobs.append(Job('record_attendance', 'POST', '/record_attendance', None, body,
+                        {'Content-Type': content_type}, at))
+    return jobs
+
+def read_jobs(employees, export_days):
+    """Job per route baca (admin): halaman /manage & ekspor rentang export_days hari terakhir (0 = semua)."""
+    headers = auth_headers()
+    today = date.today()
+    export_range = {'start': (today - timedelta(days=export_days)).isoformat(), 'end': today.isoformat()} if export_days else {}
+    return {
+        'manage': Job('manage', 'GET', '/manage', None, None, headers, None),
+        'manage_filtered': Job('manage_filtered', 'GET', '/manage',
+                               {'name': employees[len(employees) // 2][1], 'start': (today - timedelta(days=30)).isoformat(),
+                                'end': today.isoformat()}, None, headers, None),
+        'export_filtered_excel': Job('export_filtered_excel', 'GET', '/export_filtered_excel', export_range, None, headers, None),
+        'export_filtered_csv': Job('export_filtered_csv', 'GET', '/export_filtered_excel',
+                                   {**export_range, 'format': 'csv'}, None, headers, None),
+    }
+
+
+# --- Statistik ---
+def percentile(sorted_values, pct):
+    """Persentil dengan interpolasi linear dari list yang sudah urut."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    low = math.floor(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+def summarize(samples, duration):
+    """Ringkasan satu route: jumlah, error, throughput & latensi (ms)."""
+    latencies = sorted(sample.latency for sample in samples)
+    statuses = Counter(sample.status for sample in samples)
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'count': len(samples),
+        'errors': sum(count for status, count in statuses.items() if status == 0 or status >= 400),
+        'status_counts': {str(status): count for status, count in sorted(statuses.items())},
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(samples) / duration, 2) if duration else None,
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'max_ms': to_ms(latencies[-1]) if latencies else None,
+        'mean_response_bytes': round(sum(sample.size for sample in samples) / len(samples)) if samples else None,
+    }
+
+def print_routes(routes):
+    print(f"  {'Route':<26}{'n':>6}{'err':>5}{'req/dtk':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for route, stats in routes.items():
+        fmt = lambda value: f"{value:.1f}" if value is not None else '-'
+        print(f"  {route:<26}{stats['count']:>6}{stats['errors']:>5}{fmt(stats['throughput_rps']):>9}"
+              f"{fmt(stats['p50_ms']):>9}{fmt(stats['p95_ms']):>9}{fmt(stats['p99_ms']):>9}")
+
+
+# --- Server Lokal (mode http) ---
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(server, server_cmd, port, log_path):
+    """Menjalankan server lokal di subprocess (env sudah mengarah ke DB sementara) lalu menunggu siap."""
+    bind = f"127.0.0.1:{port}"
+    if server_cmd:
+        command = shlex.split(server_cmd.format(bind=bind, host='127.0.0.1', port=port))
+    elif server == 'asgi':
+        command = [sys.executable, os.path.join(BASE_DIR, 'asgi_app.py')]
+    else:
+        command = [sys.executable, os.path.abspath(__file__), 'serve', '--port', str(port)]
+    log_file = open(log_path, 'w')
+    process = subprocess.Popen(command, cwd=BASE_DIR, stdout=log_file, stderr=subprocess.STDOUT,
+                               env={**os.environ, 'ASGI_BIND': bind})
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server berhenti saat start (kode {process.returncode}), lihat {log_path}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/capture_profile')
+            connection.getresponse().read()
+            connection.close()
+            return process, log_file
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server tidak siap dalam {SERVER_START_TIMEOUT} detik, lihat {log_path}")
+
+def stop_server(process, log_file):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    log_file.close()
+
+def serve(port):
+    """Dev server Flask berthread tanpa debug/reloader (target default mode http)."""
+    from werkzeug.serving import make_server
+    from app import app
+    print(f"Server benchmark di http://127.0.0.1:{port}")
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+# --- Benchmark ---
+def run_benchmark(args):
+    """Menjalankan semua tingkat volume; mengembalikan dict hasil (juga disimpan sebagai JSON)."""
+    workdir = args.workdir or tempfile.mkdtemp(prefix='absen_benchmark_')
+    os.makedirs(workdir, exist_ok=True)
+    prepare_environment(workdir)
+    print(f"Direktori kerja sementara: {workdir}")
+
+    # Modul aplikasi baru boleh diimpor setelah environment diarahkan ke workdir
+    import migrations
+    from photo_processing import CAPTURE_PROFILE
+    migrations.upgrade()
+    employees = seed_employees(args.employees)
+    history_refs = store_history_photos(CAPTURE_PROFILE)
+
+    server = None
+    if args.mode == 'http':
+        port = free_port()
+        server = start_server(args.server, args.server_cmd, port, os.path.join(workdir, 'server.log'))
+        make_client = lambda: HttpClient('127.0.0.1', port)
+    else:
+        from app import app
+        make_client = lambda: InProcessClient(app)
+
+    commit, dirty = git_revision()
+    result = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'), 'commit': commit, 'dirty': dirty,
+            'mode': args.mode, 'server': (args.server_cmd or args.server) if args.mode == 'http' else None,
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'employees': len(employees), 'clients': args.clients, 'admin_clients': args.admin_clients,
+            'read_clients': args.read_clients, 'read_requests': args.read_requests, 'rush_seconds': args.rush_seconds,
+            'oversize_ratio': args.oversize_ratio, 'export_days': args.export_days,
+            'write_mode': os.environ.get('ATTENDANCE_WRITE_MODE', 'direct'),
+        },
+        'levels': [],
+    }
+    try:
+        for level, volume in enumerate(sorted(args.volumes)):
+            print(f"\n--- Volume riwayat: {volume} baris ---")
+            history_rows = seed_history(employees, volume, history_refs)
+            reset_today()
+            reads = read_jobs(employees, args.export_days)
+            for job in reads.values(): # Pemanasan: cache roster, geofence, template
+                make_client().request(job.method, job.path, job.params, job.body, job.headers)
+
+            photos = make_photo_pool(len(employees), level + 1, args.oversize_ratio, CAPTURE_PROFILE)
+            sizes = sorted(len(photo) for photo in photos)
+            print(f"Rush: {len(photos)} check_in, {args.clients} klien, foto median {sizes[len(sizes) // 2] // 1024} KB "
+                  f"(maks {sizes[-1] // 1024} KB)")
+            samples, duration = run_phase(make_client, rush_jobs(employees, photos, args.rush_seconds, level),
+                                          args.clients, [reads['manage']._replace(route='manage_during_rush')],
+                                          args.admin_clients)
+            routes = {route: summarize(samples[route], duration) for route in ('record_attendance', 'manage_during_rush') if route in samples}
+
+            for name, job in reads.items():
+                samples, duration = run_phase(make_client, [job] * args.read_requests, args.read_clients)
+                routes[name] = summarize(samples[name], duration)
+            print_routes(routes)
+            result['levels'].append({'history_rows': history_rows, 'photo_bytes_median': sizes[len(sizes) // 2],
+                                     'photo_bytes_max': sizes[-1], 'routes': routes})
+    finally:
+        if server:
+            stop_server(*server)
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    result['meta']['finished_at'] = datetime.now().isoformat(timespec='seconds')
+    return result
+
+def save_result(result, output=None):
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"benchmark_{result['meta']['mode']}_{stamp}_{result['meta']['commit'] or 'nogit'}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    return output
+
+
+def compare_results(old_path, new_path):
+    """Mencetak perubahan throughput & p50/p95/p99 per route untuk volume yang sama di dua hasil."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"Lama: {old['meta']['commit']} ({old['meta']['mode']}, {old['meta']['started_at']})")
+    print(f"Baru: {new['meta']['commit']} ({new['meta']['mode']}, {new['meta']['started_at']})")
+    old_levels = {level['history_rows']: level['routes'] for level in old['levels']}
+    change = lambda a, b: f"{(b - a) / a * 100:+.0f}%" if a and b is not None else '-'
+    for level in new['levels']:
+        old_routes = old_levels.get(level['history_rows'])
+        if old_routes is None:
+            print(f"\nVolume {level['history_rows']}: tidak ada di hasil lama, dilewati.")
+            continue
+        print(f"\n--- Volume riwayat: {level['history_rows']} baris ---")
+        print(f"  {'Route':<26}{'req/dtk':>16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+        for route, stats in level['routes'].items():
+            before = old_routes.get(route)
+            if before is None:
+                continue
+            cells = [f"{stats[key] if stats[key] is not None else '-'} ({change(before[key], stats[key])})"
+                     for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')]
+            print(f"  {route:<26}" + ''.join(f"{cell:>18}" if i else f"{cell:>16}" for i, cell in enumerate(cells)))
+
+
+def parse_volumes(value):
+    try:
+        return [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Format volume: angka dipisah koma, misal 0,20000,100000")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark beban & latensi endpoint absensi (DB sementara).")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for mode, help_text in (('inprocess', "Flask test client di proses ini."),
+                            ('http', "Klien HTTP paralel ke server lokal.")):
+        sub = subparsers.add_parser(mode, help=help_text)
+        sub.add_argument('--employees', type=int, default=300, help="Jumlah pegawai (= check_in per rush).")
+        sub.add_argument('--clients', type=int, default=8, help="Klien paralel saat rush.")
+        sub.add_argument('--admin-clients', type=int, default=1, help="Klien admin yang membuka /manage selama rush.")
+        sub.add_argument('--rush-seconds', type=float, default=0,
+                         help="Sebar kedatangan dalam N detik (0 = secepat mungkin).")
+        sub.add_argument('--oversize-ratio', type=float, default=0.1, help="Porsi foto besar (1600x1200) dari klien lama.")
+        sub.add_argument('--volumes', type=parse_volumes, default=[0, 20000],
+                         help="Jumlah baris riwayat per tingkat, dipisah koma.")
+        sub.add_argument('--read-requests', type=int, default=20, help="Request per route baca.")
+        sub.add_argument('--read-clients', type=int, default=2, help="Klien paralel untuk route baca.")
+        sub.add_argument('--export-days', type=int, default=31, help="Rentang ekspor (hari terakhir, 0 = semua).")
+        sub.add_argument('--output', help="File hasil JSON (default: benchmark_results/).")
+        sub.add_argument('--workdir', help="Direktori DB & foto (default: direktori sementara, dihapus di akhir).")
+        sub.add_argument('--keep', action='store_true', help="Jangan hapus direktori sementara.")
+        if mode == 'http':
+            sub.add_argument('--server', choices=['flask', 'asgi'], default='flask', help="Server lokal yang dijalankan.")
+            sub.add_argument('--server-cmd', help="Perintah server sendiri, misal \"gunicorn -w 4 -b {bind} app:app\".")
+    serve_parser = subparsers.add_parser('serve', help="(Internal) dev server Flask untuk mode http.")
+    serve_parser.add_argument('--port', type=int, required=True)
+    compare_parser = subparsers.add_parser('compare', help="Bandingkan dua file hasil.")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.port)
+        sys.exit(0)
+
+    print("==============================================")
+    print(" BENCHMARK ENDPOINT ABSENSI")
+    print("==============================================")
+    if args.command == 'compare':
+        compare_results(args.old, args.new)
+    elif Image is None:
+        print("ERROR: Pillow belum terpasang (pip install Pillow), dibutuhkan untuk membuat foto simulasi.")
+    else:
+        args.mode = args.command
+        result = run_benchmark(args)
+        print(f"\nHasil disimpan: {save_result(result, args.output)}")
+    print("==============================================")
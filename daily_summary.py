@@ -0,0 +1,125 @@
+# daily_summary.py
+# Ringkasan absensi harian (tabel daily_summary), satu baris per pegawai per hari.
+# Diperbarui dalam transaksi yang sama dengan perubahan absensi (refresh_daily_summary),
+# sehingga rekap & laporan cukup membaca ringkasan ini, bukan memindai semua event.
+#
+#   python daily_summary.py                                  # bangun ulang semua
+#   python daily_summary.py --start 2024-01-01 --end 2024-01-31
+import argparse
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, inspect
+
+from database import engine, SessionLocal, Employee, Attendance, ArchivePartition, DailySummary
+from archive import PartitionSource, partition_sources
+
+
+def summary_values(first_check_in, last_check_out, event_count):
+    """Menghitung kolom turunan ringkasan (durasi & flag) dari waktu masuk/keluar."""
+    duration = None
+    if first_check_in and last_check_out and last_check_out > first_check_in:
+        duration = int((last_check_out - first_check_in).total_seconds() // 60)
+    return {
+        "first_check_in": first_check_in,
+        "last_check_out": last_check_out,
+        "duration_minutes": duration,
+        "event_count": event_count,
+        "missing_check_in": first_check_in is None,
+        "missing_check_out": last_check_out is None,
+    }
+
+
+def _aggregate_columns(entity=Attendance):
+    """Kolom agregat (masuk paling awal, keluar paling akhir, jumlah event) dari tabel live atau arsip."""
+    return (
+        func.min(case((entity.type == 'check_in', entity.timestamp))),
+        func.max(case((entity.type == 'check_out', entity.timestamp))),
+        func.count(entity.id),
+    )
+
+def _summary_sources(db, start_date, end_date):
+    """DB live dan file arsip yang beririsan; sebelum migrasi 12 (tabel archive_partitions) hanya DB live."""
+    if not inspect(engine).has_table(ArchivePartition.__tablename__):
+        return [PartitionSource(Attendance, None, None)]
+    return partition_sources(db, Attendance, start_date, end_date)
+
+
+def refresh_daily_summary(db, employee_id, work_date):
+    """Menghitung ulang ringkasan satu (pegawai, tanggal) di transaksi pemanggil (commit oleh pemanggil)."""
+    db.flush() # Session memakai autoflush=False; perubahan absensi harus terlihat oleh query agregat
+    # Kunci baris pegawai (PostgreSQL) agar dua absen bersamaan tidak saling menimpa ringkasan;
+    # SQLite sudah menserialkan penulis sejak INSERT/UPDATE absensi
+    db.query(Employee.id).filter(Employee.id == employee_id).with_for_update().scalar()
+    first_in, last_out, event_count = db.query(*_aggregate_columns())\
+        .filter(Attendance.employee_id == employee_id, Attendance.work_date == work_date)\
+        .one()
+    summary = db.get(DailySummary, (employee_id, work_date))
+    if not event_count:
+        if summary:
+            db.delete(summary)
+        return None
+    if summary is None:
+        summary = DailySummary(employee_id=employee_id, work_date=work_date)
+        db.add(summary)
+    for key, value in summary_values(first_in, last_out, event_count).items():
+        setattr(summary, key, value)
+    return summary
+
+
+def rebuild_daily_summary(start_date=None, end_date=None):
+    """Membangun ulang ringkasan untuk rentang tanggal (inklusif) dalam satu transaksi. Mengembalikan jumlah baris.
+
+    Dihitung dari DB live dan file arsip, sehingga ringkasan periode yang sudah diarsipkan tetap ada.
+    """
+    db = SessionLocal()
+    try:
+        aggregates = {}
+        for source in _summary_sources(db, start_date, end_date):
+            entity = source.entity
+            query = db.query(entity.employee_id, entity.work_date, *_aggregate_columns(entity))\
+                .filter(entity.work_date.isnot(None))
+            if start_date:
+                query = query.filter(entity.work_date >= start_date)
+            if end_date:
+                query = query.filter(entity.work_date <= end_date)
+            for employee_id, work_date, first_in, last_out, event_count in query.group_by(entity.employee_id, entity.work_date):
+                # Satu hari biasanya hanya ada di satu sumber; digabung untuk berjaga-jaga
+                previous = aggregates.get((employee_id, work_date))
+                if previous:
+                    first_in = min(filter(None, [first_in, previous[0]]), default=None)
+                    last_out = max(filter(None, [last_out, previous[1]]), default=None)
+                    event_count += previous[2]
+                aggregates[(employee_id, work_date)] = (first_in, last_out, event_count)
+        rows = [
+            {"employee_id": employee_id, "work_date": work_date, "updated_at": datetime.now(),
+             **summary_values(first_in, last_out, event_count)}
+            for (employee_id, work_date), (first_in, last_out, event_count) in aggregates.items()
+        ]
+        stale = db.query(DailySummary)
+        if start_date:
+            stale = stale.filter(DailySummary.work_date >= start_date)
+        if end_date:
+            stale = stale.filter(DailySummary.work_date <= end_date)
+        stale.delete(synchronize_session=False)
+        if rows:
+            db.execute(insert(DailySummary), rows)
+        db.commit()
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bangun ulang tabel daily_summary dari data absensi.")
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="Tanggal awal (YYYY-MM-DD).")
+    parser.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="Tanggal akhir (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" REBUILD RINGKASAN ABSENSI HARIAN")
+    print("==============================================")
+    print(f"Ringkasan dibangun ulang: {rebuild_daily_summary(args.start, args.end)} baris.")
+    print("==============================================")
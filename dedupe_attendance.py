@@ -0,0 +1,125 @@
+# dedupe_attendance.py
+# Migrasi aturan "absen sekali sehari per tipe" ke database:
+# 1. Mengisi kolom work_date untuk data lama (per rentang id).
+# 2. Melaporkan duplikat (pegawai, tipe, tanggal) yang melanggar aturan.
+# 3. Dengan --apply: menghapus duplikat (yang paling awal dipertahankan,
+#    sama seperti aturan lama yang menolak absen kedua), mencatat AuditLog,
+#    lalu membuat indeks unik uq_attendance_employee_type_work_date.
+import argparse
+
+from sqlalchemy import delete, update, func
+from sqlalchemy.orm import sessionmaker
+
+from database import engine, Attendance, Employee, AuditLog
+from migrations import upgrade, DAILY_UNIQUE_INDEX_VERSION
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+DEFAULT_BATCH_SIZE = 5000
+UNIQUE_INDEX_NAME = 'uq_attendance_employee_type_work_date'
+
+
+def backfill_work_date(batch_size=DEFAULT_BATCH_SIZE):
+    """Mengisi work_date = tanggal(timestamp) untuk baris yang belum punya, per rentang id."""
+    db = SessionLocal()
+    updated_count = 0
+    try:
+        max_id = db.query(func.max(Attendance.id)).scalar() or 0
+        for start_id in range(0, max_id, batch_size):
+            result = db.execute(
+                update(Attendance)
+                .where(Attendance.id > start_id, Attendance.id <= start_id + batch_size,
+                       Attendance.work_date.is_(None))
+                .values(work_date=func.date(Attendance.timestamp))
+            )
+            db.commit()
+            updated_count += result.rowcount
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return updated_count
+
+
+def find_duplicates(db):
+    """Mengembalikan daftar grup duplikat: (employee_id, nama, type, work_date, [id urut waktu])."""
+    groups = db.query(Attendance.employee_id, Attendance.type, Attendance.work_date)\
+        .group_by(Attendance.employee_id, Attendance.type, Attendance.work_date)\
+        .having(func.count(Attendance.id) > 1)\
+        .all()
+    duplicates = []
+    for employee_id, att_type, work_date in groups:
+        rows = db.query(Attendance.id, Employee.name)\
+            .join(Employee, Attendance.employee_id == Employee.id, isouter=True)\
+            .filter(Attendance.employee_id == employee_id, Attendance.type == att_type,
+                    Attendance.work_date == work_date)\
+            .order_by(Attendance.timestamp, Attendance.id)\
+            .all()
+        name = rows[0][1] if rows else None
+        duplicates.append((employee_id, name, att_type, work_date, [row[0] for row in rows]))
+    return duplicates
+
+
+def remove_duplicates(db, duplicates, user='dedupe_attendance.py'):
+    """Menghapus semua kecuali absensi paling awal di tiap grup, dengan AuditLog per baris."""
+    removed_count = 0
+    for employee_id, name, att_type, work_date, ids in duplicates:
+        keep_id, remove_ids = ids[0], ids[1:]
+        # Hanya kolom yang dibutuhkan: DB lama (versi 7) belum punya kolom dari migrasi sesudahnya
+        rows = db.query(Attendance.id, Attendance.type, Attendance.timestamp)\
+            .filter(Attendance.id.in_(remove_ids))\
+            .all()
+        for row_id, row_type, timestamp in rows:
+            db.add(AuditLog(
+                user=user, action="DELETE", record_type="Attendance", record_id=row_id,
+                details=(f"Menghapus absensi duplikat '{row_type}' oleh '{name}' ({employee_id}) "
+                         f"@ {timestamp.strftime('%Y-%m-%d %H:%M:%S')}; dipertahankan ID {keep_id}")
+            ))
+        db.execute(delete(Attendance.__table__).where(Attendance.id.in_(remove_ids)))
+        removed_count += len(rows)
+    db.commit()
+    return removed_count
+
+
+def create_unique_index():
+    """Membuat indeks unik (employee_id, type, work_date) setelah data bersih."""
+    index = next(idx for idx in Attendance.__table__.indexes if idx.name == UNIQUE_INDEX_NAME)
+    with engine.begin() as conn:
+        index.create(bind=conn, checkfirst=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bersihkan absensi duplikat & pasang indeks unik harian.")
+    parser.add_argument('--apply', action='store_true', help="Hapus duplikat (tanpa ini hanya laporan).")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" MIGRASI ATURAN ABSEN SEKALI SEHARI")
+    print("==============================================")
+    upgrade(target=DAILY_UNIQUE_INDEX_VERSION - 1) # Kolom work_date & migrasi sebelumnya
+    print(f"work_date diisi untuk {backfill_work_date()} baris.")
+
+    db = SessionLocal()
+    try:
+        duplicates = find_duplicates(db)
+        print(f"\n--- Laporan Duplikat ({len(duplicates)} grup) ---")
+        for employee_id, name, att_type, work_date, ids in duplicates:
+            print(f"* {work_date} {name or '[?]'} ({employee_id}) {att_type}: ID {ids[0]} dipertahankan, "
+                  f"duplikat {ids[1:]}")
+        if duplicates and args.apply:
+            print(f"\nDuplikat dihapus: {remove_duplicates(db, duplicates)}")
+        elif duplicates:
+            print("\nJalankan ulang dengan --apply untuk menghapus duplikat di atas.")
+    except Exception as e:
+        print(f"\nTerjadi error: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if args.apply or not duplicates:
+        create_unique_index()
+        print(f"Indeks unik {UNIQUE_INDEX_NAME} siap.")
+        upgrade() # Catat versi skema (dan jalankan migrasi sesudahnya)
+    print("==============================================")
@@ -0,0 +1,78 @@
+# exports.py
+# Helper ekspor data absensi (CSV streaming / XLSX write-only) agar pemakaian memori
+# tetap datar berapa pun jumlah barisnya. CSV dikirim sambil dibaca; XLSX baru bisa
+# dikirim setelah seluruh workbook selesai ditulis ke file sementara.
+import io
+import csv
+import tempfile
+
+from openpyxl import Workbook
+
+EXPORT_CHUNK_SIZE = 1000   # Jumlah baris yang diambil dari DB per batch (yield_per)
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXPORT_HEADERS = ['ID Absen', 'Nama Pegawai', 'Posisi', 'Waktu', 'Tipe', 'Latitude', 'Longitude', 'URL Foto']
+TYPE_LABELS = {'check_in': 'Masuk', 'check_out': 'Keluar'}
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def iter_queries(queries):
+    """Membaca beberapa query berurutan (misal DB live lalu arsip), masing-masing per chunk dengan yield_per."""
+    for query in queries:
+        yield from query.yield_per(EXPORT_CHUNK_SIZE)
+
+
+def iter_export_rows(rows, photo_url_prefix):
+    """Mengubah baris hasil query ekspor (lihat iter_queries) menjadi baris siap tulis."""
+    for att_id, name, position, timestamp, att_type, lat, lon, has_photo in rows:
+        yield [
+            att_id, name, position,
+            timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else '',
+            TYPE_LABELS.get(att_type, att_type), lat, lon,
+            f"{photo_url_prefix}{att_id}" if has_photo else ''
+        ]
+
+
+def iter_csv(rows, headers=EXPORT_HEADERS):
+    """Generator CSV: mengirim potongan teks per EXPORT_CHUNK_SIZE baris."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    yield '\ufeff' # BOM agar Excel membaca UTF-8 dengan benar
+    writer.writerow(headers)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0); buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def write_xlsx_tempfile(rows, sheet_name, headers=EXPORT_HEADERS, extra_sheets=None):
+    """Menulis baris ke workbook write-only di file sementara dan mengembalikan file yang sudah di-seek(0).
+
+    extra_sheets: dict opsional {judul_sheet: (headers, rows)} untuk sheet tambahan (misal keterangan).
+    """
+    workbook = Workbook(write_only=True)
+    sheets = {sheet_name: (headers, rows), **(extra_sheets or {})}
+    for title, (sheet_headers, sheet_rows) in sheets.items():
+        sheet = workbook.create_sheet(title=title)
+        sheet.append(sheet_headers)
+        for row in sheet_rows:
+            sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def iter_file(f):
+    """Generator isi file per FILE_CHUNK_SIZE byte; file ditutup (dan dihapus) setelah selesai."""
+    try:
+        while True:
+            chunk = f.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
@@ -0,0 +1,91 @@
+# generate_thumbnails.py
+# Membuat thumbnail untuk semua foto absensi di photo store yang belum
+# punya thumbnail, memakai pool proses agar semua core CPU terpakai.
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+from database import engine, Attendance
+from photo_store import get_photo_store, reset_photo_store
+from photo_processing import Image, store_thumbnail
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _init_worker():
+    """Initializer worker: buat ulang photo store di tiap proses."""
+    reset_photo_store()
+
+
+def _thumbnail_worker(photo_hash):
+    """Membuat thumbnail satu foto. Mengembalikan (hash, status)."""
+    store = get_photo_store()
+    if store.get_variant(photo_hash, 'thumb') is not None:
+        return photo_hash, 'skipped'
+    original = store.get(photo_hash)
+    if original is None:
+        return photo_hash, 'missing'
+    try:
+        store_thumbnail(photo_hash, original)
+        return photo_hash, 'created'
+    except Exception as e:
+        return photo_hash, f'error: {e}'
+
+
+def iter_photo_hash_batches(batch_size):
+    """Mengambil hash foto unik dari tabel absensi per batch (urut id, tanpa OFFSET)."""
+    db = SessionLocal()
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(Attendance.id, Attendance.photo_hash)\
+                .filter(Attendance.id > last_id, Attendance.photo_hash.isnot(None))\
+                .order_by(Attendance.id)\
+                .limit(batch_size)\
+                .all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield list({photo_hash for _, photo_hash in rows})
+    finally:
+        db.close()
+
+
+def backfill_thumbnails(workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Membuat thumbnail yang belum ada secara paralel. Mengembalikan hitungan per status."""
+    counts = {'created': 0, 'skipped': 0, 'missing': 0, 'error': 0}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for hashes in iter_photo_hash_batches(batch_size):
+            for photo_hash, status in pool.map(_thumbnail_worker, hashes, chunksize=16):
+                if status.startswith('error'):
+                    print(f"- Gagal membuat thumbnail {photo_hash}: {status}")
+                    status = 'error'
+                counts[status] += 1
+            print(f"  ... {sum(counts.values())} foto diproses ({counts['created']} thumbnail baru)")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Buat thumbnail untuk foto absensi lama.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Jumlah proses worker.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Jumlah baris absensi per batch.")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" BACKFILL THUMBNAIL FOTO ABSENSI")
+    print("==============================================")
+    if Image is None:
+        print("ERROR: Pillow belum terpasang (pip install Pillow).")
+    else:
+        counts = backfill_thumbnails(args.workers, args.batch_size)
+        print("\n--- Ringkasan ---")
+        print(f"Thumbnail dibuat   : {counts['created']}")
+        print(f"Sudah ada          : {counts['skipped']}")
+        print(f"Foto asli hilang   : {counts['missing']}")
+        print(f"Gagal              : {counts['error']}")
+        print("Catatan: foto yang masih di kolom photo_blob perlu dipindah dulu dengan migrate_photos.py")
+    print("==============================================")
@@ -0,0 +1,384 @@
+# geofence.py
+# Validasi lokasi absen terhadap daftar lokasi kantor (lingkaran atau poligon) yang
+# bisa ditugaskan per pegawai atau per jabatan. Lokasi dimuat ke indeks grid di memori
+# (divalidasi dengan versi di app_meta, seperti roster cache) sehingga satu pengecekan
+# hanya menguji lokasi di sel grid titik tersebut.
+#
+#   python geofence.py list
+#   python geofence.py add-site --name "Kantor Pusat" --lat -6.2 --lon 106.8 --radius 150
+#   python geofence.py add-site --name "Gudang" --polygon "-6.1,106.7;-6.1,106.8;-6.2,106.8"
+#   python geofence.py assign --site "Gudang" --position "Petugas Gudang"
+#   python geofence.py revalidate [--start 2024-01-01] [--end 2024-01-31]
+import os
+import math
+import json
+import argparse
+import threading
+import time
+from collections import namedtuple, defaultdict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import bindparam
+
+from database import SessionLocal, Employee, Attendance, GeofenceSite, GeofenceAssignment, get_meta, set_meta
+from archive import batch_partitions, partition_entity, update_rows_by_id
+
+# 'off' = tidak dicek, 'flag' = absen tetap diterima tapi ditandai outside_geofence,
+# 'enforce' = absen di luar area ditolak (403)
+GEOFENCE_MODE = os.environ.get('GEOFENCE_MODE', 'flag').lower()
+GEOFENCE_VERSION_KEY = 'geofence_version'
+GEOFENCE_CHECK_INTERVAL = float(os.environ.get('GEOFENCE_CHECK_INTERVAL', 5))
+# Ukuran sel grid indeks (derajat, ~1.1 km); lokasi yang menutupi terlalu banyak sel
+# tidak dimasukkan ke grid dan selalu diuji langsung
+GRID_CELL_DEG = float(os.environ.get('GEOFENCE_GRID_CELL_DEG', 0.01))
+GRID_MAX_CELLS_PER_SITE = 400
+REVALIDATE_BATCH_SIZE = 5000
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEG_LAT = 111320.0
+
+GeofenceShape = namedtuple('GeofenceShape', ['id', 'name', 'kind', 'latitude', 'longitude', 'radius_m', 'polygon'])
+
+
+# --- Geometri ---
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Jarak dua titik (meter) dengan rumus haversine."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def haversine_matrix(lats, lons, center_lats, center_lons):
+    """Jarak (meter) setiap titik ke setiap pusat sebagai matriks (titik x pusat), numpy."""
+    phi1 = np.radians(np.asarray(lats, dtype=float))[:, None]
+    lam1 = np.radians(np.asarray(lons, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(center_lats, dtype=float))[None, :]
+    lam2 = np.radians(np.asarray(center_lons, dtype=float))[None, :]
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def point_in_polygon(lat, lon, polygon):
+    """Ray casting: True jika titik berada di dalam poligon [(lat, lon), ...]."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        j = i
+    return inside
+
+def points_in_polygon(lats, lons, polygon):
+    """Ray casting untuk banyak titik sekaligus (loop per sisi poligon, vektor per titik)."""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    inside = np.zeros(lats.shape, dtype=bool)
+    vertices = np.asarray(polygon, dtype=float)
+    for (lat_i, lon_i), (lat_j, lon_j) in zip(vertices, np.roll(vertices, 1, axis=0)):
+        if lat_i == lat_j:
+            continue # Sisi horizontal tidak pernah memotong sinar
+        crosses = (lat_i > lats) != (lat_j > lats)
+        crosses &= lons < (lon_j - lon_i) * (lats - lat_i) / (lat_j - lat_i) + lon_i
+        inside ^= crosses
+    return inside
+
+def shape_contains(shape, lat, lon):
+    """True jika titik berada di dalam lokasi (lingkaran atau poligon)."""
+    if shape.kind == 'polygon':
+        return point_in_polygon(lat, lon, shape.polygon)
+    return haversine_distance(shape.latitude, shape.longitude, lat, lon) <= shape.radius_m
+
+def shape_bounds(shape):
+    """Kotak pembatas (min_lat, min_lon, max_lat, max_lon) sebuah lokasi."""
+    if shape.kind == 'polygon':
+        lats = [p[0] for p in shape.polygon]
+        lons = [p[1] for p in shape.polygon]
+        return min(lats), min(lons), max(lats), max(lons)
+    dlat = shape.radius_m / METERS_PER_DEG_LAT
+    dlon = shape.radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(shape.latitude)), 1e-6))
+    return shape.latitude - dlat, shape.longitude - dlon, shape.latitude + dlat, shape.longitude + dlon
+
+def parse_polygon(text):
+    """Mengubah 'lat,lon;lat,lon;...' menjadi [(lat, lon), ...] (minimal 3 titik)."""
+    points = [tuple(float(v) for v in pair.split(',')) for pair in text.split(';') if pair.strip()]
+    if len(points) < 3 or any(len(p) != 2 for p in points):
+        raise ValueError("Poligon membutuhkan minimal 3 titik 'lat,lon' dipisah ';'.")
+    return points
+
+
+# --- Indeks di Memori ---
+def grid_cell(lat, lon):
+    return int(math.floor(lat / GRID_CELL_DEG)), int(math.floor(lon / GRID_CELL_DEG))
+
+
+class GeofenceIndex:
+    """Lokasi aktif + penugasan, dengan grid sel -> lokasi untuk pencarian kandidat."""
+
+    def __init__(self, version, shapes, employee_sites, position_sites):
+        self.version = version
+        self.shapes = {shape.id: shape for shape in shapes}
+        self.employee_sites = employee_sites # employee_id -> frozenset(site_id)
+        self.position_sites = position_sites # jabatan -> frozenset(site_id)
+        self.grid = defaultdict(list)
+        self.unindexed = [] # Lokasi terlalu besar untuk grid, selalu diuji
+        for shape in shapes:
+            min_lat, min_lon, max_lat, max_lon = shape_bounds(shape)
+            (row0, col0), (row1, col1) = grid_cell(min_lat, min_lon), grid_cell(max_lat, max_lon)
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > GRID_MAX_CELLS_PER_SITE:
+                self.unindexed.append(shape)
+                continue
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self.grid[(row, col)].append(shape)
+
+    def allowed_site_ids(self, employee_id, position):
+        """Lokasi yang berlaku untuk pegawai: penugasan pegawai, lalu jabatan; None = semua lokasi."""
+        return self.employee_sites.get(employee_id) or self.position_sites.get(position)
+
+    def check(self, employee_id, position, lat, lon):
+        """(di_luar_area, lokasi_cocok). di_luar_area None jika tidak dicek (tanpa lokasi/koordinat)."""
+        if not self.shapes or lat is None or lon is None:
+            return None, None
+        allowed = self.allowed_site_ids(employee_id, position)
+        for shape in self.grid.get(grid_cell(lat, lon), []) + self.unindexed:
+            if (allowed is None or shape.id in allowed) and shape_contains(shape, lat, lon):
+                return False, shape
+        return True, None
+
+
+def load_geofence_index(db, version):
+    """Memuat lokasi aktif & penugasannya dari DB menjadi GeofenceIndex."""
+    shapes = [
+        GeofenceShape(site.id, site.name, site.kind, site.latitude, site.longitude, site.radius_m,
+                      [tuple(p) for p in json.loads(site.polygon)] if site.kind == 'polygon' else None)
+        for site in db.query(GeofenceSite).filter(GeofenceSite.is_active == True).all()
+    ]
+    active_ids = {shape.id for shape in shapes}
+    employee_sites, position_sites = defaultdict(set), defaultdict(set)
+    for site_id, employee_id, position in db.query(GeofenceAssignment.site_id, GeofenceAssignment.employee_id,
+                                                   GeofenceAssignment.position):
+        if site_id not in active_ids:
+            continue
+        if employee_id is not None:
+            employee_sites[employee_id].add(site_id)
+        elif position:
+            position_sites[position].add(site_id)
+    return GeofenceIndex(version, shapes,
+                         {k: frozenset(v) for k, v in employee_sites.items()},
+                         {k: frozenset(v) for k, v in position_sites.items()})
+
+
+def bump_geofence_version(db):
+    """Menaikkan versi geofence dalam transaksi yang sama dengan perubahan lokasi/penugasan."""
+    current = int(get_meta(db, GEOFENCE_VERSION_KEY, 0))
+    set_meta(db, GEOFENCE_VERSION_KEY, current + 1)
+
+
+class GeofenceCache:
+    """Cache GeofenceIndex yang divalidasi dengan versi di app_meta."""
+
+    def __init__(self, session_factory=SessionLocal, check_interval=GEOFENCE_CHECK_INTERVAL):
+        self._session_factory = session_factory
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Mengembalikan GeofenceIndex terbaru (memuat ulang hanya jika versi berubah)."""
+        index = self._index
+        if index is not None and time.monotonic() - self._checked_at < self._check_interval:
+            return index
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._checked_at < self._check_interval:
+                return self._index
+            db = self._session_factory()
+            try:
+                version = get_meta(db, GEOFENCE_VERSION_KEY, '0')
+                if self._index is None or self._index.version != version:
+                    self._index = load_geofence_index(db, version)
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def check(self, employee_id, position, lat, lon):
+        """Cek satu absen; (None, None) jika GEOFENCE_MODE 'off'."""
+        if GEOFENCE_MODE == 'off':
+            return None, None
+        return self.get().check(employee_id, position, lat, lon)
+
+
+geofence_cache = GeofenceCache()
+
+
+def geofence_rejection(outside_geofence, latitude, longitude):
+    """(pesan, status HTTP) jika absen harus ditolak (GEOFENCE_MODE 'enforce'), selain itu None."""
+    if GEOFENCE_MODE != 'enforce' or not geofence_cache.get().shapes:
+        return None
+    if latitude is None or longitude is None:
+        return "Gagal mendapatkan data lokasi Anda.", 400
+    if outside_geofence:
+        return "Lokasi Anda di luar area absensi yang diizinkan.", 403
+    return None
+
+
+# --- Validasi Ulang Data Lama (batch, vektor) ---
+def outside_mask(index, employee_ids, positions, lats, lons):
+    """Array bool di_luar_area untuk banyak titik sekaligus (matriks titik x lokasi)."""
+    shapes = list(index.shapes.values())
+    inside = np.zeros((len(lats), len(shapes)), dtype=bool)
+    circles = [i for i, shape in enumerate(shapes) if shape.kind != 'polygon']
+    if circles:
+        distances = haversine_matrix(lats, lons, [shapes[i].latitude for i in circles],
+                                     [shapes[i].longitude for i in circles])
+        inside[:, circles] = distances <= np.array([shapes[i].radius_m for i in circles])
+    for i, shape in enumerate(shapes):
+        if shape.kind == 'polygon':
+            inside[:, i] = points_in_polygon(lats, lons, shape.polygon)
+    # Matriks lokasi yang diizinkan, dibangun sekali per (pegawai, jabatan) unik
+    column = {shape.id: i for i, shape in enumerate(shapes)}
+    allowed_rows = {}
+    allowed = np.empty(inside.shape, dtype=bool)
+    for row, key in enumerate(zip(employee_ids, positions)):
+        if key not in allowed_rows:
+            site_ids = index.allowed_site_ids(*key)
+            mask = np.ones(len(shapes), dtype=bool)
+            if site_ids is not None:
+                mask[:] = False
+                mask[[column[site_id] for site_id in site_ids]] = True
+            allowed_rows[key] = mask
+        allowed[row] = allowed_rows[key]
+    return ~(inside & allowed).any(axis=1)
+
+
+def revalidate_attendance(start_date=None, end_date=None, batch_size=REVALIDATE_BATCH_SIZE):
+    """Menghitung ulang outside_geofence untuk absensi lama (DB live & arsip, per batch id).
+
+    Mengembalikan (dicek, di_luar). Arsip ikut diperbarui agar /manage tidak mencampur flag lama & baru.
+    """
+    db = SessionLocal()
+    try:
+        index = load_geofence_index(db, get_meta(db, GEOFENCE_VERSION_KEY, '0'))
+        if not index.shapes:
+            print("Belum ada lokasi geofence aktif; tidak ada yang divalidasi.")
+            return 0, 0
+        checked = violations = 0
+        for name, partition in batch_partitions(db):
+            if partition is not None and ((start_date and partition.end_date < start_date) or
+                                          (end_date and partition.start_date > end_date)):
+                continue # Periode arsip di luar rentang
+            last_id = 0
+            while True:
+                entity = partition_entity(db, partition) # ATTACH ulang setelah commit jika perlu
+                query = db.query(entity.id, entity.employee_id, Employee.position, entity.latitude, entity.longitude)\
+                    .join(Employee, entity.employee_id == Employee.id)\
+                    .filter(entity.id > last_id, entity.latitude.isnot(None), entity.longitude.isnot(None))
+                if start_date:
+                    query = query.filter(entity.work_date >= start_date)
+                if end_date:
+                    query = query.filter(entity.work_date <= end_date)
+                rows = query.order_by(entity.id).limit(batch_size).all()
+                if not rows:
+                    break
+                ids, employee_ids, positions, lats, lons = zip(*rows)
+                outside = outside_mask(index, employee_ids, positions, lats, lons)
+                update_rows_by_id(db, entity, {'outside_geofence': bindparam('outside')},
+                                  [{'row_id': att_id, 'outside': bool(flag)} for att_id, flag in zip(ids, outside)])
+                db.commit() # Commit per batch; proses yang terhenti cukup diulang
+                checked += len(rows)
+                violations += int(outside.sum())
+                last_id = ids[-1]
+                print(f"  ... {name}: {checked} absensi dicek, {violations} di luar area")
+        return checked, violations
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# --- CLI ---
+def add_site(db, name, latitude=None, longitude=None, radius_m=None, polygon=None):
+    """Menambah lokasi lingkaran (lat, lon, radius) atau poligon."""
+    if polygon:
+        site = GeofenceSite(name=name, kind='polygon', polygon=json.dumps(parse_polygon(polygon)))
+    elif None not in (latitude, longitude, radius_m) and radius_m > 0:
+        site = GeofenceSite(name=name, kind='circle', latitude=latitude, longitude=longitude, radius_m=radius_m)
+    else:
+        raise ValueError("Lokasi membutuhkan --polygon atau --lat, --lon dan --radius (> 0).")
+    db.add(site)
+    bump_geofence_version(db)
+    return site
+
+def assign_site(db, site_name, employee_id=None, position=None):
+    """Menugaskan lokasi ke satu pegawai atau ke satu jabatan."""
+    site = db.query(GeofenceSite).filter(GeofenceSite.name == site_name).first()
+    if site is None:
+        raise ValueError(f"Lokasi '{site_name}' tidak ditemukan.")
+    if (employee_id is None) == (not position):
+        raise ValueError("Isi salah satu: --employee-id atau --position.")
+    if employee_id is not None and db.get(Employee, employee_id) is None:
+        raise ValueError(f"Pegawai ID {employee_id} tidak ditemukan.")
+    db.add(GeofenceAssignment(site_id=site.id, employee_id=employee_id, position=position or None))
+    bump_geofence_version(db)
+
+
+if __name__ == "__main__":
+    parse_date = lambda s: datetime.strptime(s, '%Y-%m-%d').date()
+    parser = argparse.ArgumentParser(description="Kelola lokasi geofence absensi.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="Tampilkan lokasi & penugasan.")
+    site_parser = subparsers.add_parser('add-site', help="Tambah lokasi lingkaran atau poligon.")
+    site_parser.add_argument('--name', required=True)
+    site_parser.add_argument('--lat', type=float)
+    site_parser.add_argument('--lon', type=float)
+    site_parser.add_argument('--radius', type=float, help="Radius dalam meter.")
+    site_parser.add_argument('--polygon', help="Titik poligon 'lat,lon;lat,lon;...'.")
+    assign_parser = subparsers.add_parser('assign', help="Tugaskan lokasi ke pegawai atau jabatan.")
+    assign_parser.add_argument('--site', required=True, help="Nama lokasi.")
+    assign_parser.add_argument('--employee-id', type=int)
+    assign_parser.add_argument('--position')
+    revalidate_parser = subparsers.add_parser('revalidate', help="Validasi ulang lokasi absensi lama.")
+    revalidate_parser.add_argument('--start', type=parse_date, help="Tanggal awal (YYYY-MM-DD).")
+    revalidate_parser.add_argument('--end', type=parse_date, help="Tanggal akhir (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" GEOFENCE ABSENSI")
+    print("==============================================")
+    if args.command == 'revalidate':
+        checked, violations = revalidate_attendance(args.start, args.end)
+        print(f"Selesai: {checked} absensi dicek, {violations} ditandai di luar area.")
+    else:
+        db = SessionLocal()
+        try:
+            if args.command == 'list':
+                for site in db.query(GeofenceSite).order_by(GeofenceSite.name):
+                    shape = f"poligon {site.polygon}" if site.kind == 'polygon' \
+                        else f"lingkaran ({site.latitude}, {site.longitude}) r={site.radius_m:.0f}m"
+                    status = "aktif" if site.is_active else "nonaktif"
+                    print(f"[{site.id}] {site.name}: {shape} ({status})")
+                    for assignment in site.assignments:
+                        target = f"pegawai ID {assignment.employee_id}" if assignment.employee_id is not None \
+                            else f"jabatan '{assignment.position}'"
+                        print(f"      -> {target}")
+            elif args.command == 'add-site':
+                add_site(db, args.name, args.lat, args.lon, args.radius, args.polygon)
+                db.commit()
+                print(f"Lokasi '{args.name}' ditambahkan.")
+            else:
+                assign_site(db, args.site, args.employee_id, args.position)
+                db.commit()
+                print(f"Lokasi '{args.site}' ditugaskan.")
+        except ValueError as e:
+            db.rollback()
+            print(f"Error: {e}")
+            raise SystemExit(1)
+        finally:
+            db.close()
+    print("==============================================")
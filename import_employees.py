@@ -1,129 +1,204 @@
 # import_employees.py
-import pandas as pd
+# Impor/update/nonaktifkan pegawai dari Excel atau CSV.
+# Validasi memakai mask pandas, selisih dengan DB dihitung sebagai operasi himpunan
+# (merge per nama), lalu diterapkan dengan INSERT/UPDATE massal dalam satu transaksi.
+# Hash file terakhir yang diterapkan disimpan di app_meta agar file yang sama dilewati.
+#
+#   python import_employees.py [daftar_pegawai.xlsx|pegawai.csv] [--dry-run] [--force]
 import os
+import argparse
+import hashlib
+from collections import namedtuple
+
+import pandas as pd
+from sqlalchemy import insert, update
 from sqlalchemy.orm import sessionmaker
 # Impor model Employee dan fungsi/engine dari database.py
-from database import engine, Base, Employee, init_db
+from database import engine, Employee, init_db, get_meta, set_meta
+from roster_cache import bump_roster_version
 
 # --- Konfigurasi (Tetap sama) ---
 EXCEL_FILE_PATH = 'daftar_pegawai.xlsx'
 NAME_COLUMN_HEADER = 'Nama Pegawai'
 POSITION_COLUMN_HEADER = 'Jabatan'
 ALLOWED_POSITIONS = ["Pramu Kantor", "Petugas Keamanan Dalam", "Petugas Kesehatan", "Pengemudi", "Dokter", "Petugas Kesehatan BMN"] # Sesuaikan dengan list lengkap Anda
+IMPORT_HASH_KEY = 'employee_import_hash' # Hash file roster terakhir yang diterapkan
+DEACTIVATE_CHUNK = 500 # Jumlah id per UPDATE ... WHERE id IN (...)
+REPORT_LIMIT = 20      # Jumlah nama yang ditampilkan per kategori di laporan
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def import_or_update_employees():
-    """Impor, update posisi, dan nonaktifkan pegawai berdasarkan Excel."""
-    print(f"Membaca file Excel: {EXCEL_FILE_PATH}")
-    if not os.path.exists(EXCEL_FILE_PATH):
-        print(f"ERROR: File Excel '{EXCEL_FILE_PATH}' tidak ditemukan.")
-        return
+# added: [{name, position}], updated: [{id, name, position, is_active}] (termasuk reaktivasi),
+# deactivated: [{id, name}], invalid: DataFrame baris file yang dilewati (kolom row, name, reason)
+RosterDiff = namedtuple('RosterDiff', ['added', 'updated', 'reactivated', 'deactivated', 'invalid', 'valid_count'])
+
+
+def file_hash(path):
+    """SHA-256 isi file roster."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_roster_file(path):
+    """Membaca kolom nama & jabatan saja dari Excel/CSV (sebagai teks). ValueError jika kolom tidak ada."""
+    columns = [NAME_COLUMN_HEADER, POSITION_COLUMN_HEADER]
+    reader = pd.read_csv if path.lower().endswith('.csv') else pd.read_excel
+    header = reader(path, nrows=0).columns
+    if not set(columns) <= set(header):
+        raise ValueError(f"Pastikan kolom '{NAME_COLUMN_HEADER}' dan '{POSITION_COLUMN_HEADER}' ada di file.")
+    return reader(path, usecols=columns, dtype=str)
+
+
+def validate_roster(df):
+    """Memisahkan baris valid & tidak valid dengan mask vektor. Mengembalikan (roster, invalid).
+
+    roster: DataFrame (name, position) unik per nama; jika nama duplikat, baris terakhir dipakai.
+    """
+    names = df[NAME_COLUMN_HEADER].str.strip()
+    positions = df[POSITION_COLUMN_HEADER].str.strip()
+    empty = names.isna() | names.eq('') | positions.isna() | positions.eq('')
+    bad_position = ~empty & ~positions.isin(ALLOWED_POSITIONS)
+
+    invalid = pd.DataFrame({'row': df.index + 2, 'name': names, 'position': positions})[empty | bad_position]
+    invalid['reason'] = 'Nama atau Jabatan kosong'
+    invalid.loc[bad_position[bad_position].index, 'reason'] = "Jabatan '" + invalid['position'] + "' tidak valid"
+
+    roster = pd.DataFrame({'name': names, 'position': positions})[~(empty | bad_position)]
+    return roster.drop_duplicates('name', keep='last'), invalid
+
+
+def diff_roster(db, roster, invalid=None):
+    """Selisih roster file dengan tabel employees (merge per nama) tanpa memuat objek ORM."""
+    current = pd.DataFrame(db.query(Employee.id, Employee.name, Employee.position, Employee.is_active).all(),
+                           columns=['id', 'name', 'position', 'is_active'])
+    merged = roster.merge(current, on='name', how='outer', suffixes=('', '_db'), indicator=True)
+    in_file, in_db = merged['_merge'].ne('right_only'), merged['_merge'].ne('left_only')
+    is_active = merged['is_active'].fillna(False).astype(bool)
+
+    added = merged.loc[in_file & ~in_db, ['name', 'position']]
+    changed = merged[in_file & in_db & (merged['position'].ne(merged['position_db']) | ~is_active)]
+    reactivated = int((~is_active[changed.index]).sum())
+    deactivated = merged.loc[~in_file & is_active, ['id', 'name']]
+
+    updated = changed[['id', 'name', 'position']].assign(is_active=True)
+    updated['id'] = updated['id'].astype(int)
+    deactivated = deactivated.astype({'id': int})
+    return RosterDiff(added.to_dict('records'), updated.to_dict('records'), reactivated,
+                      deactivated.to_dict('records'),
+                      invalid if invalid is not None else pd.DataFrame(columns=['row', 'name', 'reason']),
+                      len(roster))
+
+
+def apply_roster_diff(db, diff):
+    """Menerapkan selisih dengan INSERT/UPDATE massal (commit dilakukan oleh pemanggil)."""
+    if diff.added:
+        db.execute(insert(Employee), diff.added)
+    if diff.updated:
+        # Bulk UPDATE berdasarkan primary key (kolom name ikut dikirim tapi nilainya sama)
+        db.execute(update(Employee), diff.updated)
+    deactivated_ids = [row['id'] for row in diff.deactivated]
+    for i in range(0, len(deactivated_ids), DEACTIVATE_CHUNK):
+        db.execute(update(Employee).where(Employee.id.in_(deactivated_ids[i:i + DEACTIVATE_CHUNK]))
+                   .values(is_active=False))
+
+
+def roster_diff_chunks(diff, chunk_size):
+    """Memecah selisih menjadi RosterDiff kecil berisi maksimal chunk_size baris (untuk commit bertahap)."""
+    for key in ('added', 'updated', 'deactivated'):
+        rows = getattr(diff, key)
+        for i in range(0, len(rows), chunk_size):
+            yield diff._replace(**{'added': [], 'updated': [], 'deactivated': [], key: rows[i:i + chunk_size]})
+
+
+def diff_counts(diff):
+    """Jumlah per kategori selisih (untuk ringkasan & log audit)."""
+    return {'added': len(diff.added), 'updated': len(diff.updated), 'reactivated': diff.reactivated,
+            'deactivated': len(diff.deactivated), 'invalid': len(diff.invalid)}
+
+
+def has_changes(diff):
+    return bool(diff.added or diff.updated or diff.deactivated)
+
+
+def print_diff_report(diff):
+    """Mencetak ringkasan selisih plus contoh nama per kategori (maksimal REPORT_LIMIT)."""
+    def sample(title, lines):
+        lines = list(lines)
+        print(f"{title}: {len(lines)}")
+        for line in lines[:REPORT_LIMIT]:
+            print(f"  {line}")
+        if len(lines) > REPORT_LIMIT:
+            print(f"  ... dan {len(lines) - REPORT_LIMIT} lainnya")
+
+    sample("+ Ditambahkan", (f"{row['name']} ({row['position']})" for row in diff.added))
+    sample("* Diupdate (posisi/aktif kembali)", (f"{row['name']} -> {row['position']}" for row in diff.updated))
+    sample("- Dinonaktifkan", (row['name'] for row in diff.deactivated))
+    sample("! Baris dilewati", (f"baris {row.row}: {row.reason}" for row in diff.invalid.itertuples()))
+
+
+def import_or_update_employees(path=EXCEL_FILE_PATH, dry_run=False, force=False):
+    """Impor, update posisi, dan nonaktifkan pegawai berdasarkan file Excel/CSV. Mengembalikan RosterDiff atau None."""
+    print(f"Membaca file roster: {path}")
+    if not os.path.exists(path):
+        print(f"ERROR: File '{path}' tidak ditemukan.")
+        return None
 
     db = SessionLocal()
-    added_count = 0
-    updated_pos_count = 0
-    reactivated_count = 0
-    deactivated_count = 0
-    skipped_invalid_count = 0
-
     try:
-        df = pd.read_excel(EXCEL_FILE_PATH)
-        if NAME_COLUMN_HEADER not in df.columns or POSITION_COLUMN_HEADER not in df.columns:
-            print(f"ERROR: Pastikan kolom '{NAME_COLUMN_HEADER}' dan '{POSITION_COLUMN_HEADER}' ada di Excel.")
-            return
-
-        # 1. Dapatkan data valid dari Excel (nama sebagai key)
-        excel_employees = {}
-        for index, row in df.iterrows():
-            name = str(row[NAME_COLUMN_HEADER]).strip() if pd.notna(row[NAME_COLUMN_HEADER]) else None
-            position = str(row[POSITION_COLUMN_HEADER]).strip() if pd.notna(row[POSITION_COLUMN_HEADER]) else None
-
-            if not name or not position:
-                print(f"- Melewati baris {index + 2} Excel: Nama atau Jabatan kosong.")
-                skipped_invalid_count += 1
-                continue
-            if position not in ALLOWED_POSITIONS:
-                print(f"- Melewati baris {index + 2} Excel ({name}): Jabatan '{position}' tidak valid.")
-                skipped_invalid_count += 1
-                continue
-
-            # Jika nama duplikat di Excel, gunakan yang terakhir
-            excel_employees[name] = position
-
-        print(f"Ditemukan {len(excel_employees)} data pegawai valid di Excel.")
-
-        # 2. Dapatkan data pegawai dari DB (nama sebagai key)
-        db_employees = {emp.name: emp for emp in db.query(Employee).all()}
-        print(f"Ditemukan {len(db_employees)} pegawai di Database.")
-
-        # 3. Proses Tambah/Update/Reaktivasi
-        for name, position in excel_employees.items():
-            if name in db_employees:
-                # Pegawai sudah ada di DB
-                employee = db_employees[name]
-                needs_update = False
-                # Update posisi jika berbeda
-                if employee.position != position:
-                    print(f"* Mengupdate Posisi: {name} ({employee.position} -> {position})")
-                    employee.position = position
-                    needs_update = True
-                # Aktifkan kembali jika sebelumnya nonaktif
-                if not employee.is_active:
-                    print(f"* Mengaktifkan Kembali: {name}")
-                    employee.is_active = True
-                    reactivated_count += 1
-                    needs_update = True
-
-                if needs_update:
-                     updated_pos_count += 1 # Hitung sebagai update jika posisi berubah atau reaktivasi
-                     if employee not in db.dirty: db.add(employee) # Pastikan terdaftar untuk update
-                # Hapus dari dict agar tahu mana yg perlu dinonaktifkan nanti
-                del db_employees[name]
-            else:
-                # Pegawai baru
-                print(f"+ Menambahkan Pegawai: {name} ({position})")
-                new_employee = Employee(name=name, position=position, is_active=True)
-                db.add(new_employee)
-                added_count += 1
-
-        # 4. Proses Nonaktifkan Pegawai
-        # Pegawai yang tersisa di db_employees adalah yang tidak ada di Excel
-        for name_to_deactivate, employee_to_deactivate in db_employees.items():
-            if employee_to_deactivate.is_active: # Hanya nonaktifkan yang masih aktif
-                print(f"- Menonaktifkan Pegawai (tidak ada di Excel): {name_to_deactivate}")
-                employee_to_deactivate.is_active = False
-                deactivated_count += 1
-                if employee_to_deactivate not in db.dirty: db.add(employee_to_deactivate)
-
-        # 5. Commit Perubahan
-        if db.new or db.dirty: # Cek jika ada penambahan atau perubahan
+        roster_hash = file_hash(path)
+        if not force and not dry_run and get_meta(db, IMPORT_HASH_KEY) == roster_hash:
+            print("File tidak berubah sejak import terakhir, dilewati (gunakan --force untuk memaksa).")
+            return None
+        try:
+            df = read_roster_file(path)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return None
+
+        roster, invalid = validate_roster(df)
+        print(f"Ditemukan {len(roster)} data pegawai valid dari {len(df)} baris.")
+        diff = diff_roster(db, roster, invalid)
+        print_diff_report(diff)
+
+        if dry_run:
+            print("\nDry run: tidak ada perubahan yang disimpan.")
+        elif has_changes(diff):
             print("\nMenyimpan perubahan ke database...")
+            apply_roster_diff(db, diff)
+            bump_roster_version(db) # Server memuat ulang roster cache-nya
+            set_meta(db, IMPORT_HASH_KEY, roster_hash)
             db.commit()
             print("Perubahan berhasil disimpan.")
         else:
+            set_meta(db, IMPORT_HASH_KEY, roster_hash)
+            db.commit()
             print("\nTidak ada perubahan data pegawai di database.")
-
+        return diff
     except Exception as e:
         print(f"\nTerjadi error: {e}")
         print("Rollback perubahan...")
         db.rollback()
+        return None
     finally:
         db.close()
-        print("\n--- Ringkasan Proses Import/Update ---")
-        print(f"Pegawai baru ditambahkan : {added_count}")
-        print(f"Posisi pegawai diupdate  : {updated_pos_count}") # Termasuk reaktivasi
-        print(f"Pegawai diaktifkan kembali: {reactivated_count}")
-        print(f"Pegawai dinonaktifkan   : {deactivated_count}")
-        print(f"Baris Excel dilewati    : {skipped_invalid_count}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Impor/update pegawai dari file Excel atau CSV.")
+    parser.add_argument('path', nargs='?', default=EXCEL_FILE_PATH, help="File roster (.xlsx atau .csv).")
+    parser.add_argument('--dry-run', action='store_true', help="Tampilkan selisih tanpa menyimpan.")
+    parser.add_argument('--force', action='store_true', help="Proses walau file sama dengan import terakhir.")
+    args = parser.parse_args()
+
     print("==============================================")
-    print(" SCRIPT IMPORT/UPDATE PEGAWAI DARI EXCEL")
+    print(" SCRIPT IMPORT/UPDATE PEGAWAI DARI EXCEL/CSV")
     print("==============================================")
     print("Memastikan tabel database ada/diperbarui...")
     init_db() # Panggil init_db untuk buat tabel jika belum ada
     print("\nMemulai proses import/update...")
-    import_or_update_employees() # Ganti nama fungsi yg dipanggil
+    import_or_update_employees(args.path, dry_run=args.dry_run, force=args.force)
     print("\nProses import/update selesai.")
     print("==============================================")
@@ -0,0 +1,157 @@
+# migrate_photos.py
+# Memindahkan foto lama dari kolom attendance.photo_blob ke photo store
+# (lihat photo_store.py) secara bertahap per batch, lalu opsional
+# mengosongkan ruang di attendance.db dengan VACUUM.
+import os
+import time
+import argparse
+
+from sqlalchemy import update, case, func
+from sqlalchemy.orm import sessionmaker
+
+from database import engine, Attendance, init_db
+from photo_store import get_photo_store, save_photo
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+DEFAULT_BATCH_SIZE = 200
+# Foto yang di-put kurang dari N menit lalu tidak dianggap yatim (barisnya mungkin belum di-commit)
+ORPHAN_GRACE_MINUTES = int(os.environ.get('ORPHAN_GRACE_MINUTES', 60))
+ORPHAN_CHECK_CHUNK = 500 # Jumlah hash per query cek ulang sebelum dihapus
+
+
+def backfill_photo_metadata(batch_size=DEFAULT_BATCH_SIZE * 10):
+    """Mengisi has_photo & photo_size untuk baris lama per rentang id (tanpa memuat blob ke Python)."""
+    db = SessionLocal()
+    updated_count = 0
+    try:
+        max_id = db.query(func.max(Attendance.id)).scalar() or 0
+        for start_id in range(0, max_id, batch_size):
+            result = db.execute(
+                update(Attendance)
+                .where(Attendance.id > start_id, Attendance.id <= start_id + batch_size)
+                .values(
+                    has_photo=case(
+                        (Attendance.photo_hash.isnot(None) | Attendance.photo_blob.isnot(None), True),
+                        else_=False
+                    ),
+                    photo_size=func.coalesce(Attendance.photo_size, func.length(Attendance.photo_blob))
+                )
+            )
+            db.commit()
+            updated_count += result.rowcount
+        print(f"  ... metadata foto diperbarui untuk {updated_count} baris")
+    except Exception as e:
+        print(f"\nTerjadi error saat backfill metadata: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return updated_count
+
+
+def migrate_photo_blobs(batch_size=DEFAULT_BATCH_SIZE):
+    """Memindahkan photo_blob ke photo store per batch; aman dijalankan ulang."""
+    db = SessionLocal()
+    moved_count = 0
+    moved_bytes = 0
+    last_id = 0
+    try:
+        while True:
+            # Ambil batch berikutnya berdasarkan id agar tidak perlu OFFSET
+            rows = db.query(Attendance.id, Attendance.photo_blob)\
+                .filter(Attendance.id > last_id, Attendance.photo_blob.isnot(None))\
+                .order_by(Attendance.id)\
+                .limit(batch_size)\
+                .all()
+            if not rows:
+                break
+
+            for att_id, photo_blob in rows:
+                photo_ref = save_photo(photo_blob)
+                db.execute(
+                    update(Attendance)
+                    .where(Attendance.id == att_id)
+                    .values(photo_blob=None, **photo_ref)
+                )
+                moved_bytes += len(photo_blob)
+            db.commit() # Commit per batch agar bisa dilanjutkan jika terhenti
+            moved_count += len(rows)
+            last_id = rows[-1][0]
+            print(f"  ... {moved_count} foto dipindahkan (sampai ID {last_id}, {moved_bytes / 1024 / 1024:.1f} MB)")
+    except Exception as e:
+        print(f"\nTerjadi error: {e}")
+        print("Rollback batch terakhir...")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return moved_count, moved_bytes
+
+
+def remove_orphan_photos(grace_minutes=ORPHAN_GRACE_MINUTES):
+    """Menghapus foto di store yang tidak lagi direferensikan oleh baris absensi mana pun (live maupun arsip).
+
+    Absensi baru menyimpan foto sebelum barisnya di-commit, jadi foto yang di-put kurang dari
+    grace_minutes menit sebelum pembersihan dimulai tidak disentuh, dan setiap kandidat dicek
+    ulang ke database tepat sebelum dihapus.
+    """
+    from archive import partition_sources
+    from photo_retention import referenced_hashes
+    stored_before = time.time() - grace_minutes * 60
+    db = SessionLocal()
+    try:
+        referenced = set()
+        for source in partition_sources(db, Attendance):
+            referenced.update(h for (h,) in db.query(source.entity.photo_hash)
+                              .filter(source.entity.photo_hash.isnot(None)).distinct())
+        store = get_photo_store()
+        candidates = [h for h in store.iter_hashes(stored_before) if h not in referenced]
+        removed_count = 0
+        for start in range(0, len(candidates), ORPHAN_CHECK_CHUNK):
+            chunk = candidates[start:start + ORPHAN_CHECK_CHUNK]
+            db.rollback() # Snapshot baru: lihat baris yang di-commit selama pembersihan
+            still_referenced = referenced_hashes(db, chunk)
+            for photo_hash in chunk:
+                if photo_hash not in still_referenced:
+                    store.delete(photo_hash)
+                    removed_count += 1
+    finally:
+        db.close()
+    return removed_count
+
+
+def vacuum_database():
+    """Menjalankan VACUUM agar ruang bekas photo_blob dikembalikan ke sistem file."""
+    if engine.dialect.name != 'sqlite':
+        print("VACUUM hanya dijalankan untuk SQLite, dilewati.")
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pindahkan foto absensi dari attendance.db ke photo store.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Jumlah foto per transaksi.")
+    parser.add_argument('--vacuum', action='store_true', help="Jalankan VACUUM setelah migrasi untuk mengosongkan ruang.")
+    parser.add_argument('--metadata-only', action='store_true', help="Hanya isi has_photo/photo_size, tanpa memindahkan foto.")
+    parser.add_argument('--remove-orphans', action='store_true', help="Hapus file foto yang tidak direferensikan.")
+    parser.add_argument('--orphan-grace-minutes', type=int, default=ORPHAN_GRACE_MINUTES,
+                        help="Foto yang lebih baru dari N menit tidak dihapus sebagai yatim.")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" MIGRASI FOTO ABSENSI KE PHOTO STORE")
+    print("==============================================")
+    init_db() # Pastikan kolom photo_hash/photo_size/photo_mime/has_photo sudah ada
+    backfill_photo_metadata()
+    if not args.metadata_only:
+        moved_count, moved_bytes = migrate_photo_blobs(args.batch_size)
+        print(f"\nFoto dipindahkan : {moved_count} ({moved_bytes / 1024 / 1024:.1f} MB)")
+    if args.remove_orphans:
+        print(f"Foto yatim dihapus: {remove_orphan_photos(args.orphan_grace_minutes)}")
+    if args.vacuum:
+        print("Menjalankan VACUUM...")
+        vacuum_database()
+        print("VACUUM selesai.")
+    print("==============================================")
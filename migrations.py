@@ -0,0 +1,320 @@
+# migrations.py
+# Migrasi skema berversi. Versi skema disimpan di app_meta ('schema_version');
+# setiap migrasi dijalankan berurutan, sekali, dan versi dicatat setelah migrasi
+# selesai sehingga proses yang terhenti bisa dilanjutkan. Semua migrasi idempoten
+# (aman untuk database baru maupun database lama yang sudah diubah manual).
+#
+#   python migrations.py status
+#   python migrations.py upgrade [--target N]
+#
+# Aplikasi web tidak menjalankan DDL saat start; hanya check_schema_version().
+import argparse
+
+from sqlalchemy import MetaData, create_engine, inspect, text
+
+from database import (engine, SessionLocal, Base, Employee, Attendance, AppMeta, AuditLog, DailySummary,
+                      GeofenceSite, GeofenceAssignment, ArchivePartition, set_meta)
+
+SCHEMA_VERSION_KEY = 'schema_version'
+MIGRATIONS = [] # (versi, deskripsi, fungsi), urut menaik
+
+
+class MigrationError(Exception):
+    """Migrasi tidak bisa dilanjutkan tanpa tindakan manual."""
+
+
+def migration(version, description):
+    """Decorator untuk mendaftarkan fungsi migrasi dengan nomor versinya."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+# --- Helper DDL ---
+def _server_default_sql(column):
+    """Mengubah server_default kolom menjadi potongan SQL untuk ALTER TABLE."""
+    default = column.server_default.arg
+    if isinstance(default, str):
+        return f"'{default}'"
+    return str(default.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+def add_missing_columns(table, column_names, bind=None):
+    """Menambahkan kolom model yang belum ada di tabel database (ALTER TABLE ADD COLUMN).
+
+    bind: engine lain (misal file arsip); default engine utama.
+    """
+    bind = bind or engine
+    existing_columns = {col['name'] for col in inspect(bind).get_columns(table.name)}
+    with bind.begin() as conn:
+        for name in column_names:
+            if name in existing_columns:
+                continue
+            column = table.columns[name]
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=bind.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {_server_default_sql(column)}"
+            print(f"  ... menambahkan kolom {table.name}.{name}")
+            conn.exec_driver_sql(ddl)
+
+def create_index_online(index):
+    """Membuat indeks jika belum ada; di PostgreSQL memakai CONCURRENTLY agar tabel tidak terkunci."""
+    columns = ", ".join(col.name for col in index.columns)
+    unique = "UNIQUE " if index.unique else ""
+    if engine.dialect.name == 'postgresql':
+        # CONCURRENTLY tidak boleh di dalam transaksi
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql(f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {index.name} "
+                                 f"ON {index.table.name} ({columns})")
+    else:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {index.table.name} ({columns})")
+    print(f"  ... indeks {index.name} siap")
+
+def table_index(table, name):
+    """Mengambil objek Index dari model berdasarkan nama."""
+    return next(idx for idx in table.indexes if idx.name == name)
+
+def rebuild_sqlite_table(table, indexes):
+    """Membangun ulang tabel SQLite dengan definisi model (SQLite tidak bisa ALTER constraint).
+
+    Kolom yang ada di tabel lama & model disalin apa adanya (ID tetap); indexes: indeks model
+    yang dibuat ulang setelah rename (nama indeks lama ikut terhapus bersama tabelnya).
+    """
+    print(f"  ... membangun ulang tabel {table.name} (SQLite)")
+    columns = [col['name'] for col in inspect(engine).get_columns(table.name)]
+    metadata = MetaData()
+    Employee.__table__.to_metadata(metadata) # Agar foreign key bisa di-resolve
+    rebuilt = table.to_metadata(metadata, name=f'{table.name}_rebuild')
+    rebuilt.indexes.clear()
+    common = ", ".join(name for name in columns if name in rebuilt.columns)
+    with engine.begin() as conn:
+        rebuilt.create(bind=conn)
+        conn.exec_driver_sql(f"INSERT INTO {rebuilt.name} ({common}) SELECT {common} FROM {table.name}")
+        conn.exec_driver_sql(f"DROP TABLE {table.name}")
+        conn.exec_driver_sql(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}")
+    for index in indexes:
+        create_index_online(index)
+
+def sqlite_has_autoincrement(table_name, bind=None):
+    """True jika tabel SQLite dibuat dengan INTEGER PRIMARY KEY AUTOINCREMENT."""
+    with (bind or engine).connect() as conn:
+        sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                   (table_name,)).scalar()
+    return bool(sql) and 'AUTOINCREMENT' in sql.upper()
+
+
+# --- Daftar Migrasi ---
+@migration(1, "Tabel dasar (employees, attendance, audit_log, app_meta)")
+def create_base_tables():
+    # Hanya membuat tabel yang belum ada; tabel lama diubah oleh migrasi berikutnya
+    Base.metadata.create_all(bind=engine)
+
+@migration(2, "attendance.photo_blob boleh NULL")
+def make_photo_blob_nullable():
+    columns = {col['name']: col for col in inspect(engine).get_columns('attendance')}
+    if columns['photo_blob']['nullable']:
+        return
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE attendance ALTER COLUMN photo_blob DROP NOT NULL")
+        return
+    # SQLite tidak bisa mengubah constraint kolom: bangun ulang tabel dengan definisi model.
+    # Indeks unik harian menunggu migrasi 8 (data perlu dibersihkan)
+    rebuild_sqlite_table(Attendance.__table__, [idx for idx in Attendance.__table__.indexes if not idx.unique])
+
+@migration(3, "Kolom referensi & metadata foto di attendance")
+def add_photo_columns():
+    add_missing_columns(Attendance.__table__, ['photo_hash', 'photo_size', 'photo_mime', 'has_photo'])
+    create_index_online(table_index(Attendance.__table__, 'ix_attendance_photo_hash'))
+    create_index_online(table_index(Attendance.__table__, 'ix_attendance_has_photo'))
+
+@migration(4, "Backfill has_photo & photo_size")
+def backfill_photo_columns():
+    from migrate_photos import backfill_photo_metadata
+    backfill_photo_metadata()
+
+@migration(5, "Kolom employees.is_active")
+def add_employee_is_active():
+    add_missing_columns(Employee.__table__, ['is_active'])
+    create_index_online(table_index(Employee.__table__, 'ix_employees_is_active'))
+
+@migration(6, "Indeks keyset (timestamp, id) & absensi terakhir (employee_id, timestamp)")
+def add_attendance_list_indexes():
+    create_index_online(table_index(Attendance.__table__, 'ix_attendance_timestamp_id'))
+    create_index_online(table_index(Attendance.__table__, 'ix_attendance_employee_timestamp'))
+
+@migration(7, "Kolom attendance.work_date + backfill")
+def add_work_date():
+    from dedupe_attendance import backfill_work_date
+    add_missing_columns(Attendance.__table__, ['work_date'])
+    print(f"  ... work_date diisi untuk {backfill_work_date()} baris")
+
+DAILY_UNIQUE_INDEX_VERSION = 8 # dedupe_attendance.py bermigrasi sampai sebelum versi ini
+
+@migration(DAILY_UNIQUE_INDEX_VERSION, "Indeks unik absen sekali sehari (employee_id, type, work_date)")
+def add_daily_unique_index():
+    from dedupe_attendance import find_duplicates
+    db = SessionLocal()
+    try:
+        duplicates = find_duplicates(db)
+    finally:
+        db.close()
+    if duplicates:
+        raise MigrationError(f"Ada {len(duplicates)} grup absensi duplikat. "
+                             "Jalankan 'python dedupe_attendance.py --apply' lalu ulangi upgrade.")
+    create_index_online(table_index(Attendance.__table__, 'uq_attendance_employee_type_work_date'))
+
+@migration(9, "Tabel ringkasan harian daily_summary + isi awal")
+def create_daily_summary():
+    from daily_summary import rebuild_daily_summary
+    DailySummary.__table__.create(bind=engine, checkfirst=True)
+    print(f"  ... {rebuild_daily_summary()} ringkasan harian dibuat")
+
+@migration(10, "Tabel geofence (lokasi & penugasan) + kolom attendance.outside_geofence")
+def add_geofence():
+    GeofenceSite.__table__.create(bind=engine, checkfirst=True)
+    GeofenceAssignment.__table__.create(bind=engine, checkfirst=True)
+    add_missing_columns(Attendance.__table__, ['outside_geofence'])
+    create_index_online(table_index(Attendance.__table__, 'ix_attendance_outside_geofence'))
+
+@migration(11, "Indeks audit_log (timestamp, record, user) + pencarian teks details")
+def add_audit_log_indexes():
+    from audit_search import setup_audit_search
+    for name in ['ix_audit_log_timestamp_id', 'ix_audit_log_record', 'ix_audit_log_user_timestamp']:
+        create_index_online(table_index(AuditLog.__table__, name))
+    setup_audit_search()
+
+@migration(12, "Tabel manifest arsip archive_partitions")
+def create_archive_manifest():
+    ArchivePartition.__table__.create(bind=engine, checkfirst=True)
+
+@migration(13, "Kolom attendance.photo_tier (tier retensi foto), termasuk di file arsip")
+def add_photo_tier():
+    from archive import archive_files
+    add_missing_columns(Attendance.__table__, ['photo_tier'])
+    for path in archive_files(): # Arsip juga harus punya kolom baru agar salin/ATTACH tetap cocok
+        archive_engine = create_engine(f"sqlite:///{path}")
+        try:
+            add_missing_columns(Attendance.__table__, ['photo_tier'], bind=archive_engine)
+        finally:
+            archive_engine.dispose()
+
+@migration(14, "Kolom attendance.photo_phash & similar_photo_id (deteksi foto dipakai ulang)")
+def add_photo_phash():
+    from archive import archive_files
+    columns = ['photo_phash', 'similar_photo_id']
+    add_missing_columns(Attendance.__table__, columns)
+    for name in ['ix_attendance_photo_phash', 'ix_attendance_similar_photo_id']:
+        create_index_online(table_index(Attendance.__table__, name))
+    for path in archive_files():
+        archive_engine = create_engine(f"sqlite:///{path}")
+        try:
+            add_missing_columns(Attendance.__table__, columns, bind=archive_engine)
+        finally:
+            archive_engine.dispose()
+    print("  ... isi hash foto lama dengan 'python photo_similarity.py backfill'")
+
+@migration(15, "ID attendance & audit_log AUTOINCREMENT (tidak dipakai ulang setelah arsip)")
+def add_id_autoincrement():
+    # Tanpa AUTOINCREMENT, SQLite memberi ID baru max(id)+1 dari tabel live; setelah arsip
+    # mengosongkan sebagian tabel, ID bisa bentrok dengan baris di file arsip
+    if engine.dialect.name != 'sqlite':
+        return # Server database memakai sequence yang tidak pernah mundur
+    from archive import archive_files, archived_max_id, seed_id_sequence
+    from audit_search import SQLITE_FTS_DDL, FTS_TABLE
+    for model in (Attendance, AuditLog):
+        table = model.__table__
+        if sqlite_has_autoincrement(table.name):
+            continue
+        existing = {idx['name'] for idx in inspect(engine).get_indexes(table.name)}
+        rebuild_sqlite_table(table, [idx for idx in table.indexes if idx.name in existing])
+    if inspect(engine).has_table(FTS_TABLE):
+        with engine.begin() as conn: # Trigger FTS ikut terhapus bersama tabel audit_log lama
+            for ddl in SQLITE_FTS_DDL[1:]:
+                conn.exec_driver_sql(ddl)
+    # sqlite_sequence mulai dari ID terbesar di DB live; naikkan sampai ID terbesar di arsip
+    for path in archive_files():
+        archive_engine = create_engine(f"sqlite:///{path}")
+        try:
+            with archive_engine.connect() as archive_conn:
+                max_ids = {model.__tablename__: archived_max_id(archive_conn, model.__tablename__)
+                           for model in (Attendance, AuditLog)}
+        finally:
+            archive_engine.dispose()
+        with engine.begin() as conn:
+            for table_name, max_id in max_ids.items():
+                seed_id_sequence(conn, table_name, max_id)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# --- Versi Skema ---
+def get_schema_version():
+    """Versi skema yang tercatat di database (0 jika belum pernah dimigrasi)."""
+    if not inspect(engine).has_table(AppMeta.__tablename__):
+        return 0
+    with engine.connect() as conn:
+        value = conn.execute(text("SELECT value FROM app_meta WHERE key = :key"),
+                             {"key": SCHEMA_VERSION_KEY}).scalar()
+    return int(value) if value else 0
+
+def set_schema_version(version):
+    """Mencatat versi skema di app_meta."""
+    db = SessionLocal()
+    try:
+        set_meta(db, SCHEMA_VERSION_KEY, version)
+        db.commit()
+    finally:
+        db.close()
+
+def check_schema_version():
+    """Cek murah saat aplikasi start: peringatan jika skema tertinggal, tanpa menjalankan DDL."""
+    try:
+        version = get_schema_version()
+    except Exception as e:
+        print(f"WARNING: Gagal membaca versi skema database: {e}")
+        return None
+    if version < LATEST_VERSION:
+        print(f"WARNING: Skema database versi {version}, aplikasi membutuhkan versi {LATEST_VERSION}. "
+              "Jalankan 'python migrations.py upgrade'.")
+    return version
+
+def pending_migrations(target=None):
+    """Migrasi yang belum dijalankan sampai versi target (default: terbaru)."""
+    current = get_schema_version()
+    target = LATEST_VERSION if target is None else target
+    return [m for m in MIGRATIONS if current < m[0] <= target]
+
+def upgrade(target=None):
+    """Menjalankan migrasi yang tertunda secara berurutan. Mengembalikan versi akhir."""
+    for version, description, func in pending_migrations(target):
+        print(f"Migrasi {version}: {description}")
+        func()
+        set_schema_version(version) # Dicatat per migrasi agar upgrade yang terhenti bisa dilanjutkan
+    return get_schema_version()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrasi skema database absensi.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Tampilkan versi skema & migrasi yang tertunda.")
+    upgrade_parser = subparsers.add_parser('upgrade', help="Jalankan migrasi yang tertunda.")
+    upgrade_parser.add_argument('--target', type=int, default=None, help="Berhenti di versi ini.")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" MIGRASI SKEMA DATABASE")
+    print("==============================================")
+    if args.command == 'status':
+        print(f"Versi skema: {get_schema_version()} (terbaru: {LATEST_VERSION})")
+        for version, description, _ in pending_migrations():
+            print(f"  tertunda {version}: {description}")
+    else:
+        try:
+            print(f"Skema sekarang versi {upgrade(args.target)}.")
+        except MigrationError as e:
+            print(f"\nMigrasi berhenti: {e}")
+            raise SystemExit(1)
+    print("==============================================")
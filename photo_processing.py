@@ -0,0 +1,112 @@
+# photo_processing.py
+# Pengolahan gambar foto absensi (thumbnail, dsb).
+# Pillow bersifat opsional: jika tidak terpasang, thumbnail tidak dibuat dan
+# foto ukuran penuh yang dikirim.
+import io
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from photo_store import get_photo_store
+
+# --- Konfigurasi Thumbnail ---
+# Tabel admin menampilkan foto 80px; 160px agar tetap tajam di layar HiDPI
+THUMB_MAX_SIZE = int(os.environ.get('THUMB_MAX_SIZE', 160))
+THUMB_QUALITY = int(os.environ.get('THUMB_QUALITY', 70))
+
+# --- Profil Pengambilan Foto (dipublikasikan ke klien lewat /api/capture_profile) ---
+# Foto absensi hanya untuk verifikasi wajah, 640px sudah lebih dari cukup
+CAPTURE_PROFILE = {
+    "max_width": int(os.environ.get('CAPTURE_MAX_WIDTH', 640)),
+    "max_height": int(os.environ.get('CAPTURE_MAX_HEIGHT', 640)),
+    "jpeg_quality": float(os.environ.get('CAPTURE_JPEG_QUALITY', 0.7)),  # 0..1 seperti canvas.toBlob
+    "min_jpeg_quality": float(os.environ.get('CAPTURE_MIN_JPEG_QUALITY', 0.4)),
+    "target_bytes": int(os.environ.get('CAPTURE_TARGET_BYTES', 80 * 1024)),
+}
+
+
+def make_thumbnail(data, max_size=THUMB_MAX_SIZE, quality=THUMB_QUALITY):
+    """Membuat thumbnail JPEG dari bytes foto. Mengembalikan None jika Pillow tidak tersedia."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img) # Ikuti orientasi EXIF dari kamera HP
+        img = img.convert('RGB')
+        img.thumbnail((max_size, max_size))
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def store_thumbnail(photo_hash, data):
+    """Membuat & menyimpan thumbnail untuk foto di store. Mengembalikan bytes thumbnail atau None."""
+    thumb = make_thumbnail(data)
+    if thumb is not None:
+        get_photo_store().put_variant(photo_hash, 'thumb', thumb)
+    return thumb
+
+
+def get_or_create_thumbnail(photo_hash, load_original=None):
+    """Mengambil thumbnail dari store, membuatnya dulu jika belum ada (lazy untuk data lama).
+
+    load_original: fungsi tanpa argumen untuk mengambil foto asli (default dari photo store),
+    misal untuk foto yang sudah di arsip dingin.
+    """
+    store = get_photo_store()
+    thumb = store.get_variant(photo_hash, 'thumb')
+    if thumb is not None:
+        return thumb
+    original = load_original() if load_original else store.get(photo_hash)
+    if original is None:
+        return None
+    try:
+        return store_thumbnail(photo_hash, original)
+    except Exception as e:
+        print(f"Warning: gagal membuat thumbnail {photo_hash}: {e}") # Pemanggil kirim foto asli
+        return None
+
+
+def recompress_photo(data, max_size, quality):
+    """Kompres ulang foto ke JPEG max_size px / quality tertentu. None jika Pillow tidak tersedia."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((max_size, max_size))
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def fit_capture_profile(data, profile=CAPTURE_PROFILE):
+    """Memastikan foto sesuai profil (dimensi & ukuran); dikompres ulang di server jika perlu.
+
+    Mengembalikan bytes foto yang sudah sesuai profil. Raise ValueError jika foto tidak bisa
+    dibaca, atau jika Pillow tidak tersedia dan foto melebihi target_bytes.
+    """
+    if Image is None:
+        if len(data) > profile["target_bytes"]:
+            raise ValueError(f"Ukuran foto melebihi batas {profile['target_bytes'] // 1024} KB.")
+        return data
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception:
+        raise ValueError("File foto tidak valid atau rusak.")
+    with img:
+        fits_dimensions = img.width <= profile["max_width"] and img.height <= profile["max_height"]
+        if fits_dimensions and len(data) <= profile["target_bytes"] and img.format == 'JPEG':
+            return data # Klien sudah mengikuti profil, simpan apa adanya
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((profile["max_width"], profile["max_height"]))
+        quality = profile["jpeg_quality"]
+        while True:
+            output = io.BytesIO()
+            img.save(output, format='JPEG', quality=int(quality * 100), optimize=True)
+            # Turunkan kualitas bertahap sampai target tercapai atau batas minimum
+            if output.tell() <= profile["target_bytes"] or quality <= profile["min_jpeg_quality"]:
+                return output.getvalue()
+            quality = max(profile["min_jpeg_quality"], quality - 0.1)
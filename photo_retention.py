@@ -0,0 +1,296 @@
+# photo_retention.py
+# Retensi foto absensi berdasarkan umur, dalam tier (kolom attendance.photo_tier):
+#   full    : kualitas asli, umur < PHOTO_FULL_DAYS hari
+#   compact : dikompres ulang ke PHOTO_COMPACT_MAX_SIZE px / PHOTO_COMPACT_QUALITY (hash baru di photo store)
+#   cold    : opsional (PHOTO_COLD_DAYS > 0), bulan yang seluruhnya lebih tua dari batas dipindah
+#             ke zip bulanan di PHOTO_COLD_DIR; thumbnail tetap di photo store untuk /manage
+# Berjalan per rentang id (live lalu file arsip) dengan pool proses untuk kompresi; posisi
+# disimpan di app_meta sehingga proses yang terhenti melanjutkan dari batch terakhir.
+# get_attendance_photo membaca tier mana pun lewat photo_store.read_photo().
+#
+#   python photo_retention.py [--full-days 90] [--cold-days 365] [--workers 4] [--dry-run]
+import os
+import json
+import argparse
+from datetime import date, datetime, time, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam, func, or_
+
+from database import SessionLocal, get_meta, set_meta
+from archive import batch_partitions, partition_entity, update_rows_by_id
+from photo_store import (get_photo_store, get_cold_archive, reset_photo_store, cold_period,
+                         PHOTO_TIER_FULL, PHOTO_TIER_COMPACT, PHOTO_TIER_COLD)
+from photo_processing import Image, recompress_photo, store_thumbnail
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+PHOTO_FULL_DAYS = int(os.environ.get('PHOTO_FULL_DAYS', 90))
+PHOTO_COMPACT_MAX_SIZE = int(os.environ.get('PHOTO_COMPACT_MAX_SIZE', 480))
+PHOTO_COMPACT_QUALITY = int(os.environ.get('PHOTO_COMPACT_QUALITY', 60))
+PHOTO_COLD_DAYS = int(os.environ.get('PHOTO_COLD_DAYS', 0)) # 0 = tanpa arsip dingin
+CHECKPOINT_KEY = 'photo_retention_checkpoint'
+DEFAULT_BATCH_SIZE = 500
+REFERENCE_CHUNK = 500 # Jumlah hash per query IN saat cek referensi
+
+
+def _empty_stats():
+    return {'compacted': 0, 'kept': 0, 'cold': 0, 'missing': 0, 'error': 0,
+            'freed_bytes': 0, 'added_bytes': 0, 'cold_archive_bytes': 0}
+
+
+# --- Referensi Foto (DB live + file arsip) ---
+def referenced_hashes(db, hashes, hot_only=False):
+    """Hash dari daftar yang masih dipakai baris absensi di sumber mana pun.
+
+    hot_only: hanya hitung baris yang fotonya masih dibaca dari photo store (bukan tier cold).
+    """
+    hashes, found = list(hashes), set()
+    for _, partition in batch_partitions(db):
+        entity = partition_entity(db, partition)
+        for i in range(0, len(hashes), REFERENCE_CHUNK):
+            query = db.query(entity.photo_hash).filter(entity.photo_hash.in_(hashes[i:i + REFERENCE_CHUNK]))
+            if hot_only:
+                query = query.filter(or_(entity.photo_tier.is_(None), entity.photo_tier != PHOTO_TIER_COLD))
+            found.update(h for (h,) in query.distinct())
+    return found
+
+# --- Tier Compact ---
+def _init_worker():
+    """Initializer worker: buat ulang photo store di tiap proses."""
+    reset_photo_store()
+
+def _compact_worker(args):
+    """Mengompres ulang satu foto. Mengembalikan (hash_lama, ref_baru atau None, status)."""
+    photo_hash, max_size, quality = args
+    store = get_photo_store()
+    original = store.get(photo_hash)
+    if original is None:
+        return photo_hash, None, 'missing'
+    try:
+        compact = recompress_photo(original, max_size, quality)
+        if len(compact) >= len(original):
+            return photo_hash, None, 'kept' # Sudah kecil; cukup tandai tier-nya
+        new_hash = store.put(compact)
+        thumb = store.get_variant(photo_hash, 'thumb')
+        if thumb is not None:
+            store.put_variant(new_hash, 'thumb', thumb)
+        else:
+            store_thumbnail(new_hash, compact)
+    except Exception as e:
+        return photo_hash, None, f'error: {e}'
+    return photo_hash, {'new_hash': new_hash, 'new_size': len(compact), 'old_size': len(original)}, 'compacted'
+
+def compact_source(db, pool, name, partition, cutoff, checkpoint, stats, batch_size, max_size, quality):
+    """Mengompres foto tier full yang lebih tua dari cutoff di satu sumber, per batch id."""
+    store = get_photo_store()
+    last_id = checkpoint['compact'].get(name, 0)
+    while True:
+        entity = partition_entity(db, partition)
+        rows = db.query(entity.id, entity.photo_hash)\
+            .filter(entity.id > last_id, entity.photo_hash.isnot(None), entity.timestamp < cutoff,
+                    or_(entity.photo_tier.is_(None), entity.photo_tier == PHOTO_TIER_FULL))\
+            .order_by(entity.id)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        jobs = [(photo_hash, max_size, quality) for photo_hash in {h for _, h in rows}]
+        results = {h: (ref, status) for h, ref, status in pool.map(_compact_worker, jobs, chunksize=8)}
+
+        compacted, kept = [], []
+        for row_id, photo_hash in rows:
+            ref, status = results[photo_hash]
+            if status == 'compacted':
+                compacted.append({'row_id': row_id, 'new_hash': ref['new_hash'], 'new_size': ref['new_size']})
+            elif status == 'kept':
+                kept.append({'row_id': row_id})
+            else:
+                if status.startswith('error'):
+                    print(f"- Gagal kompres foto {photo_hash} (absensi {row_id}): {status}")
+                stats['error' if status.startswith('error') else 'missing'] += 1
+        update_rows_by_id(db, entity, {'photo_hash': bindparam('new_hash'), 'photo_size': bindparam('new_size'),
+                                  'photo_mime': 'image/jpeg', 'photo_tier': PHOTO_TIER_COMPACT}, compacted)
+        update_rows_by_id(db, entity, {'photo_tier': PHOTO_TIER_COMPACT}, kept)
+        stats['compacted'] += len(compacted)
+        stats['kept'] += len(kept)
+        old_refs = {h: ref for h, (ref, status) in results.items() if status == 'compacted'}
+        stats['added_bytes'] += sum(ref['new_size'] for ref in old_refs.values())
+        checkpoint['compact'][name] = last_id
+        set_meta(db, CHECKPOINT_KEY, json.dumps({**checkpoint, 'stats': stats}))
+        db.commit()
+
+        # Foto asli baru dihapus setelah commit, dan hanya jika tidak dipakai baris lain (live/arsip)
+        still_used = referenced_hashes(db, old_refs)
+        for photo_hash, ref in old_refs.items():
+            if photo_hash not in still_used:
+                store.delete(photo_hash)
+                stats['freed_bytes'] += ref['old_size']
+        db.rollback() # Tutup transaksi baca cek referensi
+        print(f"  ... {name}: sampai id {last_id}, {stats['compacted']} foto dikompres")
+
+
+# --- Tier Cold ---
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+def cold_source(db, name, partition, cutoff, stats, batch_size):
+    """Memindahkan foto per bulan (seluruhnya sebelum cutoff) dari photo store ke zip arsip dingin."""
+    store, cold = get_photo_store(), get_cold_archive()
+    eligible = lambda entity: [entity.photo_hash.isnot(None),
+                               or_(entity.photo_tier.is_(None), entity.photo_tier != PHOTO_TIER_COLD)]
+    entity = partition_entity(db, partition)
+    oldest = db.query(func.min(entity.timestamp)).filter(*eligible(entity), entity.timestamp < cutoff).scalar()
+    if oldest is None:
+        return
+    month = month_start(oldest.date())
+    while month < cutoff.date():
+        month_range = (datetime.combine(month, time()), datetime.combine(next_month(month), time()))
+        period = cold_period(month_range[0])
+        entity = partition_entity(db, partition)
+        rows, last_id = [], 0
+        while True: # Kumpulkan baris bulan ini per batch id
+            batch = db.query(entity.id, entity.photo_hash, entity.photo_size)\
+                .filter(entity.id > last_id, *eligible(entity),
+                        entity.timestamp >= month_range[0], entity.timestamp < month_range[1])\
+                .order_by(entity.id)\
+                .limit(batch_size)\
+                .all()
+            if not batch:
+                break
+            rows.extend(batch)
+            last_id = batch[-1][0]
+        month = next_month(month)
+        if not rows:
+            continue
+
+        in_zip = cold.names(period) # Dari proses sebelumnya yang terhenti sebelum commit
+        sizes = {photo_hash: size or 0 for _, photo_hash, size in rows}
+        written = {h for h in sizes if h in in_zip}
+
+        def items():
+            for photo_hash in sizes:
+                if photo_hash in written:
+                    continue
+                data = store.get(photo_hash)
+                if data is None:
+                    continue
+                written.add(photo_hash)
+                yield photo_hash, data
+
+        old_zip_size = os.path.getsize(cold.path(period)) if os.path.exists(cold.path(period)) else 0
+        stats['cold_archive_bytes'] += cold.write_period(period, items()) - old_zip_size
+        moved = [{'row_id': row_id} for row_id, photo_hash, _ in rows if photo_hash in written]
+        stats['missing'] += len(rows) - len(moved)
+        for i in range(0, len(moved), batch_size):
+            update_rows_by_id(db, entity, {'photo_tier': PHOTO_TIER_COLD}, moved[i:i + batch_size])
+        db.commit()
+        stats['cold'] += len(moved)
+
+        # Hapus foto asli dari photo store jika tidak ada lagi baris non-cold yang memakainya
+        still_hot = referenced_hashes(db, written, hot_only=True)
+        for photo_hash in written:
+            if photo_hash not in still_hot:
+                store.delete_original(photo_hash) # Thumbnail tetap disimpan
+                stats['freed_bytes'] += sizes[photo_hash]
+        db.rollback()
+        print(f"  ... {name}: {len(moved)} foto {period} dipindah ke arsip dingin")
+
+
+# --- Proses Utama ---
+def retention_cutoffs(full_days, cold_days, today=None):
+    """(batas compact, batas cold atau None). Batas cold dibulatkan ke awal bulan agar zip bulanan utuh."""
+    today = today or date.today()
+    compact_cutoff = datetime.combine(today - timedelta(days=full_days), time())
+    cold_cutoff = None
+    if cold_days:
+        cold_cutoff = datetime.combine(month_start(today - timedelta(days=cold_days)), time())
+    return compact_cutoff, cold_cutoff
+
+def pending_counts(full_days, cold_days):
+    """Jumlah foto yang akan dikompres / dipindah ke arsip dingin (untuk --dry-run)."""
+    compact_cutoff, cold_cutoff = retention_cutoffs(full_days, cold_days)
+    counts = {'compact': 0, 'cold': 0}
+    db = SessionLocal()
+    try:
+        for _, partition in batch_partitions(db):
+            entity = partition_entity(db, partition)
+            counts['compact'] += db.query(func.count(entity.id)).filter(
+                entity.photo_hash.isnot(None), entity.timestamp < compact_cutoff,
+                or_(entity.photo_tier.is_(None), entity.photo_tier == PHOTO_TIER_FULL)).scalar()
+            if cold_cutoff:
+                counts['cold'] += db.query(func.count(entity.id)).filter(
+                    entity.photo_hash.isnot(None), entity.timestamp < cold_cutoff,
+                    or_(entity.photo_tier.is_(None), entity.photo_tier != PHOTO_TIER_COLD)).scalar()
+    finally:
+        db.close()
+    return counts
+
+def run_retention(full_days=PHOTO_FULL_DAYS, cold_days=PHOTO_COLD_DAYS, workers=None,
+                  batch_size=DEFAULT_BATCH_SIZE, max_size=PHOTO_COMPACT_MAX_SIZE, quality=PHOTO_COMPACT_QUALITY):
+    """Menjalankan retensi (compact lalu cold) dan mengembalikan statistik, termasuk byte yang dibebaskan."""
+    compact_cutoff, cold_cutoff = retention_cutoffs(full_days, cold_days)
+    db = SessionLocal()
+    try:
+        saved = get_meta(db, CHECKPOINT_KEY)
+        checkpoint = json.loads(saved) if saved else {'compact': {}}
+        stats = checkpoint.pop('stats', None) or _empty_stats()
+        if saved:
+            print(f"Melanjutkan proses sebelumnya dari posisi {checkpoint['compact']}")
+        sources = batch_partitions(db)
+
+        if Image is None:
+            print("WARNING: Pillow belum terpasang (pip install Pillow); tahap kompresi dilewati.")
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                for name, partition in sources:
+                    compact_source(db, pool, name, partition, compact_cutoff, checkpoint, stats,
+                                   batch_size, max_size, quality)
+        if cold_cutoff:
+            for name, partition in sources:
+                cold_source(db, name, partition, cold_cutoff, stats, batch_size)
+
+        set_meta(db, CHECKPOINT_KEY, '') # Selesai: proses berikutnya mulai dari awal lagi
+        db.commit()
+        return stats
+    finally:
+        db.close()
+
+
+def _mb(value):
+    return f"{value / 1024 / 1024:.1f} MB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retensi foto absensi: kompres foto lama & pindah ke arsip dingin.")
+    parser.add_argument('--full-days', type=int, default=PHOTO_FULL_DAYS, help="Umur (hari) foto tetap kualitas asli.")
+    parser.add_argument('--cold-days', type=int, default=PHOTO_COLD_DAYS,
+                        help="Umur (hari) foto dipindah ke arsip dingin (0 = nonaktif).")
+    parser.add_argument('--max-size', type=int, default=PHOTO_COMPACT_MAX_SIZE, help="Sisi terpanjang foto compact (px).")
+    parser.add_argument('--quality', type=int, default=PHOTO_COMPACT_QUALITY, help="Kualitas JPEG foto compact.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Jumlah proses worker kompresi.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Jumlah baris absensi per batch.")
+    parser.add_argument('--dry-run', action='store_true', help="Hanya hitung foto yang akan diproses.")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" RETENSI FOTO ABSENSI")
+    print("==============================================")
+    if args.dry_run:
+        counts = pending_counts(args.full_days, args.cold_days)
+        print(f"Akan dikompres        : {counts['compact']}")
+        print(f"Akan ke arsip dingin  : {counts['cold']}")
+    else:
+        stats = run_retention(args.full_days, args.cold_days, args.workers, args.batch_size, args.max_size, args.quality)
+        print("\n--- Ringkasan ---")
+        print(f"Foto dikompres        : {stats['compacted']} (sudah kecil, hanya ditandai: {stats['kept']})")
+        print(f"Foto ke arsip dingin  : {stats['cold']}")
+        print(f"Foto asli hilang      : {stats['missing']}")
+        print(f"Gagal                 : {stats['error']}")
+        print(f"Photo store dibebaskan: {_mb(stats['freed_bytes'])} (foto compact baru {_mb(stats['added_bytes'])})")
+        print(f"Arsip dingin bertambah: {_mb(stats['cold_archive_bytes'])}")
+        print(f"Total ruang kembali   : {_mb(stats['freed_bytes'] - stats['added_bytes'] - stats['cold_archive_bytes'])}")
+    print("==============================================")
@@ -0,0 +1,403 @@
+# photo_similarity.py
+# Deteksi foto absensi yang dipakai ulang (foto yang sama, atau foto dari foto, untuk hari
+# lain atau untuk pegawai lain) memakai hash perseptual dHash 64 bit (kolom photo_phash).
+# Hash dihitung saat record_attendance; data lama diisi dengan 'backfill'. Pencarian
+# "foto mirip dalam jarak Hamming k" memakai indeks multi-index hashing di memori: hash
+# dipecah menjadi k+1 potongan, dan menurut prinsip sarang merpati setiap hash dalam jarak
+# <= k pasti sama persis di minimal satu potongan, jadi hanya isi bucket itu yang dicek.
+#
+#   python photo_similarity.py backfill [--workers 4]
+#   python photo_similarity.py report [--days 7] [--distance 5]
+import io
+import os
+import argparse
+import threading
+import time
+from collections import namedtuple, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from sqlalchemy import bindparam, func, or_
+
+from database import SessionLocal, Attendance, get_meta, set_meta
+from archive import partition_sources, batch_partitions, partition_entity, update_rows_by_id
+from photo_store import read_photo, reset_photo_store
+
+# 'off' = hanya hitung hash, 'flag' = absen tetap diterima tapi similar_photo_id diisi
+PHOTO_REUSE_MODE = os.environ.get('PHOTO_REUSE_MODE', 'off').lower()
+# Jarak Hamming maksimal (dari 64 bit) yang dianggap foto sama; juga batas atas pencarian indeks
+PHOTO_REUSE_DISTANCE = int(os.environ.get('PHOTO_REUSE_DISTANCE', 5))
+PHOTO_INDEX_VERSION_KEY = 'photo_index_version'
+PHOTO_INDEX_CHECK_INTERVAL = float(os.environ.get('PHOTO_INDEX_CHECK_INTERVAL', 5))
+# refresh() memindai ulang sekian ID di bawah ID terbesar yang sudah dimuat: di PostgreSQL ID
+# dibagikan saat INSERT, bukan saat commit, jadi baris ber-ID kecil bisa ter-commit belakangan
+PHOTO_INDEX_RESCAN_IDS = int(os.environ.get('PHOTO_INDEX_RESCAN_IDS', 1000))
+DHASH_SIZE = 8
+DEFAULT_BATCH_SIZE = 500
+REPORT_LIMIT = 500
+
+PhotoHashEntry = namedtuple('PhotoHashEntry', ['attendance_id', 'employee_id', 'work_date'])
+ReuseMatch = namedtuple('ReuseMatch', ['distance', 'first', 'second'])
+
+
+# --- Hash Perseptual ---
+def dhash(data):
+    """dHash 64 bit (hex 16 karakter) dari bytes foto. None jika Pillow tidak tersedia."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('L', (DHASH_SIZE * 4, DHASH_SIZE * 4)) # JPEG: decode langsung di skala kecil
+        img = ImageOps.exif_transpose(img).convert('L').resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS)
+        pixels = list(img.getdata())
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:016x}"
+
+def compute_phash(data):
+    """dHash untuk jalur insert; None (bukan error) jika gambar tidak bisa dibaca."""
+    try:
+        return dhash(data)
+    except Exception as e:
+        print(f"Warning: gagal menghitung hash perseptual foto: {e}")
+        return None
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+# --- Indeks Multi-Index Hashing ---
+class PhotoHashIndex:
+    """Indeks hash foto di memori; pencarian tepat untuk jarak <= max_distance."""
+
+    def __init__(self, max_distance=PHOTO_REUSE_DISTANCE, version=None):
+        self.max_distance = max_distance
+        self.version = version
+        chunks = max_distance + 1
+        widths = [64 // chunks + (1 if i < 64 % chunks else 0) for i in range(chunks)]
+        self._chunks = [(sum(widths[:i]), (1 << width) - 1) for i, width in enumerate(widths)]
+        self._tables = [defaultdict(list) for _ in self._chunks]
+        self._hashes = []
+        self._entries = []
+        self._ids = set() # ID absensi yang sudah ada di indeks (dari build, refresh, atau proses ini)
+        self._removed_ids = set() # Absensi yang sudah dihapus; dilewati saat pencarian
+        self.last_live_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, phash, entry):
+        if entry.attendance_id in self._ids:
+            return
+        self._ids.add(entry.attendance_id)
+        value, position = int(phash, 16), len(self._hashes)
+        self._hashes.append(value)
+        self._entries.append(entry)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table[(value >> shift) & mask].append(position)
+
+    def add_local(self, phash, entry):
+        """Menambah absensi yang baru dicatat proses ini (refresh berikutnya tidak menambahkannya lagi)."""
+        self.add(phash, entry)
+
+    def discard(self, attendance_id):
+        """Menandai absensi yang dihapus agar tidak lagi muncul di hasil pencarian."""
+        self._removed_ids.add(attendance_id)
+
+    def search(self, phash, distance=None):
+        """[(jarak, entry)] dengan jarak Hamming <= distance (dibatasi max_distance), urut jarak."""
+        distance = self.max_distance if distance is None else min(distance, self.max_distance)
+        value, seen, results = int(phash, 16), set(), []
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            for position in table.get((value >> shift) & mask, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                d = hamming(self._hashes[position], value)
+                if d <= distance and self._entries[position].attendance_id not in self._removed_ids:
+                    results.append((d, self._entries[position]))
+        results.sort(key=lambda r: (r[0], r[1].attendance_id))
+        return results
+
+    def reuse_candidates(self, phash, employee_id, work_date, distance=None):
+        """[(jarak, entry)] absensi dengan foto mirip dari hari lain atau pegawai lain, terdekat dulu."""
+        return [(d, entry) for d, entry in self.search(phash, distance)
+                if entry.employee_id != employee_id or entry.work_date != work_date]
+
+    def refresh(self, db, rescan_ids=PHOTO_INDEX_RESCAN_IDS):
+        """Memuat absensi ber-hash di DB live dengan id > last_live_id - rescan_ids yang belum ada di indeks.
+
+        Jendela pindai ulang menangkap baris yang ter-commit tidak urut ID (transaksi lain masih
+        berjalan saat refresh sebelumnya); ID yang sudah dimuat dilewati.
+        """
+        max_id = db.query(func.max(Attendance.id)).scalar() or 0
+        rows = db.query(Attendance.id, Attendance.employee_id, Attendance.work_date, Attendance.photo_phash)\
+            .filter(Attendance.id > self.last_live_id - rescan_ids, Attendance.id <= max_id,
+                    Attendance.photo_phash.isnot(None))
+        for row_id, employee_id, work_date, phash in rows:
+            if row_id not in self._ids:
+                self.add(phash, PhotoHashEntry(row_id, employee_id, work_date))
+        self.last_live_id = max(self.last_live_id, max_id)
+
+
+def load_photo_index(db, version=None, max_distance=PHOTO_REUSE_DISTANCE):
+    """Membangun indeks dari semua absensi ber-hash (DB live dan arsip)."""
+    index = PhotoHashIndex(max_distance, version)
+    index.last_live_id = db.query(func.max(Attendance.id)).scalar() or 0
+    for source in partition_sources(db, Attendance):
+        entity = source.entity
+        query = db.query(entity.id, entity.employee_id, entity.work_date, entity.photo_phash)\
+            .filter(entity.photo_phash.isnot(None))
+        if source.schema is None:
+            query = query.filter(entity.id <= index.last_live_id)
+        for row_id, employee_id, work_date, phash in query.yield_per(10000):
+            index.add(phash, PhotoHashEntry(row_id, employee_id, work_date))
+    return index
+
+def existing_attendance_ids(db, attendance_ids):
+    """Bagian dari attendance_ids yang masih ada di DB live atau arsip (yang lain sudah dihapus)."""
+    missing, found = set(attendance_ids), set()
+    for source in partition_sources(db, Attendance):
+        if not missing:
+            break
+        ids = {row_id for (row_id,) in db.query(source.entity.id).filter(source.entity.id.in_(missing))}
+        found |= ids
+        missing -= ids
+    return found
+
+def bump_photo_index_version(db):
+    """Memaksa semua proses membangun ulang indeks (misal setelah backfill)."""
+    current = int(get_meta(db, PHOTO_INDEX_VERSION_KEY, 0))
+    set_meta(db, PHOTO_INDEX_VERSION_KEY, current + 1)
+
+
+class PhotoIndexCache:
+    """Cache PhotoHashIndex per proses: dibangun sekali, lalu hanya baris baru yang dimuat.
+
+    Build penuh (pertama kali atau setelah versi berubah) berjalan di thread latar, bukan di
+    request: selama indeks belum siap get() mengembalikan None (atau indeks versi lama), dan
+    absensi tetap diterima tanpa ditandai.
+    """
+
+    def __init__(self, session_factory=SessionLocal, check_interval=PHOTO_INDEX_CHECK_INTERVAL):
+        self._session_factory = session_factory
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._building = False
+        self._index = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Indeks terbaru tanpa pernah menunggu build penuh; None jika belum pernah siap."""
+        index = self._index
+        if time.monotonic() - self._checked_at < self._check_interval:
+            return index
+        if not self._lock.acquire(blocking=False):
+            return index # Thread lain sedang mengecek versi/refresh
+        try:
+            if time.monotonic() - self._checked_at < self._check_interval:
+                return self._index
+            db = self._session_factory()
+            try:
+                version = get_meta(db, PHOTO_INDEX_VERSION_KEY, '0')
+                if self._index is None or self._index.version != version:
+                    self._start_build(version)
+                else:
+                    self._index.refresh(db)
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return self._index
+        finally:
+            self._lock.release()
+
+    def _start_build(self, version):
+        # Dipanggil dengan self._lock; thread dibuat saat dipakai (bukan saat import) agar aman untuk server yang fork
+        if self._building:
+            return
+        self._building = True
+        threading.Thread(target=self._build, args=(version,), name='photo-index-build', daemon=True).start()
+
+    def _build(self, version):
+        index = None
+        db = self._session_factory()
+        try:
+            started = time.perf_counter()
+            index = load_photo_index(db, version)
+            print(f"Indeks hash foto dimuat: {len(index)} foto ({time.perf_counter() - started:.1f} dtk)")
+        except Exception as e:
+            print(f"Error membangun indeks hash foto: {e}")
+        finally:
+            db.close()
+        with self._lock:
+            if index is not None:
+                self._index = index
+                self._checked_at = 0.0 # get() berikutnya memuat absensi yang masuk selama build
+            self._building = False
+
+    def flag_reuse(self, phash, employee_id, work_date):
+        """ID absensi lain dengan foto mirip untuk jalur insert; None jika mode 'off', indeks belum siap, atau tidak ada."""
+        if PHOTO_REUSE_MODE != 'flag' or not phash:
+            return None
+        index = self.get()
+        if index is None:
+            return None
+        candidates = [entry.attendance_id for _, entry in index.reuse_candidates(phash, employee_id, work_date)]
+        if not candidates:
+            return None
+        db = self._session_factory()
+        try:
+            existing = existing_attendance_ids(db, candidates)
+        finally:
+            db.close()
+        for attendance_id in candidates:
+            if attendance_id in existing:
+                return attendance_id
+            index.discard(attendance_id) # Dihapus (misal lewat /manage/delete di proses lain)
+        return None
+
+    def record(self, phash, attendance_id, employee_id, work_date):
+        """Memasukkan absensi yang baru disimpan ke indeks (hanya jika indeks sudah dipakai)."""
+        if PHOTO_REUSE_MODE == 'flag' and phash and self._index is not None:
+            with self._lock:
+                self._index.add_local(phash, PhotoHashEntry(attendance_id, employee_id, work_date))
+
+    def discard(self, attendance_id):
+        """Mengeluarkan absensi yang dihapus dari indeks proses ini."""
+        index = self._index
+        if index is not None:
+            index.discard(attendance_id)
+
+
+photo_index_cache = PhotoIndexCache()
+
+
+# --- Laporan ---
+def find_reused_photos(db, index, start_date, end_date, distance=PHOTO_REUSE_DISTANCE, limit=REPORT_LIMIT):
+    """Pasangan absensi dalam rentang tanggal yang fotonya mirip dengan absensi lain (hari/pegawai lain)."""
+    matches, seen = [], set()
+    for source in partition_sources(db, Attendance, start_date, end_date):
+        entity = source.entity
+        rows = db.query(entity.id, entity.employee_id, entity.work_date, entity.photo_phash)\
+            .filter(entity.photo_phash.isnot(None), entity.timestamp >= start_date, entity.timestamp < end_date)\
+            .order_by(entity.id)
+        for row_id, employee_id, work_date, phash in rows:
+            for d, entry in index.search(phash, distance):
+                if entry.attendance_id == row_id or (entry.employee_id == employee_id and entry.work_date == work_date):
+                    continue
+                pair = (min(row_id, entry.attendance_id), max(row_id, entry.attendance_id))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                first = PhotoHashEntry(row_id, employee_id, work_date)
+                matches.append(ReuseMatch(d, *sorted([first, entry], key=lambda e: e.attendance_id)))
+            if len(matches) >= limit:
+                break
+        if len(matches) >= limit:
+            break
+    # Pasangan dari indeks bisa merujuk absensi yang sudah dihapus
+    existing = existing_attendance_ids(db, {e.attendance_id for m in matches for e in (m.first, m.second)})
+    return [m for m in matches if m.first.attendance_id in existing and m.second.attendance_id in existing][:limit]
+
+
+# --- Backfill ---
+def _init_worker():
+    """Initializer worker: buat ulang photo store di tiap proses."""
+    reset_photo_store()
+
+def _phash_worker(args):
+    """Menghitung dHash satu foto. Mengembalikan (id, hash atau None, status)."""
+    row_id, photo_hash, photo_tier, taken_at, blob = args
+    try:
+        data = blob if blob is not None else read_photo(photo_hash, photo_tier, taken_at)
+        if data is None:
+            return row_id, None, 'missing'
+        return row_id, dhash(data), 'hashed'
+    except Exception as e:
+        return row_id, None, f'error: {e}'
+
+def backfill_phashes(workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Mengisi photo_phash yang kosong (DB live & arsip) per batch id dengan pool proses."""
+    counts = {'hashed': 0, 'missing': 0, 'error': 0}
+    db = SessionLocal()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for name, partition in batch_partitions(db):
+                last_id = 0
+                while True:
+                    entity = partition_entity(db, partition)
+                    rows = db.query(entity.id, entity.photo_hash, entity.photo_tier, entity.timestamp)\
+                        .filter(entity.id > last_id, entity.photo_phash.is_(None),
+                                or_(entity.photo_hash.isnot(None), entity.photo_blob.isnot(None)))\
+                        .order_by(entity.id)\
+                        .limit(batch_size)\
+                        .all()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    legacy_ids = [row[0] for row in rows if row[1] is None]
+                    blobs = dict(db.query(entity.id, entity.photo_blob).filter(entity.id.in_(legacy_ids))) if legacy_ids else {}
+                    jobs = [(row_id, photo_hash, tier, taken_at, blobs.get(row_id)) for row_id, photo_hash, tier, taken_at in rows]
+                    params = []
+                    for row_id, phash, status in pool.map(_phash_worker, jobs, chunksize=16):
+                        if status.startswith('error'):
+                            print(f"- Gagal menghitung hash foto absensi {row_id}: {status}")
+                            status = 'error'
+                        elif phash:
+                            params.append({'row_id': row_id, 'phash': phash})
+                        counts[status] += 1
+                    update_rows_by_id(db, entity, {'photo_phash': bindparam('phash')}, params)
+                    db.commit()
+                    print(f"  ... {name}: sampai id {last_id}, {counts['hashed']} hash dihitung")
+        bump_photo_index_version(db)
+        db.commit()
+    finally:
+        db.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash perseptual foto absensi & laporan foto dipakai ulang.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill_parser = subparsers.add_parser('backfill', help="Hitung hash untuk foto lama.")
+    backfill_parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Jumlah proses worker.")
+    backfill_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Jumlah baris per batch.")
+    report_parser = subparsers.add_parser('report', help="Tampilkan foto yang mirip dengan absensi lain.")
+    report_parser.add_argument('--days', type=int, default=7, help="Rentang hari terakhir yang diperiksa.")
+    report_parser.add_argument('--distance', type=int, default=PHOTO_REUSE_DISTANCE, help="Jarak Hamming maksimal.")
+    args = parser.parse_args()
+
+    print("==============================================")
+    print(" DETEKSI FOTO ABSENSI DIPAKAI ULANG")
+    print("==============================================")
+    if Image is None:
+        print("ERROR: Pillow belum terpasang (pip install Pillow).")
+    elif args.command == 'backfill':
+        counts = backfill_phashes(args.workers, args.batch_size)
+        print("\n--- Ringkasan ---")
+        print(f"Hash dihitung    : {counts['hashed']}")
+        print(f"Foto tidak ada   : {counts['missing']}")
+        print(f"Gagal            : {counts['error']}")
+    else:
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            index = load_photo_index(db, max_distance=max(args.distance, PHOTO_REUSE_DISTANCE))
+            print(f"Indeks: {len(index)} foto ({time.perf_counter() - started:.1f} dtk)")
+            end = datetime.combine(date.today() + timedelta(days=1), dt_time())
+            matches = find_reused_photos(db, index, end - timedelta(days=args.days), end, args.distance)
+        finally:
+            db.close()
+        for match in matches:
+            print(f"jarak {match.distance}: absensi {match.first.attendance_id} (pegawai {match.first.employee_id}, "
+                  f"{match.first.work_date}) ~ absensi {match.second.attendance_id} "
+                  f"(pegawai {match.second.employee_id}, {match.second.work_date})")
+        print(f"\n{len(matches)} pasangan foto mirip ditemukan.")
+    print("==============================================")
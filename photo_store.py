@@ -0,0 +1,317 @@
+# photo_store.py
+# Penyimpanan foto absensi di luar tabel `attendance`.
+# Foto disimpan berdasarkan hash SHA-256 isinya (content-addressed), sehingga
+# baris absensi cukup menyimpan referensi hash, ukuran, dan mime type.
+import os
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+# 'filesystem' : direktori ber-shard (default), misal photo_store/ab/cd/abcdef...
+# 'sqlite'     : satu file segmen terpisah (photos.db), bukan attendance.db
+PHOTO_STORE_BACKEND = os.environ.get('PHOTO_STORE_BACKEND', 'filesystem')
+PHOTO_STORE_DIR = os.environ.get('PHOTO_STORE_DIR', os.path.join(BASE_DIR, 'photo_store'))
+PHOTO_SEGMENT_PATH = os.environ.get('PHOTO_SEGMENT_PATH', os.path.join(BASE_DIR, 'photos.db'))
+# Arsip dingin: foto lama dikemas per bulan dalam file zip (lihat photo_retention.py)
+PHOTO_COLD_DIR = os.environ.get('PHOTO_COLD_DIR', os.path.join(BASE_DIR, 'photo_cold'))
+
+# Tier penyimpanan foto (kolom attendance.photo_tier; NULL diperlakukan sebagai 'full')
+PHOTO_TIER_FULL = 'full'        # Kualitas asli di photo store
+PHOTO_TIER_COMPACT = 'compact'  # Sudah dikompres ulang, tetap di photo store
+PHOTO_TIER_COLD = 'cold'        # Di arsip zip bulanan; thumbnail tetap di photo store
+
+
+def hash_photo(data):
+    """Menghitung hash SHA-256 (hex) dari isi foto."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def detect_mime(data):
+    """Menebak mime type foto dari magic bytes (default image/jpeg)."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+# Varian ukuran yang disimpan berdampingan dengan foto asli (key: "<hash>.<varian>")
+PHOTO_VARIANTS = ('thumb',)
+
+
+class PhotoStore:
+    """Antarmuka dasar penyimpanan foto berbasis hash.
+
+    Subclass cukup mengimplementasikan _write/_read/_remove/_iter_keys per key.
+    _iter_keys menghasilkan (key, waktu put terakhir dalam epoch detik atau None).
+    """
+
+    def put(self, data):
+        """Menyimpan foto dan mengembalikan hash-nya. Foto identik hanya disimpan sekali."""
+        photo_hash = hash_photo(data)
+        self._write(photo_hash, data)
+        return photo_hash
+
+    def get(self, photo_hash):
+        """Mengambil isi foto berdasarkan hash, atau None jika tidak ada."""
+        return self._read(photo_hash)
+
+    def delete(self, photo_hash):
+        """Menghapus foto beserta variannya (tidak error jika tidak ada)."""
+        self._remove(photo_hash)
+        for variant in PHOTO_VARIANTS:
+            self._remove(f"{photo_hash}.{variant}")
+
+    def delete_original(self, photo_hash):
+        """Menghapus foto asli saja; varian (thumbnail) tetap disimpan."""
+        self._remove(photo_hash)
+
+    def put_variant(self, photo_hash, variant, data):
+        """Menyimpan varian ukuran (misal 'thumb') dari foto dengan hash tertentu."""
+        self._write(f"{photo_hash}.{variant}", data)
+
+    def get_variant(self, photo_hash, variant):
+        """Mengambil varian ukuran foto, atau None jika belum dibuat."""
+        return self._read(f"{photo_hash}.{variant}")
+
+    def iter_hashes(self, stored_before=None):
+        """Iterasi hash foto asli yang tersimpan (untuk pembersihan foto yatim).
+
+        stored_before: epoch detik; hanya foto yang terakhir di-put sebelum waktu ini. Foto
+        yang baru di-put bisa jadi milik absensi yang belum di-commit.
+        """
+        for key, stored_at in self._iter_keys():
+            if '.' in key:
+                continue
+            if stored_before is None or stored_at is None or stored_at < stored_before:
+                yield key
+
+    def _write(self, key, data):
+        raise NotImplementedError
+
+    def _read(self, key):
+        raise NotImplementedError
+
+    def _remove(self, key):
+        raise NotImplementedError
+
+    def _iter_keys(self):
+        raise NotImplementedError
+
+
+class FilesystemPhotoStore(PhotoStore):
+    """Menyimpan foto sebagai file di direktori ber-shard dua tingkat."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _write(self, key, data):
+        path = self._path(key)
+        try:
+            os.utime(path) # Foto identik di-put lagi: mtime = waktu put terakhir (lihat iter_hashes)
+            return
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Tulis ke file sementara lalu rename agar tidak ada file setengah jadi
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _iter_keys(self):
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                try:
+                    yield filename, os.path.getmtime(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    pass # Dihapus proses lain selama iterasi
+
+
+class SqliteSegmentPhotoStore(PhotoStore):
+    """Menyimpan foto di file SQLite terpisah (segmen), bukan di attendance.db."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS photos (hash TEXT PRIMARY KEY, data BLOB NOT NULL, stored_at REAL)")
+        if 'stored_at' not in {row[1] for row in conn.execute("PRAGMA table_info(photos)")}:
+            conn.execute("ALTER TABLE photos ADD COLUMN stored_at REAL") # Segmen lama: NULL = foto lama
+        conn.commit()
+
+    def _conn(self):
+        # Satu koneksi per thread (sqlite3 tidak boleh dipakai lintas thread)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _write(self, key, data):
+        conn = self._conn()
+        conn.execute("INSERT INTO photos (hash, data, stored_at) VALUES (?, ?, ?) "
+                     "ON CONFLICT(hash) DO UPDATE SET stored_at = excluded.stored_at", (key, data, time.time()))
+        conn.commit()
+
+    def _read(self, key):
+        row = self._conn().execute("SELECT data FROM photos WHERE hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _remove(self, key):
+        conn = self._conn()
+        conn.execute("DELETE FROM photos WHERE hash = ?", (key,))
+        conn.commit()
+
+    def _iter_keys(self):
+        yield from self._conn().execute("SELECT hash, stored_at FROM photos")
+
+
+class ColdPhotoArchive:
+    """Arsip dingin: satu file zip (deflate) per bulan, entri bernama hash foto.
+
+    File zip hanya ditulis ulang utuh lewat file sementara + rename (write_period), sehingga
+    proses yang terhenti tidak pernah meninggalkan zip rusak.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._readers = {} # periode -> (mtime, ZipFile)
+
+    def path(self, period):
+        return os.path.join(self.root, f"cold_{period}.zip")
+
+    def get(self, period, photo_hash):
+        """Mengambil foto dari zip periode, atau None jika tidak ada."""
+        path = self.path(period)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._readers.get(period)
+            if cached is None or cached[0] != mtime: # Zip ditulis ulang sejak dibuka
+                if cached is not None:
+                    cached[1].close()
+                cached = (mtime, zipfile.ZipFile(path))
+                self._readers[period] = cached
+            try:
+                return cached[1].read(photo_hash)
+            except KeyError:
+                return None
+
+    def names(self, period):
+        """Hash foto yang sudah ada di zip periode."""
+        path = self.path(period)
+        if not os.path.exists(path):
+            return set()
+        with zipfile.ZipFile(path) as zf:
+            return set(zf.namelist())
+
+    def write_period(self, period, items):
+        """Menulis ulang zip periode dengan isi lama + items [(hash, bytes)]. Mengembalikan ukuran file baru."""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(period)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix='.zip')
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as target:
+                names = set()
+                if os.path.exists(path):
+                    with zipfile.ZipFile(path) as source:
+                        for info in source.infolist():
+                            target.writestr(info, source.read(info))
+                            names.add(info.filename)
+                for photo_hash, data in items:
+                    if photo_hash not in names:
+                        target.writestr(photo_hash, data)
+                        names.add(photo_hash)
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+
+def cold_period(taken_at):
+    """Periode zip arsip dingin untuk waktu absen (YYYY-MM)."""
+    return taken_at.strftime('%Y-%m')
+
+
+_store = None
+_cold_archive = None
+
+def reset_photo_store():
+    """Membuang instance store (dipakai worker proses agar tidak berbagi koneksi/handle dari parent)."""
+    global _store, _cold_archive
+    _store = None
+    _cold_archive = None
+
+def get_photo_store():
+    """Mengembalikan instance photo store sesuai konfigurasi PHOTO_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        if PHOTO_STORE_BACKEND == 'sqlite':
+            _store = SqliteSegmentPhotoStore(PHOTO_SEGMENT_PATH)
+        elif PHOTO_STORE_BACKEND == 'filesystem':
+            _store = FilesystemPhotoStore(PHOTO_STORE_DIR)
+        else:
+            raise ValueError(f"PHOTO_STORE_BACKEND tidak dikenal: {PHOTO_STORE_BACKEND}")
+    return _store
+
+
+def get_cold_archive():
+    """Instance arsip dingin di PHOTO_COLD_DIR."""
+    global _cold_archive
+    if _cold_archive is None:
+        _cold_archive = ColdPhotoArchive(PHOTO_COLD_DIR)
+    return _cold_archive
+
+
+def read_photo(photo_hash, photo_tier=None, taken_at=None):
+    """Mengambil isi foto dari tier tempatnya berada (photo store atau arsip dingin)."""
+    if photo_tier == PHOTO_TIER_COLD:
+        return get_cold_archive().get(cold_period(taken_at), photo_hash)
+    return get_photo_store().get(photo_hash)
+
+
+def save_photo(data):
+    """Menyimpan foto ke store dan mengembalikan kolom referensi untuk baris Attendance."""
+    photo_hash = get_photo_store().put(data)
+    return {'photo_hash': photo_hash, 'photo_size': len(data), 'photo_mime': detect_mime(data), 'has_photo': True}
@@ -0,0 +1,105 @@
+# reports.py
+# Laporan rekap untuk HR yang dibangun dari tabel daily_summary dengan pandas
+# (satu query rentang tanggal, lalu pivot/vektorisasi; tanpa query per pegawai).
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database import DailySummary
+from exports import write_xlsx_tempfile
+
+MATRIX_MAX_MONTHS = 12
+NO_POSITION_LABEL = '(Tanpa Jabatan)'
+# Kode status sel matriks (mode 'status')
+STATUS_CODES = {
+    'H': 'Hadir (absen masuk & keluar)',
+    'M': 'Hanya absen masuk',
+    'K': 'Hanya absen keluar',
+}
+TOTAL_COLUMN = 'Jumlah Hadir'
+
+
+def month_range(month_str, months=1):
+    """Mengubah 'YYYY-MM' + jumlah bulan menjadi (tanggal_awal, tanggal_akhir) inklusif."""
+    start_date = datetime.strptime(month_str, '%Y-%m').date()
+    year, month = divmod(start_date.month - 1 + months, 12)
+    end_date = date(start_date.year + year, month + 1, 1) - timedelta(days=1)
+    return start_date, end_date
+
+
+def load_daily_summaries(db, start_date, end_date):
+    """Satu query ringkasan harian untuk rentang tanggal, sebagai DataFrame.
+
+    Nama & jabatan tidak di-join di sini; diambil dari roster cache saat membangun laporan.
+    """
+    rows = db.query(
+            DailySummary.employee_id, DailySummary.work_date, DailySummary.first_check_in,
+            DailySummary.last_check_out, DailySummary.duration_minutes
+        ).filter(DailySummary.work_date >= start_date, DailySummary.work_date <= end_date)\
+        .all()
+    df = pd.DataFrame(rows, columns=['employee_id', 'work_date', 'first_check_in',
+                                     'last_check_out', 'duration_minutes'])
+    df['first_check_in'] = pd.to_datetime(df['first_check_in'])
+    df['last_check_out'] = pd.to_datetime(df['last_check_out'])
+    return df
+
+
+# Tabel 'HH:MM' untuk setiap menit dalam sehari (+ '?' untuk waktu kosong); jauh lebih cepat dari strftime per baris
+_HHMM = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)] + ['?'], dtype=object)
+
+def format_hhmm(times):
+    """Memformat Series datetime menjadi array 'HH:MM' ('?' untuk NaT) secara vektor."""
+    minutes = (times.dt.hour * 60 + times.dt.minute).fillna(24 * 60).astype(int)
+    return _HHMM[minutes.to_numpy()]
+
+
+def matrix_cells(summaries, mode='times'):
+    """Isi sel matriks per baris ringkasan: '07:30-16:45' (mode 'times') atau kode H/M/K (mode 'status')."""
+    has_in = summaries['first_check_in'].notna()
+    has_out = summaries['last_check_out'].notna()
+    if mode == 'status':
+        return pd.Series(np.select([has_in & has_out, has_in], ['H', 'M'], default='K'), index=summaries.index)
+    return pd.Series(format_hhmm(summaries['first_check_in']) + '-' + format_hhmm(summaries['last_check_out']),
+                     index=summaries.index)
+
+
+def build_monthly_matrix(summaries, employees, start_date, end_date, mode='times'):
+    """Matriks pegawai x tanggal, diindeks (Jabatan, Nama) dan diurutkan per jabatan.
+
+    employees: iterable (id, name, position, is_active) dari roster cache; pegawai aktif
+    selalu tampil (baris kosong = tidak pernah absen), pegawai nonaktif hanya jika punya data.
+    """
+    dates = pd.date_range(start_date, end_date, freq='D').date
+    cells = summaries.assign(cell=matrix_cells(summaries, mode))\
+        .pivot(index='employee_id', columns='work_date', values='cell')\
+        .reindex(columns=dates)
+    roster = pd.DataFrame(list(employees), columns=['employee_id', 'name', 'position', 'is_active'])
+    roster = roster[roster['is_active'] | roster['employee_id'].isin(cells.index)]
+    roster['position'] = roster['position'].fillna(NO_POSITION_LABEL)
+    roster = roster.sort_values(['position', 'name'])
+
+    matrix = cells.reindex(roster['employee_id'])
+    matrix = pd.concat([matrix, matrix.notna().sum(axis=1).rename(TOTAL_COLUMN)], axis=1)
+    matrix.index = pd.MultiIndex.from_arrays([roster['position'], roster['name']], names=['Jabatan', 'Nama'])
+    return matrix.fillna('')
+
+
+def matrix_groups(matrix):
+    """Mengelompokkan baris matriks per jabatan untuk template: [(jabatan, [(nama, [sel...], total)])]."""
+    dates = [col for col in matrix.columns if col != TOTAL_COLUMN]
+    groups = []
+    for position, group in matrix.groupby(level='Jabatan', sort=False):
+        rows = [(name, list(values[dates]), values[TOTAL_COLUMN])
+                for (_, name), values in group.iterrows()]
+        groups.append((position, rows))
+    return groups
+
+
+def matrix_to_xlsx(matrix, sheet_name='Matriks Absensi', legend=None):
+    """Menulis matriks ke XLSX write-only (file sementara); kolom tanggal diberi label DD/MM."""
+    labels = [col.strftime('%d/%m') if col != TOTAL_COLUMN else col for col in matrix.columns]
+    rows = [list(key) + values for key, values in zip(matrix.index, matrix.values.tolist())]
+    extra_sheets = {'Keterangan': (['Kode', 'Keterangan'], list(legend.items()))} if legend else None
+    return write_xlsx_tempfile(rows, sheet_name, headers=list(matrix.index.names) + labels,
+                               extra_sheets=extra_sheets)
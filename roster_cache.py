@@ -0,0 +1,80 @@
+# roster_cache.py
+# Cache in-process daftar pegawai (roster) untuk halaman utama & form admin.
+# Roster hanya berubah saat import pegawai, jadi cukup dimuat ulang jika
+# versi roster di tabel app_meta berubah (dicek paling sering tiap beberapa detik).
+import os
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from database import SessionLocal, Employee, get_meta, set_meta
+
+ROSTER_VERSION_KEY = 'roster_version'
+# Interval pengecekan versi roster di DB (detik); perubahan dari proses lain
+# (misal import_employees.py) terlihat paling lambat setelah interval ini
+ROSTER_CHECK_INTERVAL = float(os.environ.get('ROSTER_CHECK_INTERVAL', 5))
+
+RosterEmployee = namedtuple('RosterEmployee', ['id', 'name', 'position', 'is_active'])
+RosterSnapshot = namedtuple('RosterSnapshot', ['version', 'etag', 'employees', 'active', 'by_id'])
+
+
+def bump_roster_version(db):
+    """Menaikkan versi roster dalam transaksi yang sama dengan perubahan pegawai."""
+    current = int(get_meta(db, ROSTER_VERSION_KEY, 0))
+    set_meta(db, ROSTER_VERSION_KEY, current + 1)
+
+
+class RosterCache:
+    """Cache roster pegawai yang divalidasi dengan versi di app_meta."""
+
+    def __init__(self, session_factory=SessionLocal, check_interval=ROSTER_CHECK_INTERVAL):
+        self._session_factory = session_factory
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Mengembalikan RosterSnapshot terbaru (memuat ulang hanya jika versi berubah)."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self._check_interval:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self._check_interval:
+                return self._snapshot # Sudah diperbarui thread lain
+            db = self._session_factory()
+            try:
+                version = get_meta(db, ROSTER_VERSION_KEY, '0')
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = self._load(db, version)
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Memaksa pengecekan versi pada akses berikutnya (dipanggil setelah perubahan pegawai)."""
+        self._checked_at = 0.0
+
+    def get_employee(self, employee_id):
+        """Mencari pegawai berdasarkan ID dari cache (None jika tidak ada)."""
+        return self.get().by_id.get(employee_id)
+
+    @staticmethod
+    def _load(db, version):
+        rows = db.query(Employee.id, Employee.name, Employee.position, Employee.is_active)\
+            .order_by(Employee.name).all()
+        employees = [RosterEmployee(*row) for row in rows]
+        # Digest isi ikut di ETag agar tetap benar walau versi belum pernah dinaikkan
+        digest = hashlib.sha1(repr(employees).encode('utf-8')).hexdigest()[:12]
+        return RosterSnapshot(
+            version=version,
+            etag=f"roster-{version}-{digest}",
+            employees=employees,
+            active=[emp for emp in employees if emp.is_active],
+            by_id={emp.id: emp for emp in employees},
+        )
+
+
+roster_cache = RosterCache()
@@ -0,0 +1,122 @@
+# roster_import.py
+# Import roster pegawai dari halaman admin (/manage/employees/import) sebagai job latar belakang.
+# File upload diproses di thread terpisah memakai fungsi import_employees.py, diterapkan per
+# potongan kecil dengan commit terpisah (jeda singkat di antaranya) agar absensi tidak tertahan
+# kunci tulis database. Status job disimpan di app_meta sehingga bisa dipantau dari worker mana pun.
+import os
+import json
+import uuid
+import threading
+import time
+from datetime import datetime
+
+from database import SessionLocal, AuditLog, AppMeta, get_meta, set_meta
+from import_employees import (IMPORT_HASH_KEY, file_hash, read_roster_file, validate_roster, diff_roster,
+                              apply_roster_diff, roster_diff_chunks, diff_counts)
+from roster_cache import bump_roster_version, roster_cache
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+ROSTER_IMPORT_CHUNK = int(os.environ.get('ROSTER_IMPORT_CHUNK', 500))       # Baris pegawai per commit
+ROSTER_IMPORT_PAUSE = float(os.environ.get('ROSTER_IMPORT_PAUSE', 0.05))    # Jeda antar commit (detik)
+ROSTER_IMPORT_STALE = int(os.environ.get('ROSTER_IMPORT_STALE', 600))       # Job 'running' tanpa progres dianggap mati
+ROSTER_IMPORT_EXTENSIONS = ('.xlsx', '.csv') # .xls butuh xlrd (tidak ada di requirements): simpan ulang sebagai .xlsx
+JOB_KEY = 'roster_import_job' # Hanya job terakhir yang disimpan
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class ImportJobBusy(Exception):
+    """Masih ada import roster lain yang berjalan."""
+
+
+def load_job(db):
+    """Job import terakhir (dict) beserta waktu update-nya, atau (None, None)."""
+    row = db.get(AppMeta, JOB_KEY)
+    if row is None or not row.value:
+        return None, None
+    return json.loads(row.value), row.updated_at
+
+def get_job(job_id):
+    """Status job untuk endpoint polling; None jika job_id bukan job terakhir."""
+    db = SessionLocal()
+    try:
+        job, _ = load_job(db)
+    finally:
+        db.close()
+    return job if job and job['id'] == job_id else None
+
+def _save_job(db, job):
+    set_meta(db, JOB_KEY, json.dumps(job))
+
+def _is_stale(updated_at):
+    return updated_at is not None and (datetime.now() - updated_at).total_seconds() > ROSTER_IMPORT_STALE
+
+
+def start_import_job(upload_path, filename, user, force=False):
+    """Mendaftarkan job lalu menjalankannya di thread latar. Mengembalikan dict job."""
+    db = SessionLocal()
+    try:
+        current, updated_at = load_job(db)
+        if current and current['status'] in ACTIVE_STATUSES and not _is_stale(updated_at):
+            raise ImportJobBusy(f"Import '{current['filename']}' oleh {current['user']} masih berjalan.")
+        job = {'id': uuid.uuid4().hex[:12], 'status': 'queued', 'filename': filename, 'user': user,
+               'total': 0, 'processed': 0, 'counts': {}, 'message': '',
+               'started_at': datetime.now().isoformat(timespec='seconds'), 'finished_at': None}
+        _save_job(db, job)
+        db.commit()
+    finally:
+        db.close()
+    threading.Thread(target=run_import_job, args=(job, upload_path, force),
+                     name=f"roster-import-{job['id']}", daemon=True).start()
+    return job
+
+
+def _finish(db, job, status, message):
+    job.update(status=status, message=message, finished_at=datetime.now().isoformat(timespec='seconds'))
+    _save_job(db, job)
+    db.commit()
+    print(f"Import roster {job['id']}: {status} - {message}")
+
+
+def run_import_job(job, path, force=False):
+    """Isi thread job: baca & validasi file, hitung selisih, lalu terapkan per potongan."""
+    db = SessionLocal()
+    try:
+        roster_hash = file_hash(path)
+        if not force and get_meta(db, IMPORT_HASH_KEY) == roster_hash:
+            _finish(db, job, 'skipped', "File sama dengan import terakhir, tidak ada yang diproses.")
+            return
+        roster, invalid = validate_roster(read_roster_file(path))
+        diff = diff_roster(db, roster, invalid)
+        counts = diff_counts(diff)
+        job.update(status='running', counts=counts,
+                   total=counts['added'] + counts['updated'] + counts['deactivated'])
+        _save_job(db, job)
+        db.commit()
+
+        for part in roster_diff_chunks(diff, ROSTER_IMPORT_CHUNK):
+            apply_roster_diff(db, part)
+            job['processed'] += len(part.added) + len(part.updated) + len(part.deactivated)
+            _save_job(db, job) # Progres ikut transaksi potongan ini
+            db.commit()
+            time.sleep(ROSTER_IMPORT_PAUSE) # Beri kesempatan penulis lain (absensi) mengambil kunci
+
+        bump_roster_version(db) # Server memuat ulang roster cache-nya
+        set_meta(db, IMPORT_HASH_KEY, roster_hash)
+        details = (f"Import roster '{job['filename']}': {counts['added']} ditambahkan, {counts['updated']} diupdate "
+                   f"({counts['reactivated']} diaktifkan kembali), {counts['deactivated']} dinonaktifkan, "
+                   f"{counts['invalid']} baris dilewati")
+        db.add(AuditLog(user=job['user'], action="IMPORT", record_type="Employee", record_id=None, details=details))
+        _finish(db, job, 'done', details)
+        roster_cache.invalidate()
+    except Exception as e:
+        db.rollback()
+        print(f"Error import roster {job['id']}: {e}")
+        # Potongan yang sudah di-commit tetap tersimpan; import ulang file yang sama melanjutkan sisanya
+        try:
+            _finish(db, job, 'failed', f"Import gagal: {e}")
+        except Exception as save_error:
+            print(f"Error menyimpan status import roster {job['id']}: {save_error}")
+    finally:
+        db.close()
+        if os.path.exists(path):
+            os.remove(path)
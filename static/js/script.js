@@ -44,6 +44,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let map = null; // Instance Leaflet Map untuk halaman utama
     let marker = null; // Instance Leaflet Marker untuk halaman utama
     const defaultZoomLevel = 16;
+    // Profil foto default; diganti dengan nilai dari server (/api/capture_profile)
+    let captureProfile = { max_width: 640, max_height: 640, jpeg_quality: 0.7, min_jpeg_quality: 0.4, target_bytes: 80 * 1024 };
 
     // --- Fungsi Helper ---
     function showStatus(message, isError = false) {
@@ -59,6 +61,18 @@ document.addEventListener('DOMContentLoaded', () => {
         if(checkoutBtn) checkoutBtn.disabled = !enable || !employeeSelected;
     }
 
+    /** Memuat profil pengambilan foto dari server (gagal = pakai default) */
+    async function loadCaptureProfile() {
+        try {
+            const response = await fetch('/api/capture_profile');
+            if (response.ok) captureProfile = { ...captureProfile, ...(await response.json()) };
+        } catch (e) { console.warn("Gagal memuat capture profile, memakai default.", e); }
+    }
+
+    function canvasToBlob(quality) {
+        return new Promise((resolve) => canvas.toBlob(resolve, 'image/jpeg', quality));
+    }
+
     // --- Logika Inti ---
 
     /** 1. Mengakses dan Memulai Stream Kamera */
@@ -127,48 +141,60 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    /** 3. Mengambil Snapshot Foto dari Stream Video */
-    function capturePhoto() {
-        // ... (Kode fungsi capturePhoto tetap sama) ...
+    /** 3. Mengambil Snapshot Foto dari Stream Video (hasil: Blob JPEG biner sesuai capture profile) */
+    async function capturePhoto() {
         if (!video.srcObject || video.paused || video.videoWidth === 0 || !context) {
              showStatus('Kamera/Canvas belum siap untuk mengambil foto.', true);
              return null;
         }
         showStatus('Mengambil foto...');
-        if (canvas.width !== video.videoWidth || canvas.height !== video.videoHeight) {
-             canvas.width = video.videoWidth;
-             canvas.height = video.videoHeight;
-        }
+        // Perkecil frame agar muat di dimensi maksimum profil (rasio aspek dipertahankan)
+        const scale = Math.min(1, captureProfile.max_width / video.videoWidth, captureProfile.max_height / video.videoHeight);
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
         context.drawImage(video, 0, 0, canvas.width, canvas.height);
         try {
-            return canvas.toDataURL('image/jpeg', 0.8);
+            // Turunkan kualitas JPEG bertahap sampai ukuran <= target_bytes
+            let quality = captureProfile.jpeg_quality;
+            let blob = await canvasToBlob(quality);
+            while (blob && blob.size > captureProfile.target_bytes && quality > captureProfile.min_jpeg_quality) {
+                quality = Math.max(captureProfile.min_jpeg_quality, quality - 0.1);
+                blob = await canvasToBlob(quality);
+            }
+            if (!blob) showStatus("Gagal mengkonversi gambar.", true);
+            return blob;
         } catch (e) {
-            console.error("Error converting canvas to Data URL:", e);
+            console.error("Error converting canvas to Blob:", e);
             showStatus("Gagal mengkonversi gambar.", true);
             return null;
         }
     }
 
-    /** 4. Mengirim Data Absensi ke Backend */
-    async function sendAttendanceData(employeeId, type, location, photoBase64) {
-        // ... (Kode fungsi sendAttendanceData tetap sama) ...
+    /** 4. Mengirim Data Absensi ke Backend (multipart, foto biner tanpa base64) */
+    async function sendAttendanceData(employeeId, type, location, photoBlob) {
         showStatus('Merekam data absensi...');
         setButtonsEnabled(false);
         try {
-            const response = await fetch('/record_attendance', {
-                 method: 'POST',
-                 headers: { 'Content-Type': 'application/json' },
-                 body: JSON.stringify({
-                     employee_id: employeeId, type: type,
-                     latitude: location.latitude, longitude: location.longitude,
-                     photo_base64: photoBase64.split(',')[1]
-                 }),
-            });
+            const formData = new FormData();
+            formData.append('employee_id', employeeId);
+            formData.append('type', type);
+            if (location.latitude != null) formData.append('latitude', location.latitude);
+            if (location.longitude != null) formData.append('longitude', location.longitude);
+            formData.append('photo', photoBlob, 'absen.jpg');
+
+            // Content-Type multipart (beserta boundary) diatur otomatis oleh browser
+            const response = await fetch('/record_attendance', { method: 'POST', body: formData });
             const result = await response.json();
 
             if (!response.ok) {
                  throw new Error(result.message || `Server error: ${response.status}`);
             }
+            if (response.status === 202) {
+                // Status belum pasti (server sibuk): jangan langsung ulang, tampilkan absensi terakhir setelah jeda
+                showStatus(result.message, true);
+                setTimeout(() => loadLastAttendance(employeeId), 3000);
+                return;
+            }
 
             showStatus(`Absensi ${type === 'check_in' ? 'masuk' : 'keluar'} berhasil direkam!`);
             if (typeof window.displayLastAttendance === 'function') {
@@ -194,7 +220,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         // Tampilkan/Sembunyikan berdasarkan data
-        const hasValidData = data && data.photo_base64;
+        const hasValidData = data && (data.photo_url || data.photo_base64);
         lastAttendanceDiv.style.display = hasValidData ? 'block' : 'none';
         mapContainerDiv.style.display = 'none'; // Sembunyikan peta dulu
         if (map) { try { map.remove(); } catch(e){} map = null; marker = null; } // Hapus map lama
@@ -202,7 +228,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!hasValidData) return; // Stop jika tidak ada data
 
         // Isi detail dasar
-        lastPhotoImg.src = `data:image/jpeg;base64,${data.photo_base64}`;
+        lastPhotoImg.src = data.thumb_url || data.photo_url || `data:image/jpeg;base64,${data.photo_base64}`;
         lastEmployeeNameSpan.textContent = data.employee_name || 'N/A';
         // === ISI DATA POSISI ===
         lastEmployeePositionSpan.textContent = data.employee_position || '-';
@@ -247,6 +273,23 @@ document.addEventListener('DOMContentLoaded', () => {
         // Jika tidak ada coords, mapContainerDiv tetap 'none'
     } // <-- Akhir dari window.displayLastAttendance
 
+    /** 5b. Memuat Absensi Terakhir Pegawai secara Asinkron (tanpa reload halaman) */
+    async function loadLastAttendance(employeeId) {
+        if (lastAttendanceDiv) lastAttendanceDiv.style.display = 'none';
+        if (mapContainerDiv) mapContainerDiv.style.display = 'none';
+        if (!employeeId) return;
+        try {
+            const response = await fetch(`/api/employees/${encodeURIComponent(employeeId)}/last_attendance`);
+            if (response.status === 404) return; // Belum pernah absen
+            if (!response.ok) throw new Error(`Server error: ${response.status}`);
+            const data = await response.json();
+            // Abaikan jika pilihan sudah berganti selama request berjalan
+            if (employeeSelect && employeeSelect.value === String(employeeId)) window.displayLastAttendance(data);
+        } catch (error) {
+            console.error("Error loading last attendance:", error);
+        }
+    }
+
     /** 6. Fungsi Utama Pengendali Proses Absensi (DIMODIFIKASI DENGAN KONFIRMASI) */
     async function handleAttendance(type) {
         const selectedEmployeeId = employeeSelect ? employeeSelect.value : null;
@@ -298,15 +341,15 @@ document.addEventListener('DOMContentLoaded', () => {
             //}
 
             // 3. Ambil Foto
-            const photoBase64 = capturePhoto();
-            if (!photoBase64) {
+            const photoBlob = await capturePhoto();
+            if (!photoBlob) {
                 setButtonsEnabled(true);
                 return;
             }
 
             // 4. Kirim Data ke Backend (async)
             // Status akan diupdate lagi di dalam sendAttendanceData
-            await sendAttendanceData(selectedEmployeeId, type, location, photoBase64);
+            await sendAttendanceData(selectedEmployeeId, type, location, photoBlob);
 
         } catch (error) {
             console.error("Unexpected error during attendance process:", error);
@@ -326,21 +369,17 @@ document.addEventListener('DOMContentLoaded', () => {
             const selectedId = employeeSelect.value;
             setButtonsEnabled(stream != null && selectedId !== ""); // Enable jika nama dipilih DAN kamera siap
 
-            // Reload halaman untuk memuat data absensi terakhir
-            if (selectedId) {
-                window.location.href = `/?employee_id=${selectedId}`;
-            } else {
-                 // Jika kembali ke "-- Pilih Nama --"
-                 if(lastAttendanceDiv) lastAttendanceDiv.style.display = 'none';
-                 if(mapContainerDiv) mapContainerDiv.style.display = 'none';
-                 if(map) { try{ map.remove() } catch(e){} map = null; marker = null; }
-                 window.location.href = '/'; // Kembali ke URL root
-            }
+            // Simpan pilihan di URL (tanpa reload) lalu muat absensi terakhir lewat API
+            window.history.replaceState(null, '', selectedId ? `/?employee_id=${encodeURIComponent(selectedId)}` : '/');
+            if (!selectedId && map) { try{ map.remove() } catch(e){} map = null; marker = null; }
+            loadLastAttendance(selectedId);
         });
     }
 
     // --- Inisialisasi Awal ---
+    loadCaptureProfile(); // Ambil profil foto dari server (tidak perlu ditunggu)
     startCamera(); // Mulai kamera saat halaman dimuat
+    if (employeeSelect?.value) loadLastAttendance(employeeSelect.value); // Pegawai terpilih dari URL
     // Cek jika ada pegawai yang sudah terpilih saat load (dari reload)
     setButtonsEnabled(stream != null && employeeSelect?.value !== "");
 
@@ -0,0 +1,65 @@
+# tests/conftest.py
+# Konfigurasi bersama pytest: database, photo store & arsip diarahkan ke direktori sementara
+# SEBELUM modul aplikasi diimpor (database.py membaca DATABASE_URL saat impor).
+#
+#   python -m pytest -q tests
+import io
+import os
+import sys
+import glob
+import shutil
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix='absensi-test-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    'PHOTO_STORE_DIR': os.path.join(TEST_DIR, 'photo_store'),
+    'PHOTO_SEGMENT_PATH': os.path.join(TEST_DIR, 'photos.db'),
+    'PHOTO_COLD_DIR': os.path.join(TEST_DIR, 'photo_cold'),
+    'ARCHIVE_DIR': os.path.join(TEST_DIR, 'archive'),
+})
+sys.path.insert(0, BASE_DIR)
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def migrated():
+    """Skema terbaru di database sementara (sekali per sesi test)."""
+    import migrations
+    migrations.upgrade()
+    yield
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db(migrated):
+    """Session database; semua data (termasuk file arsip) dibersihkan setelah test."""
+    from database import SessionLocal, Base, engine
+    from migrations import SCHEMA_VERSION_KEY
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+    engine.dispose() # Lepas koneksi pool yang masih meng-ATTACH file arsip
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name == 'app_meta':
+                conn.exec_driver_sql("DELETE FROM app_meta WHERE key != ?", (SCHEMA_VERSION_KEY,))
+            else:
+                conn.exec_driver_sql(f"DELETE FROM {table.name}")
+    for path in glob.glob(os.path.join(os.environ['ARCHIVE_DIR'], '*.db')):
+        os.remove(path)
+
+
+@pytest.fixture
+def jpeg_bytes():
+    """Membuat foto JPEG kecil berwarna tertentu (butuh Pillow)."""
+    Image = pytest.importorskip('PIL.Image')
+
+    def make(color='red', size=(320, 240)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return buffer.getvalue()
+    return make
@@ -0,0 +1,97 @@
+# tests/test_attendance_writer.py
+# Group commit (attendance_writer.py): isolasi baris gagal dalam satu batch, status timeout,
+# dan pemetaan hasilnya ke respons HTTP record_attendance (409 / 202 / 503).
+import io
+import threading
+from datetime import datetime
+
+import pytest
+
+from database import Employee, Attendance
+from attendance_writer import GroupCommitWriter, GroupCommitTimeout, DuplicateAttendanceError
+
+
+def attendance_values(employee_id, timestamp, attendance_type='check_in'):
+    return dict(employee_id=employee_id, timestamp=timestamp, type=attendance_type)
+
+
+@pytest.fixture
+def employees(db):
+    db.add_all([Employee(id=1, name='Budi', position='Pengemudi'), Employee(id=2, name='Sari', position='Dokter')])
+    db.commit()
+
+
+def test_duplicate_and_invalid_rows_fail_alone(db, employees):
+    db.add(Attendance(employee_id=1, timestamp=datetime(2024, 3, 4, 7, 0), type='check_in'))
+    db.commit()
+    writer = GroupCommitWriter(window_ms=300) # Jendela lebar: keempat absensi masuk satu batch
+    futures = [
+        writer.submit(attendance_values(2, datetime(2024, 3, 4, 7, 5))),
+        writer.submit(attendance_values(1, datetime(2024, 3, 4, 7, 10))),      # Duplikat harian
+        writer.submit(attendance_values(None, datetime(2024, 3, 4, 7, 15))),   # employee_id NOT NULL
+        writer.submit(attendance_values(2, datetime(2024, 3, 4, 16, 0), 'check_out')),
+    ]
+    first_id = futures[0].result(timeout=10)
+    assert isinstance(futures[1].exception(timeout=10), DuplicateAttendanceError)
+    assert futures[2].exception(timeout=10) is not None
+    last_id = futures[3].result(timeout=10)
+
+    db.expire_all()
+    rows = db.query(Attendance.id, Attendance.employee_id, Attendance.type).order_by(Attendance.id).all()
+    assert [(row.employee_id, row.type) for row in rows] == [(1, 'check_in'), (2, 'check_in'), (2, 'check_out')]
+    assert {first_id, last_id} == {row.id for row in rows if row.employee_id == 2}
+
+
+def test_timeout_reports_pending_only_when_writer_took_the_row(db, employees):
+    writer = GroupCommitWriter(window_ms=0)
+    release, original_commit = threading.Event(), writer._commit
+
+    def slow_commit(batch):
+        release.wait(10)
+        return original_commit(batch)
+    writer._commit = slow_commit
+
+    # Absensi pertama sudah diambil penulis (tertahan di commit): statusnya belum pasti
+    with pytest.raises(GroupCommitTimeout) as taken:
+        writer.write(attendance_values(1, datetime(2024, 3, 4, 7, 0)), timeout=0.2)
+    assert taken.value.pending is True
+    # Absensi kedua masih di antrean saat timeout: dibatalkan, pasti tidak tersimpan
+    with pytest.raises(GroupCommitTimeout) as queued:
+        writer.write(attendance_values(2, datetime(2024, 3, 4, 7, 0)), timeout=0.2)
+    assert queued.value.pending is False
+
+    release.set()
+    marker = writer.submit(attendance_values(2, datetime(2024, 3, 4, 16, 0), 'check_out'))
+    marker.result(timeout=10) # Batch sesudahnya selesai = absensi yang dibatalkan sudah dilewati
+    db.expire_all()
+    rows = db.query(Attendance.employee_id, Attendance.type).order_by(Attendance.id).all()
+    assert [tuple(row) for row in rows] == [(1, 'check_in'), (2, 'check_out')]
+
+
+class FailingWriter:
+    """Pengganti GroupCommitWriter yang selalu gagal dengan exception tertentu."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def write(self, values):
+        raise self.error
+
+
+@pytest.mark.parametrize('error, status', [
+    (DuplicateAttendanceError(), 409),
+    (GroupCommitTimeout(pending=True), 202),
+    (GroupCommitTimeout(pending=False), 503),
+])
+def test_record_attendance_maps_group_commit_errors(db, employees, jpeg_bytes, monkeypatch, error, status):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'get_attendance_writer', lambda: FailingWriter(error))
+    response = app_module.app.test_client().post('/record_attendance', data={
+        'employee_id': '1', 'type': 'check_in', 'photo': (io.BytesIO(jpeg_bytes()), 'foto.jpg'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == status
+    if status == 202:
+        assert response.get_json()['status'] == 'pending'
+    if status == 503:
+        assert response.headers['Retry-After'] == '5'
+    assert db.query(Attendance).count() == 0
@@ -0,0 +1,114 @@
+# tests/test_dedupe_attendance.py
+# Regresi: 'python dedupe_attendance.py --apply' pada DB lama (skema awal, sebelum migrasi apa pun)
+# yang berisi duplikat harus bisa membersihkan duplikat lalu upgrade sampai versi terbaru.
+# Dijalankan di subprocess karena konfigurasi database dibaca dari DATABASE_URL saat impor.
+#
+#   python -m unittest discover tests
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Skema awal aplikasi (sebelum migrasi berversi). photo_blob sudah boleh NULL, jadi migrasi 2 tidak
+# membangun ulang tabel: kolom dari migrasi sesudah versi 7 benar-benar belum ada saat dedupe berjalan
+LEGACY_SCHEMA = """
+CREATE TABLE employees (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR NOT NULL UNIQUE,
+    position VARCHAR
+);
+CREATE TABLE attendance (
+    id INTEGER NOT NULL PRIMARY KEY,
+    employee_id INTEGER NOT NULL REFERENCES employees (id),
+    timestamp DATETIME NOT NULL,
+    type VARCHAR NOT NULL,
+    latitude FLOAT,
+    longitude FLOAT,
+    photo_blob BLOB
+);
+CREATE TABLE audit_log (
+    id INTEGER NOT NULL PRIMARY KEY,
+    timestamp DATETIME NOT NULL,
+    user VARCHAR,
+    action VARCHAR NOT NULL,
+    record_type VARCHAR NOT NULL,
+    record_id INTEGER,
+    details TEXT
+);
+"""
+
+
+class DedupeLegacyDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.workdir.name, 'legacy.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany("INSERT INTO employees (id, name, position) VALUES (?, ?, ?)",
+                         [(1, 'Budi', 'Satpam'), (2, 'Sari', 'Pramubakti')])
+        conn.executemany(
+            "INSERT INTO attendance (id, employee_id, timestamp, type, photo_blob) VALUES (?, ?, ?, ?, ?)",
+            [(1, 1, '2024-03-04 07:10:00.000000', 'check_in', None),
+             (2, 1, '2024-03-04 07:12:00.000000', 'check_in', None),  # duplikat ID 1
+             (3, 1, '2024-03-04 16:30:00.000000', 'check_out', None),
+             (4, 2, '2024-03-04 07:05:00.000000', 'check_in', None),
+             (5, 2, '2024-03-04 07:20:00.000000', 'check_in', None),  # duplikat ID 4
+             (6, 2, '2024-03-04 07:25:00.000000', 'check_in', None)]) # duplikat ID 4
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def env(self):
+        """Environment yang mengarahkan DB & penyimpanan foto ke direktori sementara."""
+        return {**os.environ,
+                'DATABASE_URL': f"sqlite:///{self.db_path}",
+                'PHOTO_STORE_DIR': os.path.join(self.workdir.name, 'photo_store'),
+                'PHOTO_SEGMENT_PATH': os.path.join(self.workdir.name, 'photos.db'),
+                'PHOTO_COLD_DIR': os.path.join(self.workdir.name, 'photo_cold'),
+                'ARCHIVE_DIR': os.path.join(self.workdir.name, 'archive')}
+
+    def run_dedupe(self, *args):
+        return subprocess.run([sys.executable, os.path.join(BASE_DIR, 'dedupe_attendance.py'), *args],
+                              cwd=BASE_DIR, env=self.env(), capture_output=True, text=True)
+
+    def test_apply_removes_duplicates_and_upgrades(self):
+        result = self.run_dedupe('--apply')
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            remaining = [row[0] for row in conn.execute("SELECT id FROM attendance ORDER BY id")]
+            self.assertEqual(remaining, [1, 3, 4]) # Absensi paling awal per grup dipertahankan
+            deleted_logs = [row[0] for row in conn.execute(
+                "SELECT record_id FROM audit_log WHERE action = 'DELETE' ORDER BY record_id")]
+            self.assertEqual(deleted_logs, [2, 5, 6])
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            self.assertIn('uq_attendance_employee_type_work_date', indexes)
+            version = conn.execute("SELECT value FROM app_meta WHERE key = 'schema_version'").fetchone()[0]
+        finally:
+            conn.close()
+
+        latest = subprocess.run([sys.executable, '-c', 'from migrations import LATEST_VERSION; print(LATEST_VERSION)'],
+                                cwd=BASE_DIR, env=self.env(), capture_output=True, text=True, check=True).stdout
+        self.assertEqual(int(version), int(latest))
+
+    def test_report_only_keeps_rows(self):
+        result = self.run_dedupe()
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertIn('--apply', result.stdout)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0], 6)
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
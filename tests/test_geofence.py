@@ -0,0 +1,81 @@
+# tests/test_geofence.py
+# Indeks geofence (geofence.py): cek satu titik (GeofenceIndex.check) dan cek massal (outside_mask)
+# untuk lokasi lingkaran & poligon, termasuk penugasan per pegawai dan per jabatan.
+from datetime import datetime
+
+import pytest
+
+from database import Employee, Attendance
+from archive import archive_period, partition_sources
+from geofence import GeofenceIndex, GeofenceShape, outside_mask, add_site, revalidate_attendance
+
+OFFICE = GeofenceShape(1, 'Kantor Pusat', 'circle', -6.2, 106.8, 150.0, None)
+WAREHOUSE = GeofenceShape(2, 'Gudang', 'polygon', None, None, None,
+                          [(-6.10, 106.70), (-6.10, 106.72), (-6.12, 106.72), (-6.12, 106.70)])
+
+IN_OFFICE = (-6.2009, 106.8)    # ~100 m dari pusat
+NEAR_OFFICE = (-6.2020, 106.8)  # ~220 m dari pusat (di luar radius 150 m)
+IN_WAREHOUSE = (-6.11, 106.71)
+FAR_AWAY = (-7.0, 110.0)
+
+
+@pytest.fixture
+def index():
+    # Pegawai 1 hanya boleh di kantor, jabatan 'Petugas Gudang' hanya di gudang, lainnya di mana saja
+    return GeofenceIndex('1', [OFFICE, WAREHOUSE], {1: frozenset({1})}, {'Petugas Gudang': frozenset({2})})
+
+
+CASES = [
+    # (employee_id, jabatan, titik, di_luar_area)
+    (1, 'Pengemudi', IN_OFFICE, False),
+    (1, 'Pengemudi', NEAR_OFFICE, True),
+    (1, 'Pengemudi', IN_WAREHOUSE, True),       # Di dalam poligon, tapi bukan lokasi pegawai ini
+    (2, 'Petugas Gudang', IN_WAREHOUSE, False),
+    (2, 'Petugas Gudang', IN_OFFICE, True),
+    (3, 'Dokter', IN_WAREHOUSE, False),         # Tanpa penugasan: semua lokasi aktif
+    (3, 'Dokter', IN_OFFICE, False),
+    (3, 'Dokter', FAR_AWAY, True),
+]
+
+
+@pytest.mark.parametrize('employee_id, position, point, outside', CASES)
+def test_check_single_point(index, employee_id, position, point, outside):
+    result, shape = index.check(employee_id, position, *point)
+    assert result is outside
+    if not outside:
+        assert shape.id in {OFFICE.id, WAREHOUSE.id}
+
+
+def test_check_skips_missing_coordinates_and_empty_index(index):
+    assert index.check(1, 'Pengemudi', None, None) == (None, None)
+    assert GeofenceIndex('0', [], {}, {}).check(1, 'Pengemudi', *IN_OFFICE) == (None, None)
+
+
+def test_outside_mask_matches_single_checks(index):
+    employee_ids, positions, points, expected = zip(*CASES)
+    lats, lons = zip(*points)
+    mask = outside_mask(index, employee_ids, positions, lats, lons)
+    assert mask.tolist() == list(expected)
+
+
+def test_revalidate_updates_live_and_archived_rows(db):
+    db.add(Employee(id=1, name='Budi', position='Pengemudi'))
+    db.add_all([
+        Attendance(employee_id=1, timestamp=datetime(2023, 3, 1, 7, 0), type='check_in',
+                   latitude=IN_OFFICE[0], longitude=IN_OFFICE[1]),
+        Attendance(employee_id=1, timestamp=datetime(2023, 3, 1, 16, 0), type='check_out',
+                   latitude=FAR_AWAY[0], longitude=FAR_AWAY[1]),
+        Attendance(employee_id=1, timestamp=datetime(2024, 3, 1, 7, 0), type='check_in',
+                   latitude=FAR_AWAY[0], longitude=FAR_AWAY[1]),
+    ])
+    db.commit()
+    archive_period('2023')
+    add_site(db, 'Kantor Pusat', OFFICE.latitude, OFFICE.longitude, OFFICE.radius_m)
+    db.commit()
+
+    assert revalidate_attendance() == (3, 2)
+    flags = {}
+    for source in partition_sources(db, Attendance):
+        flags.update(db.query(source.entity.timestamp, source.entity.outside_geofence).all())
+    assert flags == {datetime(2023, 3, 1, 7, 0): False, datetime(2023, 3, 1, 16, 0): True,
+                     datetime(2024, 3, 1, 7, 0): True}
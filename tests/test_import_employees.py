@@ -0,0 +1,82 @@
+# tests/test_import_employees.py
+# Import roster (import_employees.py): validasi vektor, selisih dengan tabel employees
+# (tambah, update jabatan, aktif kembali, nonaktif) dan mode dry run.
+import pandas as pd
+import pytest
+
+from database import Employee
+from import_employees import (NAME_COLUMN_HEADER, POSITION_COLUMN_HEADER, validate_roster, diff_roster,
+                              import_or_update_employees)
+
+
+def roster_frame(rows):
+    return pd.DataFrame(rows, columns=[NAME_COLUMN_HEADER, POSITION_COLUMN_HEADER], dtype=str)
+
+
+FILE_ROWS = [
+    ('Andi', 'Pramu Kantor'),            # Tidak berubah
+    ('Budi', 'Pengemudi'),               # Jabatan lama Dokter -> diupdate
+    ('  Citra ', 'Dokter'),              # Nonaktif di DB -> aktif kembali (spasi dibuang)
+    ('Eka', 'Petugas Kesehatan'),
+    ('', 'Dokter'),                      # Nama kosong
+    ('Fajar', 'Tukang Kebun'),           # Jabatan tidak dikenal
+    ('Eka', 'Pengemudi'),                # Nama duplikat: baris terakhir dipakai
+]
+
+
+@pytest.fixture
+def employees(db):
+    db.add_all([
+        Employee(id=1, name='Andi', position='Pramu Kantor'),
+        Employee(id=2, name='Budi', position='Dokter'),
+        Employee(id=3, name='Citra', position='Dokter', is_active=False),
+        Employee(id=4, name='Dedi', position='Pengemudi'),  # Tidak ada di file -> dinonaktifkan
+    ])
+    db.commit()
+
+
+def test_validate_roster_masks_invalid_rows():
+    roster, invalid = validate_roster(roster_frame(FILE_ROWS))
+    assert roster.to_dict('records') == [
+        {'name': 'Andi', 'position': 'Pramu Kantor'}, {'name': 'Budi', 'position': 'Pengemudi'},
+        {'name': 'Citra', 'position': 'Dokter'}, {'name': 'Eka', 'position': 'Pengemudi'},
+    ]
+    assert invalid['row'].tolist() == [6, 7] # Nomor baris Excel (header = baris 1)
+    assert invalid['reason'].tolist() == ['Nama atau Jabatan kosong', "Jabatan 'Tukang Kebun' tidak valid"]
+
+
+def test_diff_roster_insert_update_deactivate(db, employees):
+    roster, invalid = validate_roster(roster_frame(FILE_ROWS))
+    diff = diff_roster(db, roster, invalid)
+    assert diff.added == [{'name': 'Eka', 'position': 'Pengemudi'}]
+    assert sorted(diff.updated, key=lambda row: row['id']) == [
+        {'id': 2, 'name': 'Budi', 'position': 'Pengemudi', 'is_active': True},
+        {'id': 3, 'name': 'Citra', 'position': 'Dokter', 'is_active': True},
+    ]
+    assert diff.reactivated == 1
+    assert diff.deactivated == [{'id': 4, 'name': 'Dedi'}]
+    assert diff.valid_count == 4 and len(diff.invalid) == 2
+
+
+def employee_state(db):
+    db.expire_all()
+    return {name: (position, is_active) for name, position, is_active
+            in db.query(Employee.name, Employee.position, Employee.is_active)}
+
+
+def test_dry_run_changes_nothing_then_apply(db, employees, tmp_path):
+    path = tmp_path / 'pegawai.csv'
+    roster_frame(FILE_ROWS).to_csv(path, index=False)
+    before = employee_state(db)
+
+    diff = import_or_update_employees(str(path), dry_run=True)
+    assert len(diff.added) == 1 and len(diff.deactivated) == 1
+    assert employee_state(db) == before
+
+    import_or_update_employees(str(path))
+    assert employee_state(db) == {
+        'Andi': ('Pramu Kantor', True), 'Budi': ('Pengemudi', True), 'Citra': ('Dokter', True),
+        'Dedi': ('Pengemudi', False), 'Eka': ('Pengemudi', True),
+    }
+    # File yang sama dilewati pada import berikutnya
+    assert import_or_update_employees(str(path)) is None
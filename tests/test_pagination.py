@@ -0,0 +1,71 @@
+# tests/test_pagination.py
+# Keyset pagination /manage & /api/attendance (paginate_partitioned): urutan (timestamp, id) menurun
+# yang menggabungkan DB live dengan file arsip yang di-ATTACH, dan cursor yang bisa dibaca ulang.
+import math
+from datetime import datetime
+
+import pytest
+
+from database import Employee, Attendance
+from archive import archive_period
+from app import paginate_partitioned, attendance_list_builder, encode_cursor, decode_cursor
+
+
+@pytest.fixture
+def live_and_archived(db):
+    """Absensi 2023 dipindah ke arsip, lalu absensi baru & absensi susulan 2023 ditambah di DB live."""
+    db.add_all([Employee(id=1, name='Budi', position='Pengemudi'), Employee(id=2, name='Sari', position='Dokter')])
+    db.add_all([
+        Attendance(employee_id=1, timestamp=datetime(2023, 5, 2, 7, 0), type='check_in'),
+        Attendance(employee_id=2, timestamp=datetime(2023, 5, 2, 7, 0), type='check_in'),  # Timestamp sama
+        Attendance(employee_id=1, timestamp=datetime(2023, 5, 2, 16, 0), type='check_out'),
+        Attendance(employee_id=2, timestamp=datetime(2023, 11, 20, 7, 30), type='check_in'),
+    ])
+    db.commit()
+    assert archive_period('2023') == (4, 0)
+    db.add_all([
+        Attendance(employee_id=1, timestamp=datetime(2024, 1, 8, 7, 15), type='check_in'),
+        Attendance(employee_id=2, timestamp=datetime(2024, 1, 8, 7, 15), type='check_in'),
+        # Ditambah admin belakangan untuk tanggal di periode arsip: tetap di DB live
+        Attendance(employee_id=2, timestamp=datetime(2023, 5, 2, 16, 30), type='check_out'),
+    ])
+    db.commit()
+
+
+def all_pages(db, limit, start_date=None, end_date=None):
+    """Membaca semua halaman dengan mengikuti next_cursor. Mengembalikan [(timestamp, id)] dan jumlah halaman."""
+    builder = attendance_list_builder(db, '', start_date, end_date)
+    keys, cursor, pages = [], None, 0
+    while True:
+        rows, cursor, _ = paginate_partitioned(db, Attendance, builder, cursor, limit, start_date, end_date)
+        keys += [(row.timestamp, row.id) for row in rows]
+        pages += 1
+        if cursor is None:
+            return keys, pages
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 100])
+def test_pages_merge_live_and_archive_in_keyset_order(db, live_and_archived, limit):
+    keys, pages = all_pages(db, limit)
+    assert len(keys) == 7
+    assert len(set(id_ for _, id_ in keys)) == 7 # ID unik di DB live + arsip
+    assert keys == sorted(keys, reverse=True)
+    assert pages == math.ceil(7 / limit) # Halaman terakhir tidak diikuti halaman kosong
+
+
+def test_archived_rows_are_reported_and_date_range_is_respected(db, live_and_archived):
+    builder = attendance_list_builder(db, '', datetime(2023, 5, 2), datetime(2023, 5, 2))
+    rows, next_cursor, archived_ids = paginate_partitioned(db, Attendance, builder, None, 10,
+                                                           datetime(2023, 5, 2), datetime(2023, 5, 2))
+    assert next_cursor is None
+    assert [row.timestamp for row in rows] == [datetime(2023, 5, 2, 16, 30), datetime(2023, 5, 2, 16, 0),
+                                               datetime(2023, 5, 2, 7, 0), datetime(2023, 5, 2, 7, 0)]
+    assert rows[1].id > rows[2].id > rows[3].id # Timestamp sama: id menurun
+    assert archived_ids == {row.id for row in rows[1:]} # Baris susulan di DB live bukan arsip
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2023, 5, 2, 7, 0, 0, 123456)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('bukan-cursor')
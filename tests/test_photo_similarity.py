@@ -0,0 +1,68 @@
+# tests/test_photo_similarity.py
+# Indeks hash foto (photo_similarity.py): pencarian multi-index hashing tepat di batas jarak
+# Hamming, kandidat foto dipakai ulang, dan refresh yang menangkap baris ter-commit tidak urut ID.
+from datetime import date, datetime
+
+from database import Employee, Attendance
+from photo_similarity import PhotoHashIndex, PhotoHashEntry, hamming, load_photo_index
+
+BASE = 0x0123456789abcdef
+DAY = date(2024, 3, 4)
+
+
+def flip(value, *bits):
+    """Membalik bit tertentu (disebar di potongan berbeda agar semua tabel indeks teruji)."""
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def as_hex(value):
+    return f"{value:016x}"
+
+
+def build_index(max_distance=5):
+    index = PhotoHashIndex(max_distance)
+    index.add(as_hex(flip(BASE, 0, 11, 22, 33, 44)), PhotoHashEntry(1, 10, date(2024, 3, 1)))     # Jarak 5
+    index.add(as_hex(flip(BASE, 0, 11, 22, 33, 44, 55)), PhotoHashEntry(2, 20, DAY))             # Jarak 6
+    index.add(as_hex(flip(BASE, 63)), PhotoHashEntry(3, 30, DAY))                                 # Jarak 1
+    index.add(as_hex(BASE), PhotoHashEntry(4, 10, DAY))                                           # Sama persis
+    return index
+
+
+def test_search_is_exact_at_threshold():
+    index = build_index()
+    results = index.search(as_hex(BASE))
+    assert [(d, entry.attendance_id) for d, entry in results] == [(0, 4), (1, 3), (5, 1)]
+    assert hamming(BASE, flip(BASE, 0, 11, 22, 33, 44, 55)) == 6 # ID 2 tepat satu bit di luar batas
+    # distance lebih kecil menyaring; lebih besar dari max_distance dibatasi max_distance
+    assert [entry.attendance_id for _, entry in index.search(as_hex(BASE), distance=4)] == [4, 3]
+    assert [entry.attendance_id for _, entry in index.search(as_hex(BASE), distance=10)] == [4, 3, 1]
+
+
+def test_reuse_candidates_skip_same_employee_same_day():
+    index = build_index()
+    candidates = index.reuse_candidates(as_hex(BASE), employee_id=10, work_date=DAY)
+    # ID 4 (pegawai & hari yang sama) bukan pemakaian ulang; ID 1 pegawai sama tapi hari lain
+    assert [(d, entry.attendance_id) for d, entry in candidates] == [(1, 3), (5, 1)]
+    index.discard(3)
+    assert [entry.attendance_id for _, entry in index.reuse_candidates(as_hex(BASE), 10, DAY)] == [1]
+
+
+def test_refresh_picks_up_rows_committed_below_watermark(db):
+    db.add_all([Employee(id=1, name='Budi'), Employee(id=2, name='Sari')])
+    db.commit()
+    index = load_photo_index(db)
+    db.add(Attendance(id=10, employee_id=1, timestamp=datetime(2024, 3, 4, 7, 0), type='check_in',
+                      photo_phash=as_hex(BASE)))
+    db.commit()
+    index.refresh(db)
+    assert index.last_live_id == 10
+    # ID lebih kecil yang baru ter-commit setelah refresh (urutan commit != urutan ID)
+    db.add(Attendance(id=7, employee_id=2, timestamp=datetime(2024, 3, 4, 7, 5), type='check_in',
+                      photo_phash=as_hex(flip(BASE, 1))))
+    db.commit()
+    index.refresh(db)
+    index.refresh(db) # Refresh berulang tidak menambah entri ganda
+    assert len(index) == 2
+    assert [entry.attendance_id for _, entry in index.search(as_hex(BASE))] == [10, 7]
@@ -0,0 +1,67 @@
+# tests/test_reports.py
+# Matriks absensi bulanan (reports.py): pegawai aktif selalu tampil, pegawai nonaktif hanya jika
+# punya data di rentang laporan, sel 'HH:MM-HH:MM' / kode status, dan kolom jumlah hadir.
+from datetime import date, datetime
+
+import pandas as pd
+
+from reports import NO_POSITION_LABEL, TOTAL_COLUMN, build_monthly_matrix, month_range
+
+EMPLOYEES = [
+    (1, 'Budi', 'Pengemudi', True),
+    (2, 'Andi', 'Pengemudi', True),       # Aktif tanpa data: baris kosong
+    (3, 'Citra', 'Dokter', False),        # Nonaktif tapi punya data: tetap tampil
+    (4, 'Dedi', 'Dokter', False),         # Nonaktif tanpa data: tidak tampil
+    (5, 'Eka', None, True),
+]
+
+
+def make_summaries(*rows):
+    frame = pd.DataFrame(list(rows), columns=['employee_id', 'work_date', 'first_check_in',
+                                              'last_check_out', 'duration_minutes'])
+    frame['first_check_in'] = pd.to_datetime(frame['first_check_in'])
+    frame['last_check_out'] = pd.to_datetime(frame['last_check_out'])
+    return frame
+
+
+SUMMARIES = make_summaries(
+    (1, date(2024, 2, 1), datetime(2024, 2, 1, 7, 30), datetime(2024, 2, 1, 16, 45), 555),
+    (1, date(2024, 2, 2), datetime(2024, 2, 2, 7, 5), None, None),                  # Tanpa absen keluar
+    (3, date(2024, 2, 29), None, datetime(2024, 2, 29, 16, 0), None),               # Tanpa absen masuk
+)
+
+
+def test_month_range():
+    assert month_range('2024-02') == (date(2024, 2, 1), date(2024, 2, 29))
+    assert month_range('2024-11', months=3) == (date(2024, 11, 1), date(2025, 1, 31))
+
+
+def test_matrix_includes_inactive_employees_with_data():
+    start_date, end_date = month_range('2024-02')
+    matrix = build_monthly_matrix(SUMMARIES, EMPLOYEES, start_date, end_date)
+    # Diurutkan per jabatan lalu nama; Dedi (nonaktif, tanpa data) tidak tampil
+    assert matrix.index.names == ['Jabatan', 'Nama']
+    assert list(matrix.index) == [(NO_POSITION_LABEL, 'Eka'), ('Dokter', 'Citra'),
+                                  ('Pengemudi', 'Andi'), ('Pengemudi', 'Budi')]
+    assert list(matrix.columns[:-1]) == list(pd.date_range(start_date, end_date).date)
+    assert matrix.columns[-1] == TOTAL_COLUMN
+
+    assert matrix.loc[('Pengemudi', 'Budi'), date(2024, 2, 1)] == '07:30-16:45'
+    assert matrix.loc[('Pengemudi', 'Budi'), date(2024, 2, 2)] == '07:05-?'
+    assert matrix.loc[('Pengemudi', 'Budi'), date(2024, 2, 3)] == ''
+    assert matrix.loc[('Dokter', 'Citra'), date(2024, 2, 29)] == '?-16:00'
+    assert matrix[TOTAL_COLUMN].tolist() == [0, 1, 0, 2]
+    assert (matrix.loc[('Pengemudi', 'Andi')].drop(TOTAL_COLUMN) == '').all()
+
+
+def test_matrix_status_mode_and_data_outside_range():
+    # Data Citra hanya di 29 Februari: di luar rentang Maret, jadi pegawai nonaktif itu tidak tampil
+    empty = SUMMARIES.iloc[0:0]
+    matrix = build_monthly_matrix(empty, EMPLOYEES, *month_range('2024-03'))
+    assert ('Dokter', 'Citra') not in matrix.index
+    assert matrix[TOTAL_COLUMN].tolist() == [0, 0, 0]
+
+    matrix = build_monthly_matrix(SUMMARIES, EMPLOYEES, *month_range('2024-02'), mode='status')
+    assert matrix.loc[('Pengemudi', 'Budi'), date(2024, 2, 1)] == 'H'
+    assert matrix.loc[('Pengemudi', 'Budi'), date(2024, 2, 2)] == 'M'
+    assert matrix.loc[('Dokter', 'Citra'), date(2024, 2, 29)] == 'K'
@@ -0,0 +1,63 @@
+# tests/test_work_hours.py
+# Mesin jam kerja (work_hours.py): pemasangan masuk/keluar dan shift malam yang melewati tengah malam.
+from datetime import date, datetime
+
+import pandas as pd
+
+from work_hours import DEFAULT_SHIFT_RULES, pair_events, compute_work_hours
+
+GUARD = (1, 'Budi', 'Petugas Keamanan Dalam', True) # Shift Malam 19:00-07:00
+DRIVER = (2, 'Sari', 'Pengemudi', True)              # Aturan default 07:30-16:00
+
+
+def make_events(*events):
+    frame = pd.DataFrame(list(events), columns=['employee_id', 'timestamp', 'type'])
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    return frame
+
+
+def test_pair_events_across_midnight():
+    events = make_events(
+        (1, datetime(2024, 3, 4, 19, 5), 'check_in'),
+        (1, datetime(2024, 3, 5, 7, 2), 'check_out'),
+        (1, datetime(2024, 3, 5, 19, 40), 'check_in'),   # Tanpa absen keluar
+        (2, datetime(2024, 3, 5, 16, 10), 'check_out'),  # Tanpa absen masuk
+    )
+    shifts = pair_events(events).sort_values(['employee_id', 'check_in']).reset_index(drop=True)
+    assert shifts['employee_id'].tolist() == [1, 1, 2]
+    assert shifts.loc[0, 'check_in'] == pd.Timestamp(2024, 3, 4, 19, 5)
+    assert shifts.loc[0, 'check_out'] == pd.Timestamp(2024, 3, 5, 7, 2)
+    assert pd.isna(shifts.loc[1, 'check_out'])
+    assert pd.isna(shifts.loc[2, 'check_in']) and shifts.loc[2, 'check_out'] == pd.Timestamp(2024, 3, 5, 16, 10)
+
+
+def test_night_shift_counts_for_start_date():
+    events = make_events(
+        (1, datetime(2024, 3, 4, 19, 5), 'check_in'),
+        (1, datetime(2024, 3, 5, 6, 30), 'check_out'),   # Pulang 30 menit lebih awal
+        (1, datetime(2024, 3, 5, 19, 40), 'check_in'),   # Terlambat 40 menit, tanpa absen keluar
+    )
+    shifts = compute_work_hours(events, [GUARD], date(2024, 3, 4), date(2024, 3, 5), DEFAULT_SHIFT_RULES)
+    assert shifts['shift_date'].tolist() == [date(2024, 3, 4), date(2024, 3, 5)]
+    assert shifts['shift_name'].tolist() == ['Malam', 'Malam']
+    first, second = shifts.iloc[0], shifts.iloc[1]
+    assert first['duration_minutes'] == 685
+    assert first['late_minutes'] == 0 # 5 menit masih dalam toleransi
+    assert first['early_leave_minutes'] == 30
+    assert not first['missing_check_out']
+    assert second['late_minutes'] == 40
+    assert second['missing_check_out'] and pd.isna(second['duration_minutes'])
+
+
+def test_night_shift_outside_range_is_excluded():
+    events = make_events(
+        (1, datetime(2024, 3, 4, 19, 0), 'check_in'),
+        (1, datetime(2024, 3, 5, 7, 0), 'check_out'),
+        (2, datetime(2024, 3, 5, 7, 25), 'check_in'),
+        (2, datetime(2024, 3, 5, 16, 0), 'check_out'),
+    )
+    # Absen keluar 5 Maret milik shift 4 Maret, jadi hanya shift pengemudi yang masuk rentang
+    shifts = compute_work_hours(events, [GUARD, DRIVER], date(2024, 3, 5), date(2024, 3, 5), DEFAULT_SHIFT_RULES)
+    assert shifts['name'].tolist() == ['Sari']
+    assert shifts.iloc[0]['shift_name'] == 'Reguler'
+    assert shifts.iloc[0]['duration_minutes'] == 515
@@ -0,0 +1,231 @@
+# work_hours.py
+# Perhitungan jam kerja, keterlambatan, pulang cepat, dan absen keluar yang hilang.
+# Event check_in/check_out dipasangkan per pegawai dengan operasi kolom pandas/NumPy
+# (tanpa loop per baris), termasuk shift malam yang melewati tengah malam.
+# Aturan shift per jabatan bisa diganti lewat file JSON (SHIFT_RULES_PATH), format:
+#   {"default": [{"name": "Reguler", "start": "07:30", "end": "16:00"}],
+#    "Petugas Keamanan Dalam": [{"name": "Pagi", "start": "07:00", "end": "19:00"},
+#                               {"name": "Malam", "start": "19:00", "end": "07:00"}]}
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database import Attendance
+from archive import partition_sources
+
+SHIFT_RULES_PATH = os.environ.get('SHIFT_RULES_PATH')
+LATE_GRACE_MINUTES = int(os.environ.get('LATE_GRACE_MINUTES', 15))       # Toleransi terlambat
+EARLY_GRACE_MINUTES = int(os.environ.get('EARLY_GRACE_MINUTES', 0))      # Toleransi pulang cepat
+MAX_SHIFT_HOURS = int(os.environ.get('MAX_SHIFT_HOURS', 16)) # Masuk & keluar lebih jauh dari ini tidak dipasangkan
+DEFAULT_RULE_KEY = 'default'
+
+DEFAULT_SHIFT_RULES = {
+    DEFAULT_RULE_KEY: [{"name": "Reguler", "start": "07:30", "end": "16:00"}],
+    "Petugas Keamanan Dalam": [
+        {"name": "Pagi", "start": "07:00", "end": "19:00"},
+        {"name": "Malam", "start": "19:00", "end": "07:00"}, # Melewati tengah malam
+    ],
+}
+
+SHIFT_COLUMNS = ['employee_id', 'name', 'position', 'shift_date', 'shift_name', 'check_in', 'check_out',
+                 'duration_minutes', 'late_minutes', 'early_leave_minutes',
+                 'missing_check_in', 'missing_check_out']
+DETAIL_HEADERS = ['Nama', 'Jabatan', 'Tanggal', 'Shift', 'Masuk', 'Keluar', 'Durasi (menit)',
+                  'Terlambat (menit)', 'Pulang Cepat (menit)', 'Tanpa Absen Masuk', 'Tanpa Absen Keluar']
+SUMMARY_HEADERS = ['Nama', 'Jabatan', 'Jumlah Shift', 'Total Jam', 'Terlambat (kali)',
+                   'Total Terlambat (menit)', 'Pulang Cepat (kali)', 'Tanpa Absen Masuk', 'Tanpa Absen Keluar']
+
+
+def load_shift_rules(path=SHIFT_RULES_PATH):
+    """Aturan shift per jabatan (dari file JSON jika ada, jika tidak pakai DEFAULT_SHIFT_RULES)."""
+    if not path:
+        return DEFAULT_SHIFT_RULES
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    if DEFAULT_RULE_KEY not in rules:
+        rules[DEFAULT_RULE_KEY] = DEFAULT_SHIFT_RULES[DEFAULT_RULE_KEY]
+    return rules
+
+
+def _minutes(hhmm):
+    """'HH:MM' -> menit sejak tengah malam."""
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def rules_frame(rules):
+    """Aturan shift sebagai DataFrame (satu baris per jabatan per shift), waktu dalam menit."""
+    records = []
+    for position, shifts in rules.items():
+        for shift in shifts:
+            start, end = _minutes(shift['start']), _minutes(shift['end'])
+            records.append({
+                'rule_position': position, 'shift_name': shift['name'], 'start_min': start,
+                # Shift yang berakhir <= jam mulai melewati tengah malam
+                'end_min': end + (24 * 60 if end <= start else 0),
+                'late_grace': shift.get('late_grace', LATE_GRACE_MINUTES),
+                'early_grace': shift.get('early_grace', EARLY_GRACE_MINUTES),
+            })
+    return pd.DataFrame(records)
+
+
+def load_events(db, start_date, end_date):
+    """Query event absensi untuk rentang tanggal, plus margin untuk shift yang melewati tengah malam."""
+    margin = timedelta(hours=MAX_SHIFT_HOURS)
+    range_start = datetime.combine(start_date, datetime.min.time()) - margin
+    range_end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1) + margin
+    rows = []
+    # DB live + arsip yang beririsan dengan rentang (lihat archive.py)
+    for source in partition_sources(db, Attendance, range_start, range_end):
+        entity = source.entity
+        rows += db.query(entity.employee_id, entity.timestamp, entity.type)\
+            .filter(entity.timestamp >= range_start, entity.timestamp < range_end)\
+            .all()
+    events = pd.DataFrame(rows, columns=['employee_id', 'timestamp', 'type'])
+    events['timestamp'] = pd.to_datetime(events['timestamp'])
+    return events
+
+
+def pair_events(events):
+    """Memasangkan check_in dengan check_out berikutnya milik pegawai yang sama (vektor).
+
+    Mengembalikan DataFrame shift: employee_id, check_in, check_out (NaT jika tidak ada pasangan).
+    """
+    events = events.sort_values(['employee_id', 'timestamp'], kind='mergesort').reset_index(drop=True)
+    by_employee = events.groupby('employee_id', sort=False)
+    next_type, next_time = by_employee['type'].shift(-1), by_employee['timestamp'].shift(-1)
+    prev_type, prev_time = by_employee['type'].shift(1), by_employee['timestamp'].shift(1)
+    max_span = pd.Timedelta(hours=MAX_SHIFT_HOURS)
+
+    is_in = events['type'] == 'check_in'
+    is_out = events['type'] == 'check_out'
+    paired_in = is_in & (next_type == 'check_out') & (next_time - events['timestamp'] <= max_span)
+    # check_out yang tidak didahului check_in pasangannya = shift tanpa absen masuk
+    paired_out = is_out & (prev_type == 'check_in') & (events['timestamp'] - prev_time <= max_span)
+
+    with_in = pd.DataFrame({
+        'employee_id': events.loc[is_in, 'employee_id'],
+        'check_in': events.loc[is_in, 'timestamp'],
+        'check_out': next_time[is_in].where(paired_in[is_in]),
+    })
+    orphan_out = is_out & ~paired_out
+    without_in = pd.DataFrame({
+        'employee_id': events.loc[orphan_out, 'employee_id'],
+        'check_in': pd.Series(pd.NaT, index=events.index[orphan_out], dtype='datetime64[ns]'),
+        'check_out': events.loc[orphan_out, 'timestamp'],
+    })
+    return pd.concat([with_in, without_in], ignore_index=True)
+
+
+def assign_shift_rules(shifts, positions, rules):
+    """Memilih aturan shift per baris: jabatan yang sama, jam mulai terdekat dengan jam absen (vektor)."""
+    shifts = shifts.reset_index(drop=True).rename_axis('shift_id').reset_index()
+    shifts['position'] = shifts['employee_id'].map(positions)
+    known = set(rules['rule_position'])
+    shifts['rule_position'] = shifts['position'].where(shifts['position'].isin(known), DEFAULT_RULE_KEY)
+
+    anchor = shifts['check_in'].fillna(shifts['check_out'])
+    shifts['anchor_min'] = anchor.dt.hour * 60 + anchor.dt.minute
+    candidates = shifts.merge(rules, on='rule_position', how='left')
+    # Jarak jam absen ke jam mulai (tanpa absen masuk: ke jam selesai), melingkar 24 jam
+    target = np.where(candidates['check_in'].notna(), candidates['start_min'], candidates['end_min'] % (24 * 60))
+    diff = np.abs(candidates['anchor_min'] - target)
+    candidates['distance'] = np.minimum(diff, 24 * 60 - diff)
+    best = candidates.loc[candidates.groupby('shift_id')['distance'].idxmin()]
+    return best.drop(columns=['distance', 'anchor_min']).reset_index(drop=True)
+
+
+def empty_shifts():
+    """DataFrame shift kosong dengan tipe kolom yang benar (agar accessor .dt tetap bekerja)."""
+    dtypes = {'check_in': 'datetime64[ns]', 'check_out': 'datetime64[ns]', 'duration_minutes': 'float64',
+              'late_minutes': 'float64', 'early_leave_minutes': 'float64',
+              'missing_check_in': 'bool', 'missing_check_out': 'bool'}
+    return pd.DataFrame({col: pd.Series(dtype=dtypes.get(col, 'object')) for col in SHIFT_COLUMNS})
+
+
+def compute_work_hours(events, employees, start_date, end_date, rules=None):
+    """Menghitung durasi & pelanggaran per shift untuk rentang tanggal (inklusif).
+
+    employees: iterable (id, name, position, is_active) dari roster cache.
+    Mengembalikan DataFrame dengan kolom SHIFT_COLUMNS.
+    """
+    if events.empty:
+        return empty_shifts()
+    roster = pd.DataFrame(list(employees), columns=['employee_id', 'name', 'position', 'is_active'])
+    positions = roster.set_index('employee_id')['position']
+    shifts = assign_shift_rules(pair_events(events), positions, rules_frame(rules or load_shift_rules()))
+
+    # Tanggal shift = tanggal mulai shift; absen keluar shift malam (tanpa masuk) milik hari sebelumnya
+    midnight = pd.Timedelta(days=1)
+    out_day = shifts['check_out'].dt.normalize()
+    out_shift_day = out_day.where(shifts['end_min'] <= 24 * 60, out_day - midnight)
+    shift_day = shifts['check_in'].dt.normalize().fillna(out_shift_day)
+    scheduled_start = shift_day + pd.to_timedelta(shifts['start_min'], unit='min')
+    scheduled_end = shift_day + pd.to_timedelta(shifts['end_min'], unit='min')
+
+    late = (shifts['check_in'] - scheduled_start).dt.total_seconds() // 60
+    early = (scheduled_end - shifts['check_out']).dt.total_seconds() // 60
+    duration = (shifts['check_out'] - shifts['check_in']).dt.total_seconds() // 60
+    result = pd.DataFrame({
+        'employee_id': shifts['employee_id'],
+        'name': shifts['employee_id'].map(roster.set_index('employee_id')['name']),
+        'position': shifts['position'],
+        'shift_date': shift_day.dt.date,
+        'shift_name': shifts['shift_name'],
+        'check_in': shifts['check_in'],
+        'check_out': shifts['check_out'],
+        'duration_minutes': duration,
+        # Hanya dihitung jika melewati toleransi; 0 jika tepat waktu
+        'late_minutes': late.where(late > shifts['late_grace'], 0).clip(lower=0).where(late.notna()),
+        'early_leave_minutes': early.where(early > shifts['early_grace'], 0).clip(lower=0).where(early.notna()),
+        'missing_check_in': shifts['check_in'].isna(),
+        'missing_check_out': shifts['check_out'].isna(),
+    })
+    in_range = (result['shift_date'] >= start_date) & (result['shift_date'] <= end_date)
+    return result[in_range].sort_values(['position', 'name', 'shift_date'], na_position='last')\
+        .reset_index(drop=True)[SHIFT_COLUMNS]
+
+
+def summarize_work_hours(shifts):
+    """Rekap per pegawai: jumlah shift, total jam, jumlah & total menit terlambat, pulang cepat, absen hilang."""
+    grouped = shifts.assign(
+        is_late=shifts['late_minutes'] > 0,
+        is_early=shifts['early_leave_minutes'] > 0,
+    ).groupby(['employee_id', 'name', 'position'], dropna=False, sort=False)
+    summary = grouped.agg(
+        shift_count=('shift_date', 'size'),
+        total_minutes=('duration_minutes', 'sum'),
+        late_count=('is_late', 'sum'),
+        late_minutes=('late_minutes', 'sum'),
+        early_count=('is_early', 'sum'),
+        missing_check_in=('missing_check_in', 'sum'),
+        missing_check_out=('missing_check_out', 'sum'),
+    ).reset_index()
+    summary['total_hours'] = (summary['total_minutes'] / 60).round(1)
+    return summary
+
+
+def detail_rows(shifts):
+    """Baris detail siap tulis (XLSX/HTML), sesuai DETAIL_HEADERS; waktu ditulis sebagai datetime, bukan string."""
+    frame = pd.DataFrame({
+        'name': shifts['name'], 'position': shifts['position'].fillna('-'),
+        'shift_date': shifts['shift_date'], 'shift_name': shifts['shift_name'],
+        'check_in': shifts['check_in'].dt.floor('min'),
+        'check_out': shifts['check_out'].dt.floor('min'),
+        'duration': shifts['duration_minutes'].astype('Int64'),
+        'late': shifts['late_minutes'].astype('Int64'),
+        'early': shifts['early_leave_minutes'].astype('Int64'),
+        'missing_in': np.where(shifts['missing_check_in'], 'Ya', ''),
+        'missing_out': np.where(shifts['missing_check_out'], 'Ya', ''),
+    })
+    return frame.astype(object).where(frame.notna(), None).values.tolist()
+
+
+def summary_rows(summary):
+    """Baris rekap per pegawai siap tulis, sesuai SUMMARY_HEADERS."""
+    return summary[['name', 'position', 'shift_count', 'total_hours', 'late_count', 'late_minutes',
+                    'early_count', 'missing_check_in', 'missing_check_out']]\
+        .fillna({'position': '-'}).astype(object).values.tolist()